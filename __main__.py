@@ -0,0 +1,5 @@
+import sys
+from cli import main
+
+# Lets the checkout run as ``python <dir> batch urls.txt``
+sys.exit(main())
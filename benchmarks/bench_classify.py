@@ -0,0 +1,94 @@
+"""Throughput of link classification.
+
+Compares the old detect_platform (one re.search per pattern string), alone
+and together with canonical_url as the old code needed for a key, with
+utils.classify_url, both uncached and through its LRU cache (what repeated
+clipboard polls hit), over a mix of supported and unsupported links:
+
+    python benchmarks/bench_classify.py --count 200000
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+# detect_platform as it was before the combined matcher
+LEGACY_PATTERNS = {
+    "instagram": r"instagram\.com\/(p|reel|tv|stories)\/",
+    "youtube": r"(youtube\.com\/watch\?v=|youtu\.be\/)",
+    "tiktok": r"tiktok\.com\/@[\w\.\-]+\/video\/\d+",
+    "twitter": r"(twitter\.com|x\.com)\/\w+\/status\/\d+"
+}
+
+
+def legacy_detect(url):
+    if url.strip() == "whatsapp-status":
+        return "whatsapp"
+    for plat, pat in LEGACY_PATTERNS.items():
+        if re.search(pat, url):
+            return plat
+    return "unknown"
+
+
+SAMPLES = [
+    "https://www.instagram.com/reel/{id}/?igshid={junk}",
+    "https://youtu.be/{vid}?si={junk}",
+    "https://m.youtube.com/watch?feature=share&v={vid}",
+    "https://www.tiktok.com/@someone/video/{num}?is_from_webapp=1",
+    "https://x.com/someone/status/{num}?s=20",
+    "https://example.com/articles/{num}",
+    "just some copied text {junk}",
+]
+
+
+def make_links(count, seed=1):
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-"
+    word = lambda n: "".join(rng.choice(alphabet) for _ in range(n))
+    return [rng.choice(SAMPLES).format(id=word(11), vid=word(11), junk=word(16), num=rng.randrange(10 ** 18))
+            for _ in range(count)]
+
+
+def measure(fn, links):
+    started = time.perf_counter()
+    for url in links:
+        fn(url)
+    return time.perf_counter() - started
+
+
+def run(count=100000):
+    links = make_links(count)
+    uncached = utils.classify_url.__wrapped__
+    legacy = measure(legacy_detect, links)
+    # What the old code needed for a platform plus a cache/dedupe key
+    legacy_keyed = measure(lambda url: (legacy_detect(url), utils.canonical_url(url)), links)
+    combined = measure(uncached, links)
+    # Clipboard polling: the same few strings over and over
+    repeated = links[:8] * (count // 8)
+    cached = measure(utils.classify_url, repeated)
+    return {
+        'benchmark': 'classify',
+        'count': count,
+        'legacy_detect_per_sec': round(count / legacy),
+        'legacy_detect_and_canonical_per_sec': round(count / legacy_keyed),
+        'classify_per_sec': round(count / combined),
+        'classify_cached_per_sec': round(len(repeated) / cached),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.count), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Throughput and CPU per MB of downloader.download_file.
+
+Each scenario downloads generated files from benchmarks/server.py, run in a
+child process so its CPU time is not counted, with that scenario's latency,
+bandwidth, Range support or dropped connections. Downloads go to a
+temporary directory and are deleted after each sample:
+
+    python benchmarks/bench_download.py --repeat 3
+    python benchmarks/bench_download.py --scale 0.25 --only small_file,connection_drops
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import downloader
+import telemetry
+import server
+
+MB = 1024 * 1024
+
+# name, file size in MB, server options
+SCENARIOS = [
+    ('small_file', 0.25, {}),
+    ('large_segmented', 64, {}),
+    ('large_single_stream', 64, {'ranges': False}),
+    ('latency_50ms', 16, {'latency': 0.05}),
+    ('throttled_8M_per_connection', 32, {'bandwidth': '8M'}),
+    ('connection_drops', 32, {'drop_after': '1M', 'drop_every': 4}),
+]
+
+
+def sample(url, filename):
+    wall, cpu = time.perf_counter(), time.process_time()
+    res = downloader.download_file(url, filename)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    if isinstance(res, dict):
+        raise RuntimeError(res['error'])
+    os.remove(res)
+    record = telemetry.read_records('download')[-1]
+    return wall, cpu, record
+
+
+def run_scenario(size_mb, options, repeat):
+    size = max(1, int(size_mb * MB))
+    walls, cpus, retries, mode = [], [], 0, None
+    with server.spawn(**options) as base:
+        for i in range(repeat):
+            # A fresh URL each time, so the download index can't short-circuit it
+            wall, cpu, record = sample(f"{base}/{size}.mp4?n={i}", f"bench-{size}.mp4")
+            walls.append(wall)
+            cpus.append(cpu)
+            retries += record.get('retries', 0)
+            mode = record.get('mode')
+    return {
+        'size_mb': round(size / MB, 2),
+        'mode': mode,
+        'median_ms': round(statistics.median(walls) * 1000, 1),
+        'median_mb_per_sec': round(size / MB / statistics.median(walls), 1),
+        'best_mb_per_sec': round(size / MB / min(walls), 1),
+        'cpu_ms_per_mb': round(statistics.median(cpus) * 1000 / (size / MB), 2),
+        'retries': retries,
+    }
+
+
+def run(repeat=3, scale=1.0, only=None):
+    result = {'benchmark': 'download', 'repeat': repeat, 'scale': scale}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        # The download index and metrics log are relative to the working directory
+        os.chdir(work)
+        downloader.DOWNLOAD_DIR = downloader.DIRECTORY = None
+        try:
+            # Untimed: importing requests, the session and the index database
+            with server.spawn() as base:
+                sample(f"{base}/1k.bin", "warmup.bin")
+            for name, size_mb, options in SCENARIOS:
+                if only and name not in only:
+                    continue
+                try:
+                    result[name] = run_scenario(size_mb * scale, options, repeat)
+                except Exception as e:
+                    result[name] = {'error': str(e)}
+        finally:
+            os.chdir(cwd)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every file size (e.g. 0.25 for a quick run)')
+    parser.add_argument('--only', help='comma-separated scenario names: ' + ', '.join(s[0] for s in SCENARIOS))
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.repeat, args.scale, args.only and args.only.split(',')), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Cost of history appends and loads as the history grows.
+
+For each size a fresh history.db is filled with that many synthetic
+entries. Then it measures save_history_entry, the first page a tab shows,
+one platform's page, count_history, load_history (every entry), and the
+first page of search_history for a word in every entry, a rarer user name
+and a word within one platform:
+
+    python benchmarks/bench_history.py --sizes 1000,10000,100000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history
+
+PLATFORMS = ['instagram', 'youtube', 'x', 'tiktok', 'whatsapp']
+APPENDS = 200
+
+
+def make_entry(i):
+    return {
+        'path': f"/storage/emulated/0/Download/StealthFetcher/media_{i}.mp4",
+        'caption': f"Caption number {i} with a few #hashtags and some words " * 3,
+        'user': f"user_{i % 500}",
+        'thumb': f"https://cdn.example.com/thumbs/{i}.jpg",
+        'link': f"https://www.instagram.com/p/{i:011d}/",
+    }
+
+
+def fill(count):
+    # Straight into the table: the benchmark is about reading, not the fill
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        platform = PLATFORMS[i % len(PLATFORMS)]
+        when = (start + timedelta(seconds=i)).isoformat()
+        rows.append((platform, when, json.dumps({'platform': platform, **make_entry(i), 'time': when})))
+    db = history._conn()
+    db.executemany("INSERT INTO history (platform, time, data) VALUES (?, ?, ?)", rows)
+    db.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def run_size(count, repeat):
+    with tempfile.TemporaryDirectory() as work:
+        history.DB_FILE = os.path.join(work, 'history.db')
+        history._db = None
+        try:
+            fill(count)
+            started = time.perf_counter()
+            for i in range(APPENDS):
+                history.save_history_entry(PLATFORMS[i % len(PLATFORMS)], make_entry(count + i))
+            append_ms = (time.perf_counter() - started) * 1000 / APPENDS
+            return {
+                'append_ms': round(append_ms, 3),
+                'first_page_ms': timed(history.query_history, repeat),
+                'platform_page_ms': timed(lambda: history.query_history('youtube'), repeat),
+                'count_ms': timed(history.count_history, repeat),
+                'load_all_ms': timed(history.load_history, repeat),
+                'search_common_ms': timed(lambda: history.search_history('hashtags'), repeat),
+                'search_user_ms': timed(lambda: history.search_history('user_42'), repeat),
+                'search_platform_ms': timed(lambda: history.search_history('capt words', 'youtube'), repeat),
+            }
+        finally:
+            history._db.close()
+            history._db = None
+
+
+def run(sizes=(1000, 10000, 100000), repeat=5):
+    result = {'benchmark': 'history', 'repeat': repeat}
+    for count in sizes:
+        result[str(count)] = run_size(count, repeat)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    print(json.dumps(run([int(n) for n in args.sizes.split(',')], args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Sustained download throughput against a host that rate-limits.
+
+benchmarks/server.py answers at most --rate requests/s and 429s the rest.
+A batch of small files goes through downloader.download_many, as a burst
+of Instagram downloads would, with:
+    unpaced           ratelimit disabled: 429s surface as failed downloads
+    adaptive          ratelimit learns the limit from the 429s and Retry-After
+    adaptive_no_hint  the same without Retry-After (exponential backoff)
+    configured        the host's rate set up front, as for HOST_RATES entries
+
+    python benchmarks/bench_rate_limit.py --files 40 --rate 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import downloader
+import http_session
+import ratelimit
+import server
+
+FILE_SIZE = '64k'
+
+
+def run_variant(name, files, rate, burst):
+    options = {'rate': rate, 'burst': burst, 'retry_after': None if name == 'adaptive_no_hint' else 1}
+    ratelimit.ENABLED = name != 'unpaced'
+    ratelimit.limiter = ratelimit.Limiter()
+    with server.spawn(**options) as base:
+        if name == 'configured':
+            # A download is a HEAD and a GET
+            ratelimit.limiter.configure(base.split('://')[1], rate, burst)
+        items = [{'url': f"{base}/{FILE_SIZE}.jpg?v={name}&n={i}", 'filename': f"{name}-{i}.jpg"}
+                 for i in range(files)]
+        started = time.perf_counter()
+        results = downloader.download_many(items)
+        elapsed = time.perf_counter() - started
+        stats = http_session.get(f"{base}/stats").json()
+    for r in results:
+        if 'path' in r:
+            os.remove(r['path'])
+    done = sum('path' in r for r in results)
+    return {
+        'done': done,
+        'failed': files - done,
+        'secs': round(elapsed, 2),
+        'files_per_sec': round(done / elapsed, 2),
+        'requests': stats['requests'],
+        'throttled': stats['throttled'],
+    }
+
+
+def run(files=40, rate=4.0, burst=2, only=None):
+    result = {'benchmark': 'rate_limit', 'files': files, 'server_rate': rate, 'burst': burst}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        downloader.DOWNLOAD_DIR = downloader.DIRECTORY = None
+        try:
+            for name in ('unpaced', 'adaptive', 'adaptive_no_hint', 'configured'):
+                if not only or name in only:
+                    result[name] = run_variant(name, files, rate, burst)
+        finally:
+            os.chdir(cwd)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--rate', type=float, default=4.0, help='requests/s the server allows')
+    parser.add_argument('--burst', type=int, default=2)
+    parser.add_argument('--only', help='comma-separated variants')
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.files, args.rate, args.burst, args.only and args.only.split(',')), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Cold-start time of the app and of the first metadata lookup.
+
+Every sample is a fresh interpreter in an empty temporary directory, so no
+imported module, metadata cache or thumbnail carries over between runs:
+
+    python benchmarks/bench_startup.py --repeat 5
+    SDL_VIDEODRIVER=offscreen python benchmarks/bench_startup.py  # no display
+
+first_frame is process start until the first window flip. first_metadata
+is process start until parse_yt_dlp_metadata returns. That includes loading
+yt-dlp. Without --url, the lookup runs against a small video served from
+localhost, so it works offline. Pass --max-first-frame /
+--max-first-metadata (seconds) to exit non-zero when a median exceeds the
+budget.
+"""
+import argparse
+import http.server
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child_first_frame(started):
+    import main
+    imported = time.time()
+    from kivy.core.window import Window
+
+    def flipped(*_):
+        print(json.dumps({'import_main': imported - started, 'first_frame': time.time() - started}), flush=True)
+        # Skip the orderly shutdown: it is not part of the measurement
+        os._exit(0)
+
+    app = main.StealthApp()
+    app.bind(on_start=lambda *_: Window.bind(on_flip=flipped))
+    app.run()
+
+
+def child_first_metadata(started, url):
+    import media_parser
+    res = media_parser.parse_yt_dlp_metadata(url)
+    print(json.dumps({'first_metadata': time.time() - started, 'error': res.get('error')}), flush=True)
+    os._exit(0)
+
+
+def sample(args, timeout=120):
+    env = dict(os.environ, KIVY_NO_ARGS='1', KIVY_NO_CONSOLELOG='1',
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    with tempfile.TemporaryDirectory() as cwd:
+        started = time.time()
+        res = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', repr(started), *args],
+                             cwd=cwd, env=env, capture_output=True, text=True, timeout=timeout)
+    for line in reversed(res.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError(f"sample {args[0]} failed:\n{res.stderr[-2000:]}")
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_sample_video():
+    # yt-dlp's generic extractor treats a direct video/mp4 URL as one media item
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, 'clip.mp4'), 'wb') as f:
+        f.write(os.urandom(256 * 1024))
+    handler = lambda *a, **kw: _QuietHandler(*a, directory=directory, **kw)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/clip.mp4"
+
+
+def summarize(values):
+    return {'median_ms': round(statistics.median(values) * 1000, 1), 'min_ms': round(min(values) * 1000, 1)}
+
+
+def run(repeat=3, url=None, frame=True, metadata=True):
+    result = {'benchmark': 'startup', 'repeat': repeat}
+    if frame:
+        samples = [sample(['first-frame']) for _ in range(repeat)]
+        result['import_main'] = summarize([s['import_main'] for s in samples])
+        result['first_frame'] = summarize([s['first_frame'] for s in samples])
+    if metadata:
+        url = url or serve_sample_video()
+        samples = [sample(['first-metadata', url]) for _ in range(repeat)]
+        errors = [s['error'] for s in samples if s['error']]
+        if errors:
+            result['metadata_error'] = errors[0]
+        result['first_metadata'] = summarize([s['first_metadata'] for s in samples])
+    return result
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['--child']:
+        started, mode = float(argv[1]), argv[2]
+        if mode == 'first-frame':
+            return child_first_frame(started)
+        return child_first_metadata(started, argv[3])
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--url', help='link for the metadata sample (default: local test video)')
+    parser.add_argument('--skip-frame', action='store_true', help='skip the app start (no window system)')
+    parser.add_argument('--skip-metadata', action='store_true')
+    parser.add_argument('--max-first-frame', type=float, help='budget in seconds for the first_frame median')
+    parser.add_argument('--max-first-metadata', type=float, help='budget in seconds for the first_metadata median')
+    args = parser.parse_args(argv)
+
+    result = run(args.repeat, args.url, frame=not args.skip_frame, metadata=not args.skip_metadata)
+    print(json.dumps(result, indent=2))
+
+    over = [name for name, budget in (('first_frame', args.max_first_frame),
+                                      ('first_metadata', args.max_first_metadata))
+            if budget is not None and name in result and result[name]['median_ms'] > budget * 1000]
+    if over:
+        print(f"over budget: {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Cost of parse_whatsapp_status_media on large synthetic status folders.
+
+For each size a temporary folder is filled with that many empty status
+files, backdated past the settle window. Then it times:
+    first_scan   every file is new (first launch)
+    unchanged    nothing changed, so the directory mtime shortcut applies
+    incremental  a few files added to a folder of that size
+
+    python benchmarks/bench_status_scan.py --sizes 1000,10000,100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media_parser
+from status_scanner import StatusScanner, SETTLE_SECS
+
+ADDED = 10
+EXTS = ('.jpg', '.mp4')
+
+
+def make_files(directory, start, count, when):
+    for i in range(start, start + count):
+        path = os.path.join(directory, f"{i:08x}{EXTS[i % 2]}")
+        open(path, 'wb').close()
+        os.utime(path, (when, when))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    res = fn()
+    return round((time.perf_counter() - started) * 1000, 2), len(res['media'])
+
+
+def run_size(count):
+    with tempfile.TemporaryDirectory() as work:
+        directory = os.path.join(work, '.Statuses')
+        os.makedirs(directory)
+        past = time.time() - 10 * SETTLE_SECS
+        make_files(directory, 0, count, past)
+        os.utime(directory, (past, past))
+        media_parser.statuses = StatusScanner(directory, os.path.join(work, 'statuses.db'))
+
+        first_ms, found = timed(media_parser.parse_whatsapp_status_media)
+        unchanged_ms, _ = timed(media_parser.parse_whatsapp_status_media)
+        make_files(directory, count, ADDED, past)
+        os.utime(directory, (past + 1, past + 1))
+        incremental_ms, added = timed(media_parser.parse_whatsapp_status_media)
+        return {'first_scan_ms': first_ms, 'found': found, 'unchanged_ms': unchanged_ms,
+                'incremental_ms': incremental_ms, 'added': added}
+
+
+def run(sizes=(1000, 10000, 100000)):
+    result = {'benchmark': 'status_scan'}
+    for count in sizes:
+        result[str(count)] = run_size(count)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    args = parser.parse_args(argv)
+    print(json.dumps(run([int(n) for n in args.sizes.split(',')]), indent=2))
+
+
+if __name__ == '__main__':
+    main()
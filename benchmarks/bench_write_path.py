@@ -0,0 +1,91 @@
+"""CPU cost per MB of the download write loop.
+
+Compares the old 1 KB iter_content loop with downloader._stream_into on an
+in-memory body, so it runs offline:
+
+    python benchmarks/bench_write_path.py --size-mb 64 --repeat 3
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import downloader
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.raw = io.BytesIO(body)
+        self.headers = {'content-length': str(len(body))}
+
+    def iter_content(self, chunk_size):
+        while True:
+            chunk = self.raw.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def legacy_loop(response, file):
+    # The write loop as it was before the adaptive write path
+    total = int(response.headers.get('content-length', 0))
+    downloaded = 0
+    for chunk in response.iter_content(1024):
+        if chunk:
+            file.write(chunk)
+            downloaded += len(chunk)
+            if total:
+                percent = (downloaded * 100 / total)
+
+
+def adaptive_loop(response, file):
+    total = int(response.headers.get('content-length', 0))
+    state = {'downloaded': 0}
+
+    def advance(chunk):
+        state['downloaded'] += len(chunk)
+        percent = (state['downloaded'] * 100 / total)
+
+    downloader._preallocate(file, total)
+    downloader._stream_into(response, file, advance)
+
+
+def measure(loop, body, repeat):
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryFile() as file:
+            started = time.process_time()
+            loop(FakeResponse(body), file)
+            elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(size_mb=64, repeat=3):
+    body = os.urandom(size_mb * 1024 * 1024)
+    legacy = measure(legacy_loop, body, repeat)
+    adaptive = measure(adaptive_loop, body, repeat)
+    return {
+        'benchmark': 'write_path',
+        'size_mb': size_mb,
+        'legacy_cpu_ms_per_mb': round(legacy * 1000 / size_mb, 3),
+        'adaptive_cpu_ms_per_mb': round(adaptive * 1000 / size_mb, 3),
+        'speedup': round(legacy / adaptive, 1) if adaptive else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.size_mb, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
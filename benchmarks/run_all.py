@@ -0,0 +1,127 @@
+"""Run every benchmark and write one JSON document, for comparing versions.
+
+Each benchmark runs in its own interpreter, so module state, caches and
+working directories don't leak between them. Nothing touches the network:
+downloads come from benchmarks/server.py on localhost.
+
+    python benchmarks/run_all.py --out results/HEAD.json
+    python benchmarks/run_all.py --quick --only download,history
+    python benchmarks/run_all.py --compare results/v1.json --out results/v2.json
+
+--compare prints every numeric result that differs from the base file by
+more than --threshold percent. *_ms values are times, where lower is
+better; for *_per_sec values higher is better.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# name: (script, full-run arguments, --quick arguments)
+BENCHMARKS = {
+    'download': ('bench_download.py', [], ['--scale', '0.25', '--repeat', '2']),
+    'write_path': ('bench_write_path.py', [], ['--size-mb', '16', '--repeat', '2']),
+    'history': ('bench_history.py', [], ['--sizes', '1000,10000', '--repeat', '3']),
+    'classify': ('bench_classify.py', ['--count', '200000'], ['--count', '20000']),
+    'status_scan': ('bench_status_scan.py', [], ['--sizes', '1000,10000']),
+    'rate_limit': ('bench_rate_limit.py', [], ['--files', '16']),
+    # The app window needs a display, so only the metadata cold start runs here
+    'startup': ('bench_startup.py', ['--skip-frame'], ['--skip-frame', '--repeat', '1']),
+}
+
+
+def run_one(name, quick=False, timeout=1800):
+    script, full, fast = BENCHMARKS[name]
+    started = time.monotonic()
+    res = subprocess.run([sys.executable, os.path.join(HERE, script), *(fast if quick else full)],
+                         cwd=ROOT, capture_output=True, text=True, timeout=timeout)
+    elapsed = round(time.monotonic() - started, 1)
+    if res.returncode != 0:
+        return {'error': res.stderr.strip()[-2000:], 'elapsed_secs': elapsed}
+    return {**json.loads(res.stdout), 'elapsed_secs': elapsed}
+
+
+def git_revision():
+    try:
+        res = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                             capture_output=True, text=True, timeout=30)
+        return res.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(names=None, quick=False):
+    results = {}
+    for name in names or BENCHMARKS:
+        print(f"running {name} ...", file=sys.stderr, flush=True)
+        results[name] = run_one(name, quick)
+    return {
+        'revision': git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}",
+        'cpus': os.cpu_count(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, sub in value.items():
+            yield from flatten(sub, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(base, current, threshold=5.0):
+    """Lines describing metrics that moved more than ``threshold`` percent."""
+    old = dict(flatten(base['results']))
+    lines = []
+    for key, new in flatten(current['results']):
+        if key not in old or not old[key] or key.endswith(('elapsed_secs', 'repeat', 'count', 'scale')):
+            continue
+        change = (new - old[key]) / old[key] * 100
+        if abs(change) >= threshold:
+            lines.append(f"{key}: {old[key]} -> {new} ({change:+.1f}%)")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='smaller sizes and fewer repeats')
+    parser.add_argument('--only', help='comma-separated benchmarks: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--out', help='also write the results to this file')
+    parser.add_argument('--compare', metavar='BASE', help='results file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=5.0, help='percent change --compare reports')
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else None
+    unknown = [n for n in names or [] if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    result = run(names, args.quick)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            base = json.load(f)
+        print(f"compared with {base.get('revision')}:", file=sys.stderr)
+        for line in compare(base, result, args.threshold) or ["no change above threshold"]:
+            print(f"  {line}", file=sys.stderr)
+    return 1 if any('error' in r for r in result['results'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""Local stand-in for a media CDN, so the benchmarks run without network.
+
+Serves generated bytes at /<size>[.<ext>], e.g. /300k.jpg or /64M.mp4. The
+bytes are the same for every request of a size, so a download can be
+resumed from any byte range. A query string is ignored, so ?n=1, ?n=2 ...
+give distinct URLs for the same file:
+
+    python benchmarks/server.py --latency 0.05 --bandwidth 4M --drop-after 1M --drop-every 3
+    python benchmarks/server.py --rate 5 --burst 2 --retry-after 1
+
+Options:
+    --latency SECS     delay before every response (an RTT plus server think time)
+    --bandwidth RATE   per-connection send rate in bytes/s (k/M/G suffixes)
+    --no-ranges        ignore Range requests and don't advertise Accept-Ranges
+    --etag             send an ETag, so repeat downloads can be short-circuited
+    --drop-after SIZE  cut the connection after SIZE body bytes ...
+    --drop-every N     ... of every Nth GET response (default 1: all of them)
+    --rate N           answer at most N requests/s (HEAD and GET), 429 beyond that
+    --burst N          requests allowed at once before --rate applies (default 1)
+    --retry-after SECS Retry-After sent with a 429; without it the client has to guess
+
+GET /stats returns {"requests", "throttled"} as JSON, counted since start.
+
+The port is printed as the first line on stdout. From a benchmark,
+start(**options) serves in-process and returns (server, base_url); spawn()
+runs the server in a child process and yields its base_url, so the
+server's CPU time is not counted against the client.
+"""
+import argparse
+import http.server
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PATTERN = random.Random(0).randbytes(1024 * 1024 + 7)  # odd length: no block-aligned repeats
+SEND_CHUNK = 64 * 1024
+TYPES = {'.mp4': 'video/mp4', '.jpg': 'image/jpeg', '.png': 'image/png', '.m4a': 'audio/mp4'}
+UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_size(text):
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([kmg]?)b?", str(text).strip().lower())
+    if not m:
+        raise ValueError(f"bad size: {text}")
+    return int(float(m[1]) * UNITS[m[2]])
+
+
+def body(size, start, end):
+    """Bytes start..end (inclusive) of the generated file of ``size``."""
+    pos = start
+    while pos <= end:
+        offset = (pos + size) % len(PATTERN)
+        n = min(SEND_CHUNK, end + 1 - pos, len(PATTERN) - offset)
+        yield PATTERN[offset:offset + n]
+        pos += n
+
+
+class Options:
+    def __init__(self, latency=0.0, bandwidth=None, ranges=True, etag=False, drop_after=None, drop_every=1,
+                 rate=None, burst=1, retry_after=None):
+        self.latency = latency
+        self.bandwidth = parse_size(bandwidth) if bandwidth else None
+        self.ranges = ranges
+        self.etag = etag
+        self.drop_after = parse_size(drop_after) if drop_after is not None else None
+        self.drop_every = max(1, drop_every)
+        self.rate = rate
+        self.burst = burst
+        self.retry_after = retry_after
+        self.tokens, self.stamp = float(burst), time.monotonic()
+        self.requests = 0
+        self.served = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def take_token(self):
+        # The server side of a platform's rate limit: a token bucket
+        with self.lock:
+            self.served += 1
+            if not self.rate:
+                return True
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    def take_drop(self):
+        with self.lock:
+            self.requests += 1
+            return self.drop_after is not None and self.requests % self.drop_every == 0
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = Options()
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def do_GET(self):
+        self.respond()
+
+    def respond(self, head=False):
+        opts = self.options
+        name = self.path.split('?')[0].lstrip('/')
+        if name == 'stats':
+            data = json.dumps({'requests': opts.served, 'throttled': opts.throttled}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        stem, ext = os.path.splitext(name)
+        try:
+            size = parse_size(stem)
+        except ValueError:
+            self.send_error(404)
+            return
+        if opts.latency:
+            time.sleep(opts.latency)
+        if not opts.take_token():
+            self.send_response(429)
+            if opts.retry_after is not None:
+                self.send_header('Retry-After', str(opts.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end, code = 0, size - 1, 200
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get('Range', ''))
+        if m and opts.ranges:
+            start, end = int(m[1]), min(int(m[2]) if m[2] else size - 1, size - 1)
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            code = 206
+
+        self.send_response(code)
+        self.send_header('Content-Type', TYPES.get(ext, 'application/octet-stream'))
+        self.send_header('Content-Length', str(end + 1 - start))
+        if opts.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if code == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        if opts.etag:
+            self.send_header('ETag', f'"{size:x}"')
+        self.end_headers()
+        if head:
+            return
+
+        drop_at = opts.drop_after if opts.take_drop() else None
+        sent, began = 0, time.monotonic()
+        for chunk in body(size, start, end):
+            if drop_at is not None and sent + len(chunk) > drop_at:
+                self.wfile.write(chunk[:max(0, drop_at - sent)])
+                self.wfile.flush()
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            if opts.bandwidth:
+                ahead = sent / opts.bandwidth - (time.monotonic() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+
+def start(**options):
+    handler = type('BoundHandler', (Handler,), {'options': Options(**options)})
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@contextmanager
+def spawn(latency=0.0, bandwidth=None, ranges=True, etag=False, drop_after=None, drop_every=1,
+          rate=None, burst=1, retry_after=None):
+    args = [sys.executable, os.path.abspath(__file__), '--latency', str(latency), '--drop-every', str(drop_every)]
+    if bandwidth:
+        args += ['--bandwidth', str(bandwidth)]
+    if not ranges:
+        args.append('--no-ranges')
+    if etag:
+        args.append('--etag')
+    if drop_after is not None:
+        args += ['--drop-after', str(drop_after)]
+    if rate:
+        args += ['--rate', str(rate), '--burst', str(burst)]
+    if retry_after is not None:
+        args += ['--retry-after', str(retry_after)]
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(proc.stdout.readline())
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--bandwidth')
+    parser.add_argument('--no-ranges', action='store_true')
+    parser.add_argument('--etag', action='store_true')
+    parser.add_argument('--drop-after')
+    parser.add_argument('--drop-every', type=int, default=1)
+    parser.add_argument('--rate', type=float)
+    parser.add_argument('--burst', type=int, default=1)
+    parser.add_argument('--retry-after', type=int)
+    args = parser.parse_args(argv)
+
+    handler = type('BoundHandler', (Handler,), {'options': Options(
+        args.latency, args.bandwidth, not args.no_ranges, args.etag, args.drop_after, args.drop_every,
+        args.rate, args.burst, args.retry_after)})
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', args.port), handler)
+    server.daemon_threads = True
+    print(server.server_address[1], flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import downloader
+import media_parser
+import telemetry
+from utils import classify_url, detect_platform, link_key
+from downloader import download_iter, MAX_WORKERS, QUALITY_PROFILES, DEFAULT_PROFILE, FRAGMENT_FANOUT
+from progress_bus import ProgressBus
+from playlist import HandOff
+from postprocess import postprocessor, ENABLED_STEPS, STEPS
+from tasks import resolve_items, stream_resolve, plan_downloads, save_download
+
+# Headless entry point: nothing here may import Kivy or KivyMD.
+#
+#   python cli.py batch urls.txt --workers 8
+#   cat urls.txt | python . batch -
+#   echo https://www.youtube.com/playlist?list=... | python cli.py batch -
+#   python cli.py stats --export metrics.csv
+#
+# Every line on stdout is one JSON event; the last one is a summary.
+
+PROGRESS_SECS = 1.0
+
+_out_lock = threading.Lock()
+
+
+def emit(event, **fields):
+    with _out_lock:
+        sys.stdout.write(json.dumps({"event": event, **fields}) + "\n")
+        sys.stdout.flush()
+
+
+def read_urls(source):
+    f = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        lines = [line.strip() for line in f]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    # Blank lines and # comments are ignored; links to the same content
+    # (other host variant or tracking params) are queued once
+    urls = {}
+    for line in lines:
+        if line and not line.startswith("#"):
+            urls.setdefault(link_key(line), line)
+    return list(urls.values())
+
+
+def _resolve(url, profile=None):
+    platform = detect_platform(url)
+    if platform == "unknown":
+        return url, platform, None, "unsupported link"
+    try:
+        return url, platform, resolve_items(url, platform, profile), None
+    except Exception as e:
+        return url, platform, None, str(e)
+
+
+def _report_progress(bus, stop):
+    while not stop.wait(PROGRESS_SECS):
+        snap = bus.snapshot()
+        if snap is not None:
+            emit("progress", percent=round(snap["percent"], 1), speed=int(snap["speed"]),
+                 eta=round(snap["eta"]) if snap["eta"] is not None else None,
+                 finished=snap["finished"], count=snap["count"])
+
+
+def _queue(urls, workers, profile, counts, handoff):
+    # Generator feeding the download stage. Single links are resolved up
+    # front on a pool; playlists and profiles are streamed entry by entry,
+    # so their first downloads start while later entries are enumerated
+    taken, n = set(), itertools.count()
+    singles = [url for url in urls if not classify_url(url).collection]
+    collections = [url for url in urls if classify_url(url).collection]
+
+    def planned(url, platform, items):
+        todo, skipped = plan_downloads(items, taken)
+        for name in skipped:
+            counts["skipped"] += 1
+            emit("skipped", url=url, platform=platform, file=name)
+        for it in todo:
+            handoff.begin(it)
+        return [{**it, "platform": platform, "key": str(next(n))} for it in todo]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="resolve") as pool:
+        resolved = list(pool.map(lambda url: _resolve(url, profile), singles))
+    for url, platform, items, error in resolved:
+        if error:
+            counts["failed"] += 1
+            emit("error", url=url, platform=platform, error=error)
+            continue
+        todo = planned(url, platform, items)
+        emit("resolved", url=url, platform=platform, items=len(items), queued=len(todo))
+        yield from todo
+
+    for url in collections:
+        platform = detect_platform(url)
+        entries = 0
+        try:
+            for item in stream_resolve(url, platform, profile):
+                entries += 1
+                yield from planned(url, platform, [item])
+        except Exception as e:
+            counts["failed"] += 1
+            emit("error", url=url, platform=platform, error=str(e))
+            continue
+        emit("resolved", url=url, platform=platform, items=entries, playlist=True)
+
+
+def batch(urls, workers=MAX_WORKERS, profile=None):
+    """Resolve and download ``urls``; returns the number of failures."""
+    counts = {"links": len(urls), "downloaded": 0, "skipped": 0, "failed": 0}
+    downloader.init()
+    media_parser.init()
+
+    bus = ProgressBus()
+    stop = threading.Event()
+    reporter = threading.Thread(target=_report_progress, args=(bus, stop), daemon=True)
+    reporter.start()
+    postprocessor.subscribe(lambda e: emit("processed", path=e["path"], history_id=e["id"],
+                                           steps=e["postprocess"]))
+    # Playlist cursors only move past items that were actually downloaded
+    handoff = HandOff()
+    try:
+        for job, res in download_iter(_queue(urls, workers, profile, counts, handoff), bus=bus, max_workers=workers):
+            source = job.get("source", job["url"])
+            if "error" in res:
+                counts["failed"] += 1
+                emit("failed", url=source, platform=job["platform"], file=job["filename"], error=res["error"])
+                continue
+            entry = save_download(job["platform"], job, res["path"])
+            handoff.end(job)
+            counts["downloaded"] += 1
+            emit("downloaded", url=source, platform=job["platform"], path=res["path"], history_id=entry["id"])
+        # Post-processing of the last files is still running
+        postprocessor.wait()
+    finally:
+        stop.set()
+        reporter.join()
+        postprocessor.shutdown()
+
+    emit("summary", **counts)
+    return counts["failed"]
+
+
+def stats(export=None):
+    # One event per (operation, platform) with p50/p95 timings
+    for group in telemetry.summarize():
+        emit("stats", **group)
+    if export:
+        emit("exported", path=export, records=telemetry.export(export))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mediasaver", description="Headless MediaSaver")
+    commands = parser.add_subparsers(dest="command", required=True)
+    p_batch = commands.add_parser("batch", help="download every link in a file (one per line)")
+    p_batch.add_argument("source", nargs="?", default="-", help="file with links, or - for stdin (default)")
+    p_batch.add_argument("-w", "--workers", type=int, default=MAX_WORKERS,
+                         help=f"concurrent resolves/downloads (default {MAX_WORKERS})")
+    p_batch.add_argument("--profile", choices=sorted(QUALITY_PROFILES), default=DEFAULT_PROFILE,
+                         help=f"quality for yt-dlp downloads such as YouTube (default {DEFAULT_PROFILE})")
+    p_batch.add_argument("--fragments", type=int, default=FRAGMENT_FANOUT,
+                         help=f"HLS/DASH fragments fetched in parallel (default {FRAGMENT_FANOUT})")
+    p_batch.add_argument("--steps", default=",".join(ENABLED_STEPS),
+                         help=f"post-processing steps, in order, or '' for none ({', '.join(STEPS)};"
+                              f" default {','.join(ENABLED_STEPS)})")
+    p_stats = commands.add_parser("stats", help="p50/p95 download and metadata timings from the metrics log")
+    p_stats.add_argument("--export", metavar="PATH",
+                         help="also write every record to PATH (.csv for CSV, otherwise JSON lines)")
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        downloader.FRAGMENT_FANOUT = args.fragments
+        postprocessor.steps = [s for s in args.steps.split(",") if s]
+        unknown = [s for s in postprocessor.steps if s not in STEPS]
+        if unknown:
+            parser.error(f"unknown post-processing step: {', '.join(unknown)}")
+        started = time.monotonic()
+        failed = batch(read_urls(args.source), workers=args.workers, profile=args.profile)
+        print(f"done in {time.monotonic() - started:.1f}s", file=sys.stderr)
+        return 1 if failed else 0
+    if args.command == "stats":
+        stats(args.export)
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
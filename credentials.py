@@ -1,7 +1,16 @@
 import os
+import glob
+import threading
+from ratelimit import limiter
 
 CRED_FILE = "credentials.txt"
 
+# yt-dlp cookie jars. instagram.txt belongs to the first account (or no
+# account); the jars of further accounts, and any exported from a browser,
+# are instagram-<name>.txt next to it.
+COOKIE_DIR = "cookies"
+COOKIE_FILE = os.path.join(COOKIE_DIR, "instagram.txt")
+
 def save_instagram_credentials(username: str, password: str):
     with open(CRED_FILE, "w") as f:
         f.write(f"{username}\n{password}")
@@ -17,3 +26,66 @@ def load_instagram_credentials():
 
 def credentials_exist():
     return os.path.exists(CRED_FILE)
+
+# More accounts follow the first one in credentials.txt, two lines each
+def add_instagram_account(username: str, password: str):
+    accounts = [a for a in load_instagram_accounts() if a[0] != username]
+    with open(CRED_FILE, "w") as f:
+        f.write("\n".join(f"{u}\n{p}" for u, p in accounts + [(username, password)]))
+    instagram_sessions.reload()
+
+def load_instagram_accounts():
+    if not os.path.exists(CRED_FILE):
+        return []
+    with open(CRED_FILE, "r") as f:
+        lines = f.read().splitlines()
+    return [(lines[i], lines[i + 1]) for i in range(0, len(lines) - 1, 2) if lines[i]]
+
+
+class SessionPool:
+    """Rotates Instagram requests across accounts and cookie jars.
+
+    Each session is paced and blocked separately by ratelimit.limiter
+    (host "instagram.com", split by session name), so when one account
+    hits a rate limit or login wall the next request goes out on another.
+    """
+
+    def __init__(self, host="instagram.com"):
+        self.host = host
+        self._sessions = None
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        sessions = []
+        for i, (username, password) in enumerate(load_instagram_accounts()):
+            jar = COOKIE_FILE if i == 0 else os.path.join(COOKIE_DIR, f"instagram-{username}.txt")
+            sessions.append({"name": username, "cookiefile": jar, "username": username, "password": password})
+        known = {s["cookiefile"] for s in sessions}
+        for jar in [COOKIE_FILE] + sorted(glob.glob(os.path.join(COOKIE_DIR, "instagram-*.txt"))):
+            if jar not in known and os.path.exists(jar):
+                sessions.append({"name": os.path.basename(jar)[:-4], "cookiefile": jar})
+        # No account and no jar: the default jar, as yt-dlp would create it
+        return sessions or [{"name": "default", "cookiefile": COOKIE_FILE}]
+
+    def reload(self):
+        with self._lock:
+            self._sessions = None
+
+    def sessions(self):
+        with self._lock:
+            if self._sessions is None:
+                self._sessions = self._load()
+            return list(self._sessions)
+
+    def pick(self):
+        """The session that can go soonest; the least recently used on a tie."""
+        sessions = self.sessions()
+        with self._lock:
+            best = min(sessions, key=lambda s: (round(limiter.delay(self.host, s["name"]), 1),
+                                                self._last.get(s["name"], 0)))
+            self._last[best["name"]] = max(self._last.values(), default=0) + 1
+        return best
+
+
+instagram_sessions = SessionPool()
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import hashlib
+import threading
+
+# Content hashes are computed while bytes are written, never by reading a
+# file back. To allow that for segmented downloads too, the hash is a
+# two-level one: sha256 over the concatenated sha256 digests of each
+# BLOCK_SIZE block. Segments start on block boundaries, so every block is
+# hashed in order by exactly one writer.
+BLOCK_SIZE = 1024 * 1024
+
+DB_FILE = "downloads.db"
+
+
+class BlockHasher:
+    """Hashes a byte stream that starts at block-aligned ``offset``.
+
+    Finished blocks collect in ``blocks`` as {str(block_index): hexdigest};
+    take_blocks() hands them over, e.g. to a resume manifest.
+    """
+
+    def __init__(self, offset=0):
+        assert offset % BLOCK_SIZE == 0
+        self.index = offset // BLOCK_SIZE
+        self.blocks = {}
+        self._current = hashlib.sha256()
+        self._filled = 0
+
+    def update(self, data):
+        data = memoryview(data)
+        while data:
+            take = min(BLOCK_SIZE - self._filled, len(data))
+            self._current.update(data[:take])
+            self._filled += take
+            data = data[take:]
+            if self._filled == BLOCK_SIZE:
+                self._close_block()
+
+    def _close_block(self):
+        self.blocks[str(self.index)] = self._current.hexdigest()
+        self.index += 1
+        self._current = hashlib.sha256()
+        self._filled = 0
+
+    def take_blocks(self):
+        blocks, self.blocks = self.blocks, {}
+        return blocks
+
+    def finish(self):
+        if self._filled:
+            self._close_block()
+        return self.take_blocks()
+
+
+def content_hash(blocks, size):
+    count = -(-size // BLOCK_SIZE)
+    top = hashlib.sha256()
+    for i in range(count):
+        top.update(bytes.fromhex(blocks[str(i)]))
+    return top.hexdigest()
+
+
+class DownloadIndex:
+    """Maps lookup keys (canonical media id, source URL, ETag) to stored content.
+
+    Each distinct content hash has one stored file (blob). Later copies of
+    the same content are hardlinked to it where the filesystem allows.
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                " hash TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS keys ("
+                " key TEXT PRIMARY KEY, hash TEXT NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def lookup(self, keys):
+        """Return the stored path for the first key we already have, else None."""
+        keys = [k for k in keys if k]
+        if not keys:
+            return None
+        with self._lock:
+            db = self._conn()
+            for key in keys:
+                row = db.execute(
+                    "SELECT blobs.path FROM keys JOIN blobs ON keys.hash = blobs.hash"
+                    " WHERE keys.key = ?", (key,)).fetchone()
+                if row and os.path.exists(row[0]):
+                    return row[0]
+        return None
+
+    def record(self, path, digest, size, keys):
+        """Register a finished file. Returns the path to use for it.
+
+        If identical content is already stored elsewhere, ``path`` is
+        replaced by a hardlink to it, so the bytes exist once on disk.
+        """
+        with self._lock:
+            db = self._conn()
+            row = db.execute("SELECT path FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if row and row[0] != path and os.path.exists(row[0]):
+                link_into(row[0], path)
+            else:
+                db.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (digest, path, size))
+            db.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?)",
+                           [(k, digest) for k in keys if k])
+            db.commit()
+        return path
+
+    def add_keys(self, path, keys):
+        with self._lock:
+            db = self._conn()
+            row = db.execute("SELECT hash FROM blobs WHERE path = ?", (path,)).fetchone()
+            if row:
+                db.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?)",
+                               [(k, row[0]) for k in keys if k])
+                db.commit()
+
+    def move(self, old, new):
+        # The file at ``old`` was replaced by ``new`` (e.g. remuxed): its
+        # keys keep finding it, though the bytes no longer hash the same
+        with self._lock:
+            db = self._conn()
+            db.execute("UPDATE blobs SET path = ? WHERE path = ?", (new, old))
+            db.commit()
+
+
+def link_into(existing, path):
+    # Replace ``path`` with a hardlink to ``existing``; shared storage on
+    # Android (FAT/sdcardfs) has no hardlinks, so both copies stay there
+    if os.path.abspath(existing) == os.path.abspath(path):
+        return True
+    tmp = path + ".link"
+    try:
+        os.link(existing, tmp)
+        os.replace(tmp, path)
+        return True
+    except OSError:
+        return False
+
+
+index = DownloadIndex()
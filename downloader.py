@@ -1,75 +1,753 @@
-import yt_dlp
-import requests
 import os
+import json
+import time
+import queue
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import http_session
+import ratelimit
+import telemetry
+from download_index import index, BlockHasher, BLOCK_SIZE, content_hash
+from extractor_pool import pool as extractor
 
-
-# Try Android path, fall back to local directory
 try:
-    from android.storage import primary_external_storage_path
-    DOWNLOAD_DIR = os.path.join(primary_external_storage_path(), "Download", "StealthFetcher")
+    import fcntl
 except ImportError:
-    DOWNLOAD_DIR = os.path.join(os.getcwd(), "StealthFetcher")
+    fcntl = None
+
+
+# Set by init(): shared Download/StealthFetcher on Android, ./StealthFetcher elsewhere
+DOWNLOAD_DIR = None
+DIRECTORY = None
+
+# Download engine limits: total parallel transfers and transfers per CDN host
+MAX_WORKERS = 4
+PER_HOST_LIMIT = 2
+
+# Segmented mode: files at least this big are fetched as parallel byte ranges
+SEGMENT_MIN_SIZE = 8 * 1024 * 1024
+SEGMENT_COUNT = 4
+SEGMENT_RETRIES = 2
+MANIFEST_SAVE_SECS = 1.0
+PART_SUFFIX = ".part"
+
+# Write path: each read is sized to cover roughly CHUNK_TARGET_SECS of transfer
+# at the observed throughput, clamped to [CHUNK_MIN, CHUNK_MAX]. Large reads
+# keep the per-byte cost of the Python loop negligible on slow phone CPUs.
+CHUNK_MIN = 64 * 1024
+CHUNK_MAX = 4 * 1024 * 1024
+CHUNK_TARGET_SECS = 0.1
+
+
+# Progress callbacks everywhere in this module are on_progress(done, total) in
+# bytes, total being 0 when unknown. They run on the download thread, so they
+# must be cheap: feed them into a progress_bus.ProgressBus rather than the UI.
+
+def init():
+    """Resolve and create the download directory; cheap after the first call."""
+    global DOWNLOAD_DIR, DIRECTORY
+    if DOWNLOAD_DIR is None:
+        try:
+            from android.storage import primary_external_storage_path
+            directory = os.path.join(primary_external_storage_path(), "Download", "StealthFetcher")
+        except ImportError:
+            directory = os.path.join(os.getcwd(), "StealthFetcher")
+        os.makedirs(directory, exist_ok=True)
+        DOWNLOAD_DIR = DIRECTORY = directory
+    return DOWNLOAD_DIR
+
+
+def download_file(url, filename, on_progress=None, keys=()):
+    # ``keys`` identify the media for the download index (e.g. a canonical
+    # media id). Known keys, the URL or the server's ETag short-circuit the
+    # transfer and return the file we already have.
+    path = os.path.join(init(), filename)
+    keys = _source_keys(url, keys)
+    with telemetry.span("download", host=urlparse(url).netloc or "local") as span:
+        try:
+            with part_lock(path):
+                return _fetch_file(url, path, on_progress, keys, span)
+        except Exception as e:
+            span.fail(e)
+            return {"error": str(e)}
+
+
+def _fetch_file(url, path, on_progress, keys, span):
+    with span.phase("lookup"):
+        existing = index.lookup(keys)
+    if existing:
+        span.set(cache="hit")
+        return existing
+
+    if _is_local(url):
+        st = os.stat(url)
+        with span.phase("transfer"):
+            method = ingest_local(url, path, on_progress)
+        span.set(mode=f"local:{method}", bytes=st.st_size)
+        with span.phase("finalize"):
+            return index.record(path, local_digest(st), st.st_size, keys)
+
+    with span.phase("probe"):
+        info = probe(url)
+    if info['etag']:
+        etag_key = f"etag:{info['etag']}:{info['size']}"
+        existing = index.lookup([etag_key])
+        if existing:
+            index.add_keys(existing, keys)
+            span.set(cache="hit")
+            return existing
+        keys.append(etag_key)
 
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    # A manifest left by an interrupted download or a prefetch is resumed
+    # whatever the size, as long as the size is known
+    resumable = os.path.exists(path + PART_SUFFIX + ".json")
+    if info['ranges'] and info['size'] and (info['size'] >= SEGMENT_MIN_SIZE or resumable):
+        span.set(mode="segmented")
+        digest, size = _download_segmented(url, path, info, on_progress)
+    else:
+        span.set(mode="stream")
+        digest, size = _download_stream(url, path, on_progress)
+    span.set(bytes=size)
+    with span.phase("finalize"):
+        return index.record(path, digest, size, keys)
 
-DIRECTORY = DOWNLOAD_DIR
 
+def find_existing(url, keys=()):
+    # Offline check against the download index: no request is made
+    return index.lookup(_source_keys(url, keys))
 
-def download_file(url, filename, on_progress=None):
-    path = os.path.join(DOWNLOAD_DIR, filename)
+
+def _is_local(url):
+    return not url.startswith(("http://", "https://")) and os.path.isfile(url)
+
+
+def _source_keys(url, keys):
+    # A local path says nothing about its content (statuses get rewritten
+    # under the same name), so only remote URLs become index keys
+    return [*keys] if _is_local(url) else [*keys, f"url:{url}"]
+
+
+def unique_filename(filename, taken=()):
+    # Same name, different content: keep both as "name (1).ext", ... A
+    # leftover .part with this name is not a clash, it gets resumed.
+    base, ext = os.path.splitext(filename)
+    candidate, n = filename, 1
+    while candidate in taken or os.path.exists(os.path.join(init(), candidate)):
+        candidate = f"{base} ({n}){ext}"
+        n += 1
+    return candidate
+
+
+_part_locks = {}
+_part_locks_guard = threading.Lock()
+
+
+def part_lock(path):
+    # Serializes everything writing ``path``'s .part file and manifest: a
+    # download waits for a prefetch of the same file to finish
+    with _part_locks_guard:
+        return _part_locks.setdefault(path, threading.Lock())
+
+
+def probe(url):
+    # HEAD is enough to learn size and range support; some CDNs refuse it,
+    # in which case we simply fall back to a single stream.
     try:
-        with requests.get(url, stream=True) as response:
+        with http_session.head(url) as response:
             response.raise_for_status()
-            total = int(response.headers.get('content-length', 0))
-            downloaded = 0
-
-            with open(path, 'wb') as file:
-                for chunk in response.iter_content(1024):
-                    if chunk:
-                        file.write(chunk)
-                        downloaded += len(chunk)
-                        if on_progress and total:
-                            percent = (downloaded * 100 / total)
-                            on_progress(percent)
-
-        return path
-    except Exception as e:
-        return {"error": str(e)}
-
-
-def download_from_ytdlp(url, on_progress=None):
-    class YTDLogger:
-        def debug(self, msg): pass
-        def warning(self, msg): pass
-        def error(self, msg): print(f"[YTDLP ERROR]: {msg}")
-        
-
-        # ✅ Prevent 'str' object has no attribute 'write'
-        def write(self, msg):
-            print(f"[YTDLP] {msg.strip()}")
-        
-        def flush(self): pass  # Required by file-like objects
-
-    def hook(d):
-        if d.get("status") == "downloading" and on_progress:
-            downloaded = d.get("downloaded_bytes", 0)
-            total = d.get("total_bytes", 1)
+            headers = response.headers
+    except Exception:
+        return {'size': 0, 'ranges': False, 'etag': None}
+
+    return {
+        'size': int(headers.get('content-length', 0) or 0),
+        'ranges': headers.get('accept-ranges', '').lower() == 'bytes',
+        'etag': headers.get('etag'),
+    }
+
+
+def _preallocate(file, size):
+    try:
+        os.posix_fallocate(file.fileno(), 0, size)
+    except (AttributeError, OSError):
+        file.truncate(size)
+
+
+class ChunkSizer:
+    def __init__(self, size=CHUNK_MIN):
+        self.size = size
+
+    def update(self, nbytes, elapsed):
+        # Grow/shrink by powers of two so a single noisy read can't swing it far
+        wanted = nbytes / elapsed * CHUNK_TARGET_SECS if elapsed > 0 else CHUNK_MAX
+        if wanted >= self.size * 2:
+            self.size = min(self.size * 2, CHUNK_MAX)
+        elif wanted < self.size / 2:
+            self.size = max(self.size // 2, CHUNK_MIN)
+
+
+def _stream_into(response, file, on_chunk=None, span=None):
+    """Copy the response body into ``file`` at its current position.
+
+    Reads go into one reused buffer and are written straight from a
+    memoryview, so no per-chunk bytes objects are kept around. ``on_chunk``
+    gets a memoryview of each chunk, valid only during the call.
+    Time spent reading, writing and in ``on_chunk`` is added to ``span``.
+    Returns the number of bytes written.
+    """
+    raw = response.raw
+    encoding = response.headers.get('content-encoding', 'identity').lower()
+    decode = encoding not in ('', 'identity')
+
+    sizer = ChunkSizer()
+    buf = bytearray(CHUNK_MAX)
+    view = memoryview(buf)
+    written = 0
+    read_secs = write_secs = chunk_secs = 0.0
+    while True:
+        started = time.perf_counter()
+        if decode:
+            # Compressed bodies must go through urllib3's decoder
+            data = raw.read(sizer.size, decode_content=True)
+            n = len(data)
+            view[:n] = data
+        else:
+            n = raw.readinto(view[:sizer.size])
+        if not n:
+            break
+        read_at = time.perf_counter()
+        sizer.update(n, read_at - started)
+        read_secs += read_at - started
+
+        chunk = view[:n]
+        file.write(chunk)
+        written += n
+        if on_chunk:
+            wrote_at = time.perf_counter()
+            on_chunk(chunk)
+            chunk_secs += time.perf_counter() - wrote_at
+            write_secs += wrote_at - read_at
+        else:
+            write_secs += time.perf_counter() - read_at
+    if span:
+        span.add("read", read_secs)
+        span.add("write", write_secs)
+        span.add("hash", chunk_secs)
+    return written
+
+
+def _download_stream(url, path, on_progress=None):
+    part = path + PART_SUFFIX
+    span = telemetry.current()
+    started = time.perf_counter()
+    with http_session.get(url, stream=True) as response:
+        if span:
+            span.add("ttfb", time.perf_counter() - started)
+        response.raise_for_status()
+        total = int(response.headers.get('content-length', 0))
+        state = {'downloaded': 0}
+        hasher = BlockHasher()
+
+        def advance(chunk):
+            hasher.update(chunk)
+            state['downloaded'] += len(chunk)
+            if on_progress:
+                on_progress(state['downloaded'], total)
+
+        with open(part, 'wb') as file:
             if total:
-                percent = (downloaded * 100 / total)
-                on_progress(percent)
+                _preallocate(file, total)
+            written = _stream_into(response, file, advance, span)
+            # Content-length may be the compressed size; drop any slack
+            file.truncate(written)
+        if span:
+            span.add("transfer", time.perf_counter() - started)
 
-    
-    ydl_opts = {
-        'outtmpl': os.path.join(DOWNLOAD_DIR, '%(title)s.%(ext)s'),
-        'quiet': True,
-        'progress_hooks': [hook],
-        'logger': YTDLogger(),
+    os.replace(part, path)
+    # A manifest left from an attempt whose size is now unknown is stale
+    if os.path.exists(part + ".json"):
+        os.remove(part + ".json")
+    return content_hash(hasher.finish(), written), written
+
+
+# --- Local sources ------------------------------------------------------------
+#
+# Files already on the device (WhatsApp statuses) are ingested with the
+# cheapest method the kernel offers, in order: a hardlink, a reflink (FICLONE,
+# copy-on-write on btrfs/XFS/f2fs), then in-kernel copies with
+# copy_file_range or sendfile. Only when none of those work do bytes pass
+# through Python. The copy is never re-read, so the index keys it by file
+# identity rather than by content hash.
+
+LOCAL_BLOCK = 16 * 1024 * 1024
+FICLONE = 0x40049409
+
+
+def local_digest(st):
+    return f"file:{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def ingest_local(src, path, on_progress=None):
+    """Place local file ``src`` at ``path``; returns the method used."""
+    st = os.stat(src)
+    part = path + PART_SUFFIX
+    if os.path.lexists(part):
+        os.remove(part)
+
+    try:
+        # Same inode: mtime and everything else come along for free
+        os.link(src, part)
+        method = "link"
+    except OSError:
+        try:
+            with open(src, 'rb') as source, open(part, 'wb') as file:
+                if _reflink(source, file):
+                    method = "reflink"
+                else:
+                    method = _copy_kernel(source, file, st.st_size, on_progress)
+                after = os.fstat(source.fileno())
+                if (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                    raise OSError(f"{src} changed while copying")
+            shutil.copystat(src, part)
+        except OSError:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+
+    os.replace(part, path)
+    if on_progress:
+        on_progress(st.st_size, st.st_size)
+    return method
+
+
+def _reflink(source, file):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(file.fileno(), FICLONE, source.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def _copy_kernel(source, file, size, on_progress=None):
+    src, dst = source.fileno(), file.fileno()
+    copied = 0
+    methods = [m for m in ("copy_file_range", "sendfile") if hasattr(os, m)]
+    while copied < size:
+        count = min(LOCAL_BLOCK, size - copied)
+        try:
+            if not methods:
+                n = _copy_buffered(source, file, copied, count)
+            elif methods[0] == "copy_file_range":
+                n = os.copy_file_range(src, dst, count, copied, copied)
+            else:
+                os.lseek(dst, copied, os.SEEK_SET)
+                n = os.sendfile(dst, src, copied, count)
+        except OSError:
+            # Not supported across these filesystems: try the next method
+            if not methods:
+                raise
+            methods.pop(0)
+            continue
+        if not n:
+            # The source shrank while we copied it (a status rewritten in place)
+            raise OSError(f"{source.name} changed while copying: {copied} of {size} bytes")
+        copied += n
+        if on_progress:
+            on_progress(copied, size)
+    return methods[0] if methods else "read"
+
+
+def _copy_buffered(source, file, offset, count):
+    source.seek(offset)
+    file.seek(offset)
+    data = source.read(count)
+    file.write(data)
+    return len(data)
+
+
+# --- Segmented, resumable downloads -----------------------------------------
+#
+# The file is fetched into "<name>.part" as SEGMENT_COUNT byte ranges on
+# parallel connections. "<name>.part.json" records how far each range got, so
+# a later attempt for the same file only requests the missing bytes. Ranges
+# start on download_index block boundaries and the manifest keeps finished
+# block digests, so the content hash survives a resume without a re-read.
+
+def _split_ranges(size, count):
+    step = -(-size // count)
+    step = -(-step // BLOCK_SIZE) * BLOCK_SIZE
+    return [{'start': start, 'end': min(start + step, size) - 1, 'done': 0}
+            for start in range(0, size, step)]
+
+
+def _load_manifest(part, info, count=SEGMENT_COUNT):
+    try:
+        with open(part + ".json") as f:
+            manifest = json.load(f)
+        if (os.path.exists(part) and manifest['size'] == info['size']
+                and manifest.get('etag') == info['etag'] and 'blocks' in manifest):
+            for seg in manifest['segments']:
+                _rewind_to_block(seg, manifest['blocks'])
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # A fresh manifest: whatever .part is left over (another size or version
+    # of the file) is dropped, so callers create and preallocate a new one
+    # rather than writing into a file with a stale tail
+    if os.path.exists(part):
+        os.remove(part)
+    return {
+        'size': info['size'],
+        'etag': info['etag'],
+        'segments': _split_ranges(info['size'], count),
+        'blocks': {},
     }
 
+
+def _rewind_to_block(seg, blocks):
+    # The hash state of a partly written block isn't saved, so such a block
+    # is fetched again from its start
+    partial = seg['done'] % BLOCK_SIZE
+    last_block = str((seg['start'] + seg['done'] - 1) // BLOCK_SIZE)
+    if partial and last_block not in blocks:
+        seg['done'] -= partial
+
+
+def _save_manifest(part, manifest):
+    tmp = part + ".json.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, part + ".json")
+
+
+def _download_segmented(url, path, info, on_progress=None):
+    part = path + PART_SUFFIX
+    manifest = _load_manifest(part, info)
+    segments = manifest['segments']
+    size = manifest['size']
+
+    if not os.path.exists(part):
+        with open(part, 'wb') as f:
+            _preallocate(f, size)
+
+    lock = threading.Lock()
+    state = {'saved_at': time.monotonic(), 'first_byte': False}
+    # Segments run on pool threads, so the span is passed along explicitly
+    span = telemetry.current()
+    started = time.perf_counter()
+
+    def advance(seg, n, hasher):
+        with lock:
+            seg['done'] += n
+            manifest['blocks'].update(hasher.take_blocks())
+            downloaded = sum(s['done'] for s in segments)
+            if time.monotonic() - state['saved_at'] >= MANIFEST_SAVE_SECS:
+                _save_manifest(part, manifest)
+                state['saved_at'] = time.monotonic()
+        if on_progress:
+            on_progress(downloaded, size)
+
+    def fetch(seg):
+        for attempt in range(SEGMENT_RETRIES + 1):
+            with lock:
+                _rewind_to_block(seg, manifest['blocks'])
+            start = seg['start'] + seg['done']
+            if start > seg['end']:
+                return
+            hasher = BlockHasher(start)
+
+            def on_chunk(chunk):
+                hasher.update(chunk)
+                advance(seg, len(chunk), hasher)
+
+            try:
+                headers = {'Range': f"bytes={start}-{seg['end']}"}
+                with http_session.get(url, headers=headers, stream=True) as response:
+                    with lock:
+                        if span and not state['first_byte']:
+                            state['first_byte'] = True
+                            span.add("ttfb", time.perf_counter() - started)
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise IOError("server ignored the byte range request")
+                    with open(part, 'r+b') as file:
+                        file.seek(start)
+                        _stream_into(response, file, on_chunk, span)
+                with lock:
+                    manifest['blocks'].update(hasher.finish())
+                return
+            except Exception:
+                if attempt == SEGMENT_RETRIES:
+                    raise
+                if span:
+                    span.count("retries")
+
+    pending = [seg for seg in segments if seg['start'] + seg['done'] <= seg['end']]
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-    except Exception as e:
-        print(f"YTDLP download error: {e}")
-        return {"error": str(e)}
+        with ThreadPoolExecutor(max_workers=max(1, len(pending)), thread_name_prefix="segment") as pool:
+            for future in [pool.submit(fetch, seg) for seg in pending]:
+                future.result()
+    finally:
+        with lock:
+            _save_manifest(part, manifest)
+        if span:
+            span.add("transfer", time.perf_counter() - started)
+
+    digest = content_hash(manifest['blocks'], size)
+    os.replace(part, path)
+    os.remove(part + ".json")
+    return digest, size
+
+
+class PrefetchCancelled(Exception):
+    pass
+
+
+def prefetch_head(url, filename, limit, cancelled=None):
+    """Fetch the first ``limit`` bytes of ``url`` into the .part file and
+    manifest that download_file(url, filename) then resumes from.
+
+    ``limit`` should be whole blocks. ``cancelled()`` is polled per chunk.
+    Returns the bytes fetched: 0 when the server can't resume a download,
+    in which case there is nothing worth keeping.
+    """
+    path = os.path.join(init(), filename)
+    part = path + PART_SUFFIX
+    with part_lock(path), telemetry.span("prefetch", host=urlparse(url).netloc) as span:
+        if os.path.exists(path):
+            return 0
+        info = probe(url)
+        if not info['ranges'] or not info['size']:
+            return 0
+        manifest = _load_manifest(part, info, SEGMENT_COUNT if info['size'] >= SEGMENT_MIN_SIZE else 1)
+        seg = manifest['segments'][0]
+        start = seg['start'] + seg['done']
+        end = min(seg['end'], limit - 1)
+        if start > end:
+            return 0
+        if not os.path.exists(part):
+            with open(part, 'wb') as f:
+                _preallocate(f, manifest['size'])
+
+        hasher = BlockHasher(start)
+
+        def on_chunk(chunk):
+            if cancelled and cancelled():
+                raise PrefetchCancelled()
+            hasher.update(chunk)
+            seg['done'] += len(chunk)
+
+        try:
+            headers = {'Range': f"bytes={start}-{end}"}
+            with http_session.get(url, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise IOError("server ignored the byte range request")
+                with open(part, 'r+b') as file:
+                    file.seek(start)
+                    _stream_into(response, file, on_chunk, span)
+            manifest['blocks'].update(hasher.finish())
+        finally:
+            # An unfinished block is fetched again by the download
+            manifest['blocks'].update(hasher.take_blocks())
+            _save_manifest(part, manifest)
+        fetched = seg['start'] + seg['done'] - start
+        span.set(bytes=fetched)
+        return fetched
+
+
+def discard_partial(filename):
+    # Drop a .part file and manifest nothing is going to resume
+    path = os.path.join(init(), filename)
+    with part_lock(path):
+        for leftover in (path + PART_SUFFIX, path + PART_SUFFIX + ".json"):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+
+
+def _item_runner(bus, per_host):
+    lock = threading.Lock()
+    host_slots = {}
+
+    def host_slot(url):
+        host = urlparse(url).netloc
+        with lock:
+            if host not in host_slots:
+                host_slots[host] = threading.BoundedSemaphore(per_host)
+            return host_slots[host]
+
+    def run(item):
+        url = item['url']
+        key = item.get('key', url)
+        if bus:
+            bus.update(key, 0)
+        try:
+            with host_slot(url), telemetry.tags(platform=item.get('platform', 'unknown')):
+                res = fetch_item(item, on_progress=bus.reporter(key) if bus else None)
+        except Exception as e:
+            res = {"error": str(e)}
+        if bus:
+            bus.finish(key)
+        if isinstance(res, dict):
+            return {"url": url, "error": res.get("error", "unknown error")}
+        return {"url": url, "path": res}
+
+    return run
+
+
+def download_many(items, bus=None, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT):
+    """Download ``items`` (dicts with 'url', 'filename' and optional index 'keys'
+    and yt-dlp 'profile', see fetch_item) on a bounded pool.
+
+    Progress for each item is published on ``bus`` under the item's 'key'
+    (its url by default). Returns one result per item, in order:
+    {'url', 'path'} or {'url', 'error'}. A failing item never stops the others.
+    """
+    if not items:
+        return []
+
+    run = _item_runner(bus, per_host)
+    workers = max(1, min(max_workers, len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as pool:
+        futures = [pool.submit(run, it) for it in items]
+        return [f.result() for f in futures]
+
+
+def download_iter(items, bus=None, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT):
+    """download_many for an iterable still being produced, e.g. a playlist
+    being enumerated. Yields (item, result) as downloads finish.
+
+    Items are taken only as download slots free up, so at most
+    2 * max_workers are held at once and a slow producer never stalls
+    finished downloads from being reported. An exception from ``items`` is
+    re-raised after the downloads already started have finished.
+    """
+    run = _item_runner(bus, per_host)
+    window = threading.Semaphore(2 * max(1, max_workers))
+    done = queue.Queue()
+    failure = []
+
+    def finished(item, future):
+        window.release()
+        done.put((item, future.result()))
+
+    def feed(pool):
+        try:
+            for item in items:
+                window.acquire()
+                pool.submit(run, item).add_done_callback(lambda f, it=item: finished(it, f))
+        except Exception as e:
+            failure.append(e)
+        finally:
+            pool.shutdown(wait=True)
+            done.put(None)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="download")
+    feeder = threading.Thread(target=feed, args=(pool,), name="download-feed", daemon=True)
+    feeder.start()
+    while True:
+        res = done.get()
+        if res is None:
+            break
+        yield res
+    feeder.join()
+    if failure:
+        raise failure[0]
+
+
+# --- yt-dlp mode ----------------------------------------------------------------
+#
+# Sites that serve separate video/audio streams or HLS/DASH fragments (YouTube)
+# are downloaded by yt-dlp itself, with a quality profile so only the bytes
+# the profile needs are transferred, and FRAGMENT_FANOUT fragments in flight.
+# Merging separate video and audio needs ffmpeg; without it the profiles fall
+# back to the best single file within their limits.
+
+QUALITY_PROFILES = {
+    "data_saver": {
+        "label": "Data saver (480p)",
+        "format": "bv*[height<=480]+ba/b[height<=480]/wv*+ba/w",
+        "format_single": "b[height<=480]/w",
+    },
+    "best": {
+        "label": "Best (up to 1080p)",
+        "format": "bv*[height<=1080]+ba/b[height<=1080]/bv*+ba/b",
+        "format_single": "b[height<=1080]/b",
+    },
+    "audio": {
+        "label": "Audio only",
+        "format": "ba[ext=m4a]/ba/b",
+        "format_single": "ba[ext=m4a]/ba/b",
+    },
+}
+DEFAULT_PROFILE = "best"
+FRAGMENT_FANOUT = 4
+
+
+def ytdlp_options(profile=None, fragments=None):
+    spec = QUALITY_PROFILES[profile or DEFAULT_PROFILE]
+    return {
+        'outtmpl': os.path.join(init(), '%(title).100B [%(id)s].%(ext)s'),
+        'quiet': True,
+        'format': spec['format'] if shutil.which('ffmpeg') else spec['format_single'],
+        'concurrent_fragment_downloads': fragments or FRAGMENT_FANOUT,
+    }
+
+
+def download_from_ytdlp(url, on_progress=None, profile=None, fragments=None):
+    opts = ytdlp_options(profile, fragments)
+    with telemetry.span("ytdlp", host=urlparse(url).netloc, profile=profile or DEFAULT_PROFILE,
+                        fragments=opts['concurrent_fragment_downloads']) as span:
+        # yt-dlp makes its own requests, so the page host is paced once per
+        # download and told about throttling afterwards
+        try:
+            ratelimit.limiter.acquire(url, max_wait=ratelimit.MAX_INLINE_WAIT)
+        except ratelimit.Throttled as e:
+            span.fail(e)
+            return {'error': str(e)}
+        # extract_info and the fragment downloads run in one worker call,
+        # so this is a single phase
+        with span.phase("transfer"):
+            res = extractor.download(url, opts, on_progress=on_progress)
+        if 'error' in res and ratelimit.is_throttle_error(res['error']):
+            ratelimit.limiter.throttled(url)
+        elif 'error' not in res:
+            ratelimit.limiter.ok(url)
+        if 'error' in res:
+            span.fail(res['error'])
+            print(f"YTDLP download error: {res['error']}")
+        elif res.get('path') and os.path.exists(res['path']):
+            span.set(bytes=os.path.getsize(res['path']))
+    return res
+
+
+def download_video(url, profile=None, on_progress=None, keys=(), fragments=None):
+    """yt-dlp download of ``url`` with a quality profile.
+
+    Same contract as download_file: the path, or {"error"}. ``keys`` should
+    include the profile, since each profile gives a different file.
+    """
+    existing = index.lookup(keys)
+    if existing:
+        return existing
+    res = download_from_ytdlp(url, on_progress, profile, fragments)
+    if 'error' in res:
+        return res
+    if not res.get('path') or not os.path.exists(res['path']):
+        return {"error": "yt-dlp reported no output file"}
+    st = os.stat(res['path'])
+    return index.record(res['path'], local_digest(st), st.st_size, keys)
+
 
+def fetch_item(item, on_progress=None):
+    # Items with a 'profile' go through yt-dlp, everything else is a plain file
+    if item.get('profile'):
+        return download_video(item['url'], item['profile'], on_progress, item.get('keys', ()))
+    return download_file(item['url'], item['filename'], on_progress=on_progress, keys=item.get('keys', ()))
@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import queue
+import itertools
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Long-lived yt-dlp workers. Each worker keeps initialised YoutubeDL instances
+# (extractors loaded, cookie jar read) per platform and option set, so only
+# the first link of a session pays for the setup.
+#
+# On desktop the workers are child processes speaking JSON lines over stdin /
+# stdout, which keeps extraction off the Kivy process and out of its GIL. The
+# child imports only this module and yt_dlp. Android has no usable
+# sys.executable, so there the same worker runs on threads instead.
+#
+# Jobs run in lanes, each with its own queue and workers, so a long job
+# can't hold up a short one of another kind: extraction (metadata for the
+# link the user just pasted) never waits behind yt-dlp downloads.
+
+POOL_SIZE = 2
+# Downloads at once; the scheduler runs at most downloader.MAX_WORKERS
+DOWNLOAD_WORKERS = 4
+# Playlists streamed at once. An enumeration paused on its consumer (a
+# selection dialog left open) holds its worker; further ones queue.
+ENUMERATE_WORKERS = 2
+# Lane of each job kind; other kinds run in the "extract" lane
+KIND_LANES = {"download": "download", "enumerate": "enumerate"}
+# Warm YoutubeDL instances kept per worker
+INSTANCE_LIMIT = 8
+
+
+def summarize_info(info):
+    media = []
+    if "entries" in info:
+        for entry in info["entries"] or []:
+            media_url = entry.get("url") if entry else None
+            if media_url:
+                media.append(media_url)
+    elif "url" in info:
+        media.append(info["url"])
+
+    return {
+        "caption": info.get("title", ""),
+        "username": info.get("uploader", ""),
+        "thumbnail": info.get("thumbnail", ""),
+        "media": media,
+    }
+
+
+def flat_entry(entry):
+    # What the download stage needs of a flat playlist entry
+    thumbs = entry.get("thumbnails") or [{}]
+    return {
+        "id": entry.get("id"),
+        "url": entry.get("url") or entry.get("webpage_url"),
+        "title": entry.get("title") or "",
+        "uploader": entry.get("uploader") or entry.get("channel") or "",
+        "thumbnail": entry.get("thumbnail") or thumbs[-1].get("url", ""),
+    }
+
+
+def _expected_size(info):
+    formats = info.get("requested_formats") or [info]
+    sizes = [f.get("filesize") or f.get("filesize_approx") for f in formats]
+    return sum(sizes) if all(sizes) else 0
+
+
+class _QuietLogger:
+    def debug(self, msg): pass
+    def warning(self, msg): pass
+    def error(self, msg): print(f"[YTDLP ERROR]: {msg}", file=sys.stderr)
+
+
+class _Worker:
+    """Runs jobs against cached YoutubeDL instances; used in both modes."""
+
+    def __init__(self):
+        self.instances = OrderedDict()
+        self.emit = None
+        self.files = {}
+
+    def _instance(self, platform, opts):
+        import yt_dlp
+
+        key = (platform, json.dumps(opts, sort_keys=True))
+        ydl = self.instances.get(key)
+        if ydl is None:
+            params = {**opts, "logger": _QuietLogger(), "progress_hooks": [self._hook]}
+            ydl = self.instances[key] = yt_dlp.YoutubeDL(params)
+            while len(self.instances) > INSTANCE_LIMIT:
+                self.instances.popitem(last=False)[1].close()
+        self.instances.move_to_end(key)
+        return ydl
+
+    def _hook(self, d):
+        if d.get("status") not in ("downloading", "finished") or not self.emit:
+            return
+        done = d.get("downloaded_bytes") or 0
+        total = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
+        if not total and d.get("fragment_index") and d.get("fragment_count"):
+            # Fragmented streams often carry no size: extrapolate from fragments
+            total = done * d["fragment_count"] // d["fragment_index"]
+        if d["status"] == "finished":
+            total = done = max(done, total)
+        # A merged download is several files in a row; report their sum
+        # against the sizes of all requested formats when yt-dlp knows them
+        self.files[d.get("filename", "")] = (done, total)
+        done = sum(f[0] for f in self.files.values())
+        total = max(sum(f[1] for f in self.files.values()), _expected_size(d.get("info_dict") or {}))
+        self.emit({"type": "progress", "downloaded": int(done), "total": int(total)})
+
+    def handle(self, job, emit):
+        self.emit = emit
+        self.files = {}
+        try:
+            ydl = self._instance(job.get("platform", ""), job.get("opts", {}))
+            kind = job["kind"]
+            if kind == "warm":
+                result = {"ok": True}
+            elif kind == "extract":
+                result = summarize_info(ydl.extract_info(job["url"], download=False))
+            elif kind == "enumerate":
+                result = self._enumerate(ydl, job, emit)
+            elif kind == "download":
+                info = ydl.extract_info(job["url"], download=True)
+                downloads = info.get("requested_downloads") or [{}]
+                result = {"ok": True, "path": downloads[0].get("filepath")}
+            else:
+                result = {"error": f"unknown job kind: {kind}"}
+            if ydl.params.get("cookiefile"):
+                ydl.save_cookies()
+        except Exception as e:
+            result = {"error": str(e)}
+        finally:
+            self.emit = None
+        emit({"type": "result", "result": result})
+
+    def _enumerate(self, ydl, job, emit):
+        # Streams a playlist's flat entries as "entry" messages. With
+        # process=False yt-dlp hands over its lazy entry iterator, so pages
+        # are fetched only as fast as the receiver takes entries. emit()
+        # returns False for an entry when the receiver wants no more.
+        info = ydl.extract_info(job["url"], download=False, process=False)
+        if info.get("_type") not in ("playlist", "multi_video"):
+            return {"ok": True, "playlist": False}
+        start = job.get("start", 0)
+        entries = info.get("entries") or []
+        if hasattr(entries, "getslice"):
+            entries = entries.getslice(start)  # paged lists can skip whole pages
+        else:
+            entries = itertools.islice(entries, start, None)
+        index, stopped = start, False
+        for entry in entries:
+            if entry and (entry.get("url") or entry.get("webpage_url")):
+                if emit({"type": "entry", "index": index, "entry": flat_entry(entry)}) is False:
+                    stopped = True
+                    break
+            index += 1
+        return {"ok": True, "playlist": True, "title": info.get("title", ""), "stopped": stopped,
+                "uploader": info.get("uploader") or info.get("channel") or "", "count": index}
+
+
+def _serve():
+    # Child process side: one JSON job per stdin line, JSON messages on stdout.
+    # yt-dlp must not write to our protocol stream, so stdout is reserved.
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    sys.stdout = sys.stderr
+    lock = threading.Lock()
+
+    def emit(msg):
+        with lock:
+            out.write(json.dumps(msg) + "\n")
+        if msg["type"] == "entry":
+            # The receiver answers every entry with whether to go on
+            return json.loads(sys.stdin.readline() or "{}").get("more", False)
+
+    worker = _Worker()
+    for line in sys.stdin:
+        if line.strip():
+            worker.handle(json.loads(line), emit)
+
+
+class _Job:
+    def __init__(self, msg, on_message):
+        self.msg = msg
+        self.on_message = on_message
+        self.future = Future()
+
+
+class ExtractorPool:
+    def __init__(self, size=POOL_SIZE, use_processes=None, download_workers=DOWNLOAD_WORKERS):
+        if use_processes is None:
+            use_processes = bool(sys.executable) and not hasattr(sys, "getandroidapilevel")
+        self.size = size
+        self.use_processes = use_processes
+        # Worker count per lane; a lane's workers start on its first job
+        self.lanes = {"extract": size, "download": download_workers, "enumerate": ENUMERATE_WORKERS}
+        self._jobs = {lane: queue.Queue() for lane in self.lanes}
+        self._ids = itertools.count(1)
+        self._drivers = {}
+        self._lock = threading.Lock()
+
+    def _start(self, lane="extract"):
+        with self._lock:
+            if lane in self._drivers:
+                return
+            self._drivers[lane] = []
+            for slot in range(self.lanes[lane]):
+                driver = threading.Thread(target=self._drive, args=(self._jobs[lane],),
+                                          name=f"extractor-{lane}-{slot}", daemon=True)
+                driver.start()
+                self._drivers[lane].append(driver)
+
+    def _spawn(self):
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+        )
+
+    def _drive(self, jobs):
+        proc = None
+        worker = None if self.use_processes else _Worker()
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            try:
+                if worker is not None:
+                    result = self._run_local(worker, job)
+                else:
+                    if proc is None or proc.poll() is not None:
+                        proc = self._spawn()
+                    result = self._run_remote(proc, job)
+            except Exception as e:
+                if proc is not None:
+                    proc.kill()
+                    proc = None
+                result = {"error": f"extractor worker failed: {e}"}
+            job.future.set_result(result)
+        if proc is not None:
+            proc.stdin.close()
+            proc.wait()
+
+    def _run_local(self, worker, job):
+        box = {}
+
+        def emit(msg):
+            if msg["type"] == "result":
+                box["result"] = msg["result"]
+            elif job.on_message:
+                return job.on_message(msg)
+
+        worker.handle(job.msg, emit)
+        return box["result"]
+
+    def _run_remote(self, proc, job):
+        proc.stdin.write(json.dumps(job.msg) + "\n")
+        proc.stdin.flush()
+        for line in proc.stdout:
+            msg = json.loads(line)
+            if msg["type"] == "result":
+                return msg["result"]
+            reply = job.on_message(msg) if job.on_message else None
+            if msg["type"] == "entry":
+                proc.stdin.write(json.dumps({"more": reply is not False}) + "\n")
+                proc.stdin.flush()
+        raise EOFError("worker exited")
+
+    def submit(self, kind, url=None, opts=None, platform="", on_message=None, **fields):
+        # ``on_message`` runs on the driver thread; if it raises, the job is
+        # abandoned (and a worker process restarted). Returning False for an
+        # "entry" message stops an enumeration and keeps the worker.
+        lane = KIND_LANES.get(kind, "extract")
+        self._start(lane)
+        job = _Job({"id": next(self._ids), "kind": kind, "url": url,
+                    "opts": opts or {}, "platform": platform, **fields}, on_message)
+        self._jobs[lane].put(job)
+        return job.future
+
+    def extract(self, url, opts=None, platform=""):
+        return self.submit("extract", url, opts, platform).result()
+
+    def download(self, url, opts=None, platform="", on_progress=None):
+        def on_message(msg):
+            if msg["type"] == "progress" and on_progress:
+                on_progress(msg["downloaded"], msg["total"])
+        return self.submit("download", url, opts, platform, on_message).result()
+
+    def prewarm(self, opts=None, platform=""):
+        # One warm-up job per extraction slot; idle drivers pick them up in
+        # parallel. Download workers start (cold) with the first download.
+        self._start()
+        return [self.submit("warm", None, opts, platform) for _ in range(self.size)]
+
+    def shutdown(self):
+        with self._lock:
+            for lane, drivers in self._drivers.items():
+                for _ in drivers:
+                    self._jobs[lane].put(None)
+            self._drivers = {}
+
+
+pool = ExtractorPool()
+
+
+if __name__ == "__main__" and "--serve" in sys.argv:
+    _serve()
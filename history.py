@@ -1,10 +1,237 @@
-import os, json
+import os, re, json, sqlite3, threading
+from datetime import datetime
+
+# History lives in SQLite, indexed by (platform, time). Appends are one
+# INSERT, deletes one DELETE, and tabs read it a page at a time.
+# The old history.json is imported once and renamed to history.json.migrated.
+#
+# Search: an FTS5 index over caption, user, platform and date, kept in step
+# with the history table by triggers. SQLite builds without FTS5 or JSON1
+# get a table of (term, id) maintained here instead, matched by prefix.
 HFILE = "history.json"
+DB_FILE = "history.db"
+PAGE_SIZE = 50
+
+# bm25 weights of caption, user, platform and date: a user match ranks first
+SEARCH_WEIGHTS = (1.0, 2.0, 0.5, 0.5)
+SEARCH_WINDOW = 500
+
+_db = None
+_fts = None
+_lock = threading.Lock()
+_TOKEN = re.compile(r"\w+")
+_DATE = re.compile(r"\d{4}-\d{2}(-\d{2})?")
+# Indexed fields of a history row, as SQL over the row alias {r}
+_FIELDS = ("coalesce(json_extract({r}.data, '$.caption'), ''),"
+           " coalesce(json_extract({r}.data, '$.user'), json_extract({r}.data, '$.username'), ''),"
+           " {r}.platform, substr({r}.time, 1, 10)")
+
+
+def _conn():
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(DB_FILE, check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " platform TEXT NOT NULL, time TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        _db.execute("CREATE INDEX IF NOT EXISTS history_platform_time ON history(platform, time)")
+        _db.execute("CREATE INDEX IF NOT EXISTS history_time ON history(time)")
+        _migrate_json(_db)
+        _setup_search(_db)
+        _db.commit()
+    return _db
+
+
+def _setup_search(db):
+    global _fts
+    fresh = not db.execute("SELECT 1 FROM sqlite_master WHERE name IN ('history_fts', 'history_terms')").fetchone()
+    try:
+        db.execute("SELECT json_extract('{}', '$.a')")
+        db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+                   "caption, user, platform, date, tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    except sqlite3.OperationalError:
+        _fts = False
+        db.execute("CREATE TABLE IF NOT EXISTS history_terms ("
+                   " term TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (term, id)) WITHOUT ROWID")
+        db.execute("CREATE INDEX IF NOT EXISTS history_terms_id ON history_terms(id)")
+        if fresh:
+            for row in db.execute("SELECT id, platform, data FROM history").fetchall():
+                _index_terms(db, _row(row))
+        return
+    _fts = True
+    insert = ("INSERT INTO history_fts (rowid, caption, user, platform, date)"
+              f" VALUES (new.id, {_FIELDS.format(r='new')});")
+    db.execute(f"CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN {insert} END")
+    db.execute("CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN"
+               " DELETE FROM history_fts WHERE rowid = old.id; END")
+    db.execute("CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE ON history BEGIN"
+               f" DELETE FROM history_fts WHERE rowid = old.id; {insert} END")
+    if fresh:
+        db.execute("INSERT INTO history_fts (rowid, caption, user, platform, date)"
+                   f" SELECT history.id, {_FIELDS.format(r='history')} FROM history")
+
+
+def _terms(e):
+    date = (e.get('time') or '')[:10]
+    text = " ".join([e.get('caption') or '', e.get('user') or e.get('username') or '', e.get('platform') or ''])
+    return set(_TOKEN.findall(text.lower())) | ({date} if date else set())
+
+
+def _index_terms(db, e):
+    # Token-table fallback only; FTS5 is kept up to date by triggers
+    db.execute("DELETE FROM history_terms WHERE id = ?", (e['id'],))
+    db.executemany("INSERT INTO history_terms (term, id) VALUES (?, ?)", [(t, e['id']) for t in _terms(e)])
+
+
+def _migrate_json(db):
+    if not os.path.exists(HFILE):
+        return
+    # The marker commits with the imported rows, so a crash before the
+    # rename can't import the file a second time
+    db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    if db.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone() is None:
+        try:
+            with open(HFILE) as f:
+                old = json.load(f)
+        except ValueError:
+            old = []
+        for e in old:
+            e.setdefault('time', e.get('timestamp') or datetime.now().isoformat())
+            db.execute("INSERT INTO history (platform, time, data) VALUES (?, ?, ?)",
+                       (e.get('platform', ''), e['time'], json.dumps(e)))
+        db.execute("INSERT INTO meta VALUES ('json_migrated', ?)", (datetime.now().isoformat(),))
+        db.commit()
+    os.replace(HFILE, HFILE + ".migrated")
+
+
+def _row(row):
+    return {**json.loads(row[2]), 'id': row[0], 'platform': row[1]}
+
+
 def load_history():
-    return json.load(open(HFILE)) if os.path.exists(HFILE) else []
+    return query_history(limit=-1, newest_first=False)
+
+
+def query_history(platform=None, limit=PAGE_SIZE, offset=0, newest_first=True):
+    order = "DESC" if newest_first else "ASC"
+    sql = "SELECT id, platform, data FROM history"
+    args = []
+    if platform is not None:
+        sql += " WHERE platform = ?"
+        args.append(platform)
+    sql += f" ORDER BY time {order}, id {order} LIMIT ? OFFSET ?"
+    args += [limit, offset]
+    with _lock:
+        return [_row(r) for r in _conn().execute(sql, args)]
+
+
+def count_history(platform=None):
+    with _lock:
+        if platform is None:
+            return _conn().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        return _conn().execute("SELECT COUNT(*) FROM history WHERE platform = ?", (platform,)).fetchone()[0]
+
+
+def search_history(text, platform=None, limit=PAGE_SIZE, offset=0):
+    """Entries matching every word of ``text`` (as a prefix) in their
+    caption, user, platform or date, best match first; a page at a time."""
+    words = [w for w in text.lower().split() if _TOKEN.search(w)]
+    if not words:
+        return query_history(platform, limit, offset)
+    with _lock:
+        db = _conn()
+        if _fts:
+            # A word like 2024-05 is a phrase of tokens, its last one a prefix;
+            # the exact phrase is OR-ed in so that it scores higher
+            phrases = [" ".join(_TOKEN.findall(w)) for w in words]
+            match = " AND ".join(f'("{p}" OR "{p}"*)' for p in phrases)
+            if platform is not None:
+                match += f' AND platform:"{platform}"'
+            rows = _fts_page(db, match, limit, offset)
+        else:
+            # Dates are whole terms there; other words split into tokens
+            tokens = [t for w in words for t in ([w] if _DATE.fullmatch(w) else _TOKEN.findall(w))]
+            rows = _terms_page(db, tokens, platform, limit, offset)
+        return [_row(r) for r in rows]
+
+
+def _fts_page(db, match, limit, offset):
+    # Only the newest SEARCH_WINDOW matches are ranked; older ones follow,
+    # newest first. Ranking every match of a common word costs ~0.3 s at
+    # 100k entries.
+    rows = []
+    if offset < SEARCH_WINDOW:
+        rows = db.execute(
+            "SELECT h.id, h.platform, h.data FROM (SELECT rowid AS id,"
+            f" bm25(history_fts, {', '.join(map(str, SEARCH_WEIGHTS))}) AS score"
+            " FROM history_fts WHERE history_fts MATCH ? ORDER BY rowid DESC LIMIT ?) m"
+            " JOIN history h ON h.id = m.id ORDER BY m.score, h.time DESC, h.id DESC LIMIT ? OFFSET ?",
+            (match, SEARCH_WINDOW, limit, offset)).fetchall()
+    if len(rows) < limit:
+        rows += db.execute(
+            "SELECT h.id, h.platform, h.data FROM (SELECT rowid AS id FROM history_fts"
+            " WHERE history_fts MATCH ? ORDER BY rowid DESC LIMIT ? OFFSET ?) m"
+            " JOIN history h ON h.id = m.id ORDER BY h.id DESC",
+            (match, limit - len(rows), max(offset, SEARCH_WINDOW))).fetchall()
+    return rows
+
+
+def _terms_page(db, tokens, platform, limit, offset):
+    # Every token as a prefix. As with FTS5 the newest SEARCH_WINDOW matches
+    # are ranked, by how many tokens match exactly; older ones follow.
+    prefix = " INTERSECT ".join(["SELECT id FROM history_terms WHERE term >= ? AND term < ?"] * len(tokens))
+    matches = (f"SELECT h.id FROM history h WHERE h.id IN ({prefix})"
+               + (" AND h.platform = ?" if platform is not None else "") + " ORDER BY h.id DESC")
+    args = [a for t in tokens for a in (t, t + "\uffff")] + ([platform] if platform is not None else [])
+    rows = []
+    if offset < SEARCH_WINDOW:
+        rows = db.execute(
+            f"SELECT h.id, h.platform, h.data FROM ({matches} LIMIT ?) m JOIN history h ON h.id = m.id"
+            " ORDER BY (SELECT COUNT(*) FROM history_terms t WHERE t.id = h.id"
+            f" AND t.term IN ({','.join('?' * len(tokens))})) DESC, h.time DESC, h.id DESC LIMIT ? OFFSET ?",
+            args + [SEARCH_WINDOW] + tokens + [limit, offset]).fetchall()
+    if len(rows) < limit:
+        rows += db.execute(
+            f"SELECT h.id, h.platform, h.data FROM ({matches} LIMIT ? OFFSET ?) m"
+            " JOIN history h ON h.id = m.id ORDER BY h.id DESC",
+            args + [limit - len(rows), max(offset, SEARCH_WINDOW)]).fetchall()
+    return rows
+
 
 def save_history_entry(platform, entry):
-    h = load_history()
-    h.append({'platform': platform, **entry, 'time': datetime.now().isoformat()})
-    json.dump(h, open(HFILE,'w'), indent=2)
+    e = {'platform': platform, **entry, 'time': datetime.now().isoformat()}
+    with _lock:
+        db = _conn()
+        cur = db.execute("INSERT INTO history (platform, time, data) VALUES (?, ?, ?)",
+                         (e['platform'], e['time'], json.dumps(e)))
+        if not _fts:
+            _index_terms(db, {**e, 'id': cur.lastrowid})
+        db.commit()
+    return {**e, 'id': cur.lastrowid}
+
+
+def update_history_entry(entry_id, fields):
+    """Merge ``fields`` into an entry; returns it, or None if it is gone."""
+    with _lock:
+        db = _conn()
+        row = db.execute("SELECT id, platform, data FROM history WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        e = {**json.loads(row[2]), **fields}
+        db.execute("UPDATE history SET data = ? WHERE id = ?", (json.dumps(e), entry_id))
+        if not _fts:
+            _index_terms(db, {**e, 'id': row[0]})
+        db.commit()
+    return {**e, 'id': row[0], 'platform': row[1]}
+
 
+def delete_history_entry(entry_id):
+    with _lock:
+        db = _conn()
+        db.execute("DELETE FROM history WHERE id = ?", (entry_id,))
+        if not _fts:
+            db.execute("DELETE FROM history_terms WHERE id = ?", (entry_id,))
+        db.commit()
@@ -0,0 +1,207 @@
+from collections import OrderedDict
+from kivy.clock import Clock, mainthread
+from kivy.core.image import Image as CoreImage
+from kivy.metrics import dp
+from kivy.properties import ObjectProperty
+from kivy.uix.image import Image
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivymd.uix.boxlayout import MDBoxLayout
+from kivymd.uix.button import MDRaisedButton
+from kivymd.uix.card import MDCard
+from kivymd.uix.label import MDLabel
+from kivymd.uix.textfield import MDTextField
+from thumbnails import thumbnails, preview_source
+
+PAGE_SIZE = 30
+# Typing pause before a search runs
+SEARCH_DELAY = 0.25
+# Fetch the next page once the view is within this fraction of the bottom
+LOAD_AHEAD = 0.1
+# Decoded preview textures kept in memory; a screenful is ~5 cards
+TEXTURE_CACHE_SIZE = 64
+
+
+def short_caption(caption, limit=60):
+    return (caption[:limit] + "...") if len(caption) > limit else caption
+
+
+class TextureCache:
+    def __init__(self, size=TEXTURE_CACHE_SIZE):
+        self.size = size
+        self._textures = OrderedDict()
+
+    def get(self, path):
+        texture = self._textures.get(path)
+        if texture is None:
+            texture = self._textures[path] = CoreImage(path).texture
+            while len(self._textures) > self.size:
+                self._textures.popitem(last=False)
+        self._textures.move_to_end(path)
+        return texture
+
+
+textures = TextureCache()
+
+
+class HistoryCard(RecycleDataViewBehavior, MDCard):
+    """One history row. Instances are recycled: only refresh_view_attrs
+    changes when a card scrolls onto a different entry."""
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            orientation='horizontal',
+            padding=12,
+            spacing=12,
+            md_bg_color=(0.1, 0.1, 0.1, 1),
+            radius=[12],
+            **kwargs
+        )
+        self.entry = {}
+        self.list = None
+        self.thumb_source = None
+        self.img = Image(size_hint=(None, None), size=(100, 100), opacity=0)
+        self.user_label = MDLabel(bold=True, theme_text_color="Custom", text_color=(1, 1, 1, 1))
+        self.caption_label = MDLabel(theme_text_color="Secondary")
+        text_box = MDBoxLayout(orientation='vertical', spacing=4)
+        text_box.add_widget(self.user_label)
+        text_box.add_widget(self.caption_label)
+        btn = MDRaisedButton(text="⬇", md_bg_color=(0, 0.5, 0, 1), on_release=self.on_action)
+        self.add_widget(self.img)
+        self.add_widget(text_box)
+        self.add_widget(btn)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.index = index
+        self.list = rv
+        self.entry = data
+        self.user_label.text = data.get('user', '')
+        self.caption_label.text = short_caption(data.get('caption', ''))
+
+        # Previews come from the local thumbnail cache; the card may have been
+        # recycled for another entry by the time a fetch finishes
+        source, fallback = preview_source(data)
+        if source != self.thumb_source:
+            self.thumb_source = source
+            self.img.opacity = 0
+            thumbnails.request(source, lambda path: self.show_thumb(source, path), fallback)
+
+    @mainthread
+    def show_thumb(self, source, path):
+        if source != self.thumb_source or not path:
+            return
+        try:
+            self.img.texture = textures.get(path)
+            self.img.opacity = 1
+        except Exception as e:
+            print(f"Thumbnail load error: {e}")
+
+    def on_action(self, *_):
+        if self.list and self.list.on_action:
+            self.list.on_action(self.entry)
+
+
+class HistoryList(RecycleView):
+    """Virtualized history list that pages entries in from ``query``.
+
+    ``query(limit, offset)`` returns the next entries, newest first. Only the
+    rows on screen have widgets, so the widget count does not grow with the
+    length of the history. With a filter set, pages come from
+    ``search(text, limit, offset)`` instead.
+    """
+
+    on_action = ObjectProperty(None, allownone=True)
+
+    def __init__(self, query, viewclass=HistoryCard, row_height=dp(120), page_size=PAGE_SIZE, search=None, **kwargs):
+        super().__init__(**kwargs)
+        self.query = query
+        self.search = search
+        self.filter = ""
+        self.page_size = page_size
+        self.exhausted = False
+
+        layout = RecycleBoxLayout(
+            default_size=(None, row_height),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            orientation='vertical',
+            spacing=8,
+            padding=(0, 8),
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+        # viewclass is forwarded to the layout manager, so it must exist first
+        self.viewclass = viewclass
+        self.bind(scroll_y=self._maybe_load_more)
+
+    def reload(self):
+        self.exhausted = False
+        self.data = []
+        self.load_more()
+        self.scroll_y = 1
+
+    def load_more(self):
+        if self.exhausted:
+            return
+        if self.filter and self.search:
+            page = self.search(self.filter, self.page_size, len(self.data))
+        else:
+            page = self.query(self.page_size, len(self.data))
+        if len(page) < self.page_size:
+            self.exhausted = True
+        if page:
+            # ScrollView keeps scroll_y (a fraction) when content grows, which
+            # would jump to the new bottom; keep the pixel offset instead
+            offset = (1 - self.scroll_y) * max(self.layout_manager.height - self.height, 0)
+            self.data.extend(page)
+            Clock.schedule_once(lambda dt: self._restore_offset(offset))
+
+    def _restore_offset(self, offset):
+        scrollable = self.layout_manager.height - self.height
+        if scrollable > 0:
+            self.scroll_y = max(0, 1 - offset / scrollable)
+
+    def _maybe_load_more(self, *_):
+        # scroll_y is 1 at the top and 0 at the bottom
+        if not self.exhausted and self.scroll_y <= LOAD_AHEAD:
+            self.load_more()
+
+    def set_filter(self, text):
+        # Takes effect on the next reload()
+        self.filter = text.strip()
+
+    def prepend(self, entry):
+        # A new download need not match the search being shown
+        if not self.filter:
+            self.data.insert(0, entry)
+
+    def update(self, entry):
+        self.data = [entry if e.get('id') == entry.get('id') else e for e in self.data]
+
+    def remove(self, entry):
+        self.data = [e for e in self.data if e.get('id') != entry.get('id')]
+
+
+class SearchField(MDTextField):
+    """Search box for a HistoryList: reloads it from ``search`` once typing
+    pauses. ``on_results(history_list)`` runs after each reload."""
+
+    def __init__(self, history_list, on_results=None, **kwargs):
+        kwargs.setdefault("hint_text", "Search caption, user or date")
+        kwargs.setdefault("mode", "rectangle")
+        kwargs.setdefault("size_hint_y", None)
+        kwargs.setdefault("height", dp(48))
+        super().__init__(**kwargs)
+        self.history_list = history_list
+        self.on_results = on_results
+        self._pending = Clock.create_trigger(self._run, SEARCH_DELAY)
+        self.bind(text=lambda *_: self._pending())
+
+    def _run(self, *_):
+        if self.text.strip() == self.history_list.filter:
+            return
+        self.history_list.set_filter(self.text)
+        self.history_list.reload()
+        if self.on_results:
+            self.on_results(self.history_list)
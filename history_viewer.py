@@ -1,37 +1,49 @@
 import os
 import time
 import webbrowser
-import json
 from functools import partial
 from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.behaviors import ButtonBehavior
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.metrics import dp
 from kivymd.uix.list import TwoLineAvatarIconListItem, IconLeftWidget
 from kivymd.uix.screen import MDScreen
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.menu import MDDropdownMenu
 from kivy.core.clipboard import Clipboard
-from history import load_history
+from history import query_history, search_history, delete_history_entry
+from history_list import HistoryList, SearchField, short_caption
 
 DOWNLOAD_DIR = "/storage/emulated/0/Download/StealthFetcher/"
 
 
-class MediaItem(ButtonBehavior, BoxLayout):
-    def __init__(self, entry, **kwargs):
+class MediaItem(RecycleDataViewBehavior, ButtonBehavior, BoxLayout):
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.entry = entry
+        self.entry = {}
+        self.list = None
         self.orientation = "vertical"
         self.last_touch_time = 0
 
-        # Create the list item UI
-        self.list_item = TwoLineAvatarIconListItem(
-            text=entry["username"],
-            secondary_text=(entry["caption"][:60] + "...") if entry["caption"] else "No caption"
-        )
+        # Create the list item UI; recycled rows only get new texts
+        self.list_item = TwoLineAvatarIconListItem()
         self.icon = IconLeftWidget(icon="image")
         self.list_item.add_widget(self.icon)
         self.add_widget(self.list_item)
 
+    def refresh_view_attrs(self, rv, index, data):
+        self.index = index
+        self.list = rv
+        self.entry = data
+        caption = data.get("caption", "")
+        self.list_item.text = data.get("user") or data.get("username", "")
+        self.list_item.secondary_text = short_caption(caption) if caption else "No caption"
+
+    def media_files(self):
+        # Older entries list several files, current ones store a single path
+        return self.entry.get("media_files") or [self.entry["path"]]
+
     def on_touch_down(self, touch):
         if self.collide_point(*touch.pos):
             self.last_touch_time = time.time()
@@ -70,11 +82,16 @@ class MediaItem(ButtonBehavior, BoxLayout):
             callback()
 
     def view_media(self):
-        for f in self.entry["media_files"]:
+        for f in self.media_files():
             os.system(f"am start -a android.intent.action.VIEW -d file://{f}")
 
+    def shared_files(self):
+        # The smaller, metadata-free copy made by post-processing, if any
+        share = self.entry.get("share_path")
+        return [share] if share and os.path.exists(share) else self.media_files()
+
     def share_media(self):
-        for f in self.entry["media_files"]:
+        for f in self.shared_files():
             os.system(
                 f'am start -a android.intent.action.SEND -t "*/*" --es android.intent.extra.STREAM file://{f}'
             )
@@ -83,48 +100,49 @@ class MediaItem(ButtonBehavior, BoxLayout):
         Clipboard.copy(self.entry.get("caption", ""))
 
     def open_link(self):
-        webbrowser.open(self.entry["link"])
+        webbrowser.open(self.entry.get("link", ""))
 
     def repost(self):
-        for f in self.entry["media_files"]:
+        for f in self.shared_files():
             os.system(
                 f'am start -a android.intent.action.SEND -t "*/*" --es android.intent.extra.STREAM file://{f}'
             )
 
     def delete_entry(self):
         # Delete files
-        for f in self.entry["media_files"]:
+        for f in self.media_files():
             try:
                 os.remove(f)
             except Exception:
                 pass
 
-        # Delete from JSON
-        path = "history.json"
-        if os.path.exists(path):
-            with open(path, "r") as f:
-                history = json.load(f)
-            history = [h for h in history if h["timestamp"] != self.entry["timestamp"]]
-            with open(path, "w") as f:
-                json.dump(history, f, indent=2)
+        # Delete from history
+        delete_history_entry(self.entry["id"])
+        if self.list:
+            self.list.remove(self.entry)
 
         # Optional: Show deletion confirmation
-        print(f"Deleted {len(self.entry['media_files'])} file(s).")
+        print(f"Deleted {len(self.media_files())} file(s).")
 
 
 class HistoryScreen(MDScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        history = load_history()
         self.layout = MDBoxLayout(orientation='vertical', padding=10, spacing=10)
+        self.history_list = HistoryList(
+            query=lambda limit, offset: query_history(limit=limit, offset=offset),
+            search=lambda text, limit, offset: search_history(text, limit=limit, offset=offset),
+            viewclass=MediaItem,
+            row_height=dp(72),
+        )
+        self.history_list.reload()
 
-        if not history:
+        if not self.history_list.data:
             from kivymd.uix.label import MDLabel
             self.layout.add_widget(MDLabel(text="No download history yet.", halign="center"))
         else:
-            for entry in reversed(history):
-                item = MediaItem(entry)
-                self.layout.add_widget(item)
+            self.layout.add_widget(SearchField(self.history_list))
+            self.layout.add_widget(self.history_list)
 
         self.add_widget(self.layout)
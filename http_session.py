@@ -0,0 +1,115 @@
+import threading
+import ratelimit
+import telemetry
+
+# requests/urllib3 are imported by the first session build, not at startup
+
+# One keep-alive pool per host is kept for up to POOL_CONNECTIONS hosts, each
+# holding at most POOL_MAXSIZE sockets. POOL_MAXSIZE should cover
+# PER_HOST_LIMIT * SEGMENT_COUNT from downloader.py so segments never queue
+# for a connection.
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 8
+
+# Retries cover connection setup and retryable status codes. Once a body
+# starts streaming, resuming is up to the caller (see segmented downloads).
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Throttling responses (429) are retried here, after the host's Retry-After
+# or backoff, when that wait is short enough (ratelimit.MAX_INLINE_WAIT)
+THROTTLE_RETRIES = 3
+
+# (connect, read) in seconds; read is the max gap between bytes, not total time
+TIMEOUT = (10, 30)
+
+_session = None
+_lock = threading.Lock()
+
+
+def configure(pool_connections=None, pool_maxsize=None, retries=None, timeout=None):
+    global POOL_CONNECTIONS, POOL_MAXSIZE, RETRIES, TIMEOUT, _session
+    with _lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if retries is not None:
+            RETRIES = retries
+        if timeout is not None:
+            TIMEOUT = timeout
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _build_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+        # Retry-After (429s) is handled by request(), which paces the host
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def request(method, url, **kwargs):
+    # Paced by ratelimit.limiter; raises ratelimit.Throttled when the host
+    # is blocked for long. A throttling response that cannot be retried in
+    # time is returned as is, for the caller to fail on.
+    kwargs.setdefault("timeout", TIMEOUT)
+    limiter = ratelimit.limiter
+    for attempt in range(THROTTLE_RETRIES + 1):
+        limiter.acquire(url, max_wait=ratelimit.MAX_INLINE_WAIT)
+        response = get_session().request(method, url, **kwargs)
+        if not ratelimit.is_throttled(response.status_code, response.headers):
+            limiter.ok(url)
+            return response
+        span = telemetry.current()
+        if span:
+            span.count("throttled")
+        wait = limiter.throttled(url, ratelimit.retry_after(response.headers.get("Retry-After")))
+        if attempt == THROTTLE_RETRIES or wait > ratelimit.MAX_INLINE_WAIT:
+            return response
+        response.close()
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def head(url, **kwargs):
+    kwargs.setdefault("allow_redirects", True)
+    return request("HEAD", url, **kwargs)
+
+
+def close():
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
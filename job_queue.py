@@ -0,0 +1,300 @@
+import json
+import time
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Persistent job scheduler. Jobs live in jobs.db, so whatever was pending or
+# running when the app died is picked up again by start(); downloads then
+# continue from their .part files.
+
+DB_FILE = "jobs.db"
+
+# Lower runs first
+PRIORITY_USER = 0
+PRIORITY_CLIPBOARD = 10
+PRIORITY_BACKGROUND = 20
+
+# Jobs running at once. Each kind is also capped per slot: by default the
+# slot is the job's platform, shared by all such kinds, with
+# PER_PLATFORM_LIMIT / PLATFORM_LIMITS; register() can give a kind its own
+# slots (downloads: per CDN host) and a cap on the kind as a whole.
+MAX_RUNNING = 6
+PER_PLATFORM_LIMIT = 2
+PLATFORM_LIMITS = {}
+
+# Failed attempts before a job fails for good. Attempts that ended in
+# RetryLater are counted apart, in 'throttled', against their own limit.
+MAX_ATTEMPTS = 4
+MAX_THROTTLED_ATTEMPTS = 12
+BACKOFF_BASE = 2
+BACKOFF_MAX = 5 * 60
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = "pending", "running", "done", "failed", "cancelled"
+UNFINISHED = (PENDING, RUNNING)
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help (e.g. no media found)."""
+
+
+class RetryLater(Exception):
+    """Raised by a handler when the platform throttles: the job is retried
+    after ``delay`` seconds, and gets more attempts than other failures."""
+
+    def __init__(self, message, delay):
+        super().__init__(message)
+        self.delay = delay
+
+
+class JobScheduler:
+    def __init__(self, path=DB_FILE, max_running=MAX_RUNNING, per_platform=PER_PLATFORM_LIMIT,
+                 platform_limits=None):
+        self.path = path
+        self.max_running = max_running
+        self.per_platform = per_platform
+        self.platform_limits = dict(PLATFORM_LIMITS if platform_limits is None else platform_limits)
+        self.handlers = {}
+        self.slots = {}
+        self.subscribers = []
+        self._db = None
+        self._cond = threading.Condition()
+        self._running = {}
+        self._pool = None
+        self._thread = None
+        self._stopping = False
+
+    def _conn(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " kind TEXT NOT NULL, platform TEXT NOT NULL, priority INTEGER NOT NULL,"
+                " payload TEXT NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " not_before REAL NOT NULL DEFAULT 0, key TEXT,"
+                " result TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL,"
+                " throttled INTEGER NOT NULL DEFAULT 0, slot TEXT)"
+            )
+            # Columns added since the first jobs.db
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+            if "throttled" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN throttled INTEGER NOT NULL DEFAULT 0")
+            if "slot" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN slot TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs(state, priority, not_before)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs(key, state)")
+            self._db.commit()
+        return self._db
+
+    # --- public API -----------------------------------------------------
+
+    def register(self, kind, handler, slot=None, per_slot=None, limit=None):
+        """``handler(job)`` returns a JSON-able result or raises to retry.
+
+        With ``slot(payload)``, jobs of this kind run at most ``per_slot`` per
+        slot it returns (e.g. a host) instead of sharing their platform's
+        limit; ``limit`` caps how many of the kind run at once.
+        """
+        self.handlers[kind] = handler
+        self.slots[kind] = (slot, per_slot, limit)
+
+    def subscribe(self, callback):
+        """``callback(job)`` runs on a scheduler thread after every state change."""
+        self.subscribers.append(callback)
+
+    def submit(self, kind, payload, platform="", priority=PRIORITY_USER, key=None):
+        """Queue a job and return its id.
+
+        With ``key``, an unfinished job with the same key is reused instead,
+        so the same link is never queued twice.
+        """
+        now = time.time()
+        with self._cond:
+            db = self._conn()
+            if key is not None:
+                row = db.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND state IN (?, ?)",
+                    (key, *UNFINISHED)).fetchone()
+                if row:
+                    # A user tap outranks an earlier clipboard submission
+                    db.execute("UPDATE jobs SET priority = MIN(priority, ?) WHERE id = ?", (priority, row[0]))
+                    db.commit()
+                    return row[0]
+            slot = self.slots.get(kind, (None,))[0]
+            cur = db.execute(
+                "INSERT INTO jobs (kind, platform, priority, payload, state, key, created, updated, slot)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, platform, priority, json.dumps(payload), PENDING, key, now, now,
+                 slot(payload) if slot else None))
+            db.commit()
+            job_id = cur.lastrowid
+            self._cond.notify_all()
+        self._publish(self.get(job_id))
+        return job_id
+
+    def get(self, job_id):
+        with self._cond:
+            row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def jobs(self, states=UNFINISHED, platform=None):
+        sql = f"SELECT * FROM jobs WHERE state IN ({','.join('?' * len(states))})"
+        args = list(states)
+        if platform is not None:
+            sql += " AND platform = ?"
+            args.append(platform)
+        with self._cond:
+            rows = self._conn().execute(sql + " ORDER BY priority, id", args).fetchall()
+        return [self._job(r) for r in rows]
+
+    def cancel(self, job_id):
+        # A running job finishes its current attempt; it just isn't retried
+        self._set_state(job_id, CANCELLED, states=UNFINISHED)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            # Crash recovery: anything marked running died with the last process
+            db = self._conn()
+            db.execute("UPDATE jobs SET state = ?, not_before = 0 WHERE state = ?", (PENDING, RUNNING))
+            db.commit()
+            self._stopping = False
+            self._pool = ThreadPoolExecutor(max_workers=self.max_running, thread_name_prefix="job")
+            self._thread = threading.Thread(target=self._dispatch, name="job-dispatch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    # --- internals ------------------------------------------------------
+
+    def _job(self, row):
+        keys = ("id", "kind", "platform", "priority", "payload", "state", "attempts",
+                "not_before", "key", "result", "error", "created", "updated", "throttled", "slot")
+        job = dict(zip(keys, row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _limit(self, platform):
+        return self.platform_limits.get(platform, self.per_platform)
+
+    def _slot(self, kind, platform, slot):
+        # (slot key, its limit); jobs queued before their kind had slots
+        # fall back to the platform
+        _, per_slot, _ = self.slots.get(kind, (None, None, None))
+        if slot is not None and per_slot:
+            return (kind, slot), per_slot
+        return platform, self._limit(platform)
+
+    def _next_runnable(self):
+        # Returns (job row or None, seconds until a delayed job becomes due)
+        now = time.time()
+        busy, kinds = {}, {}
+        for kind, key in self._running.values():
+            busy[key] = busy.get(key, 0) + 1
+            kinds[kind] = kinds.get(kind, 0) + 1
+        db = self._conn()
+        for row in db.execute(
+                "SELECT * FROM jobs WHERE state = ? AND not_before <= ? ORDER BY priority, id",
+                (PENDING, now)):
+            kind = row[1]
+            key, limit = self._slot(kind, row[2], row[14])
+            kind_limit = self.slots.get(kind, (None, None, None))[2]
+            if busy.get(key, 0) < limit and (not kind_limit or kinds.get(kind, 0) < kind_limit):
+                return row, None
+        due = db.execute("SELECT MIN(not_before) FROM jobs WHERE state = ? AND not_before > ?",
+                         (PENDING, now)).fetchone()[0]
+        return None, (due - now if due else None)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    wait = None
+                    if len(self._running) < self.max_running:
+                        row, wait = self._next_runnable()
+                        if row is not None:
+                            break
+                    self._cond.wait(wait)
+                job = self._job(row)
+                key, _ = self._slot(job["kind"], job["platform"], job["slot"])
+                self._running[job["id"]] = (job["kind"], key)
+                db = self._conn()
+                db.execute("UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                           (RUNNING, time.time(), job["id"]))
+                db.commit()
+                job["state"], job["attempts"] = RUNNING, job["attempts"] + 1
+            self._publish(job)
+            self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        handler = self.handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise PermanentJobError(f"no handler for {job['kind']} jobs")
+            result = handler(job)
+            if isinstance(result, dict) and "error" in result:
+                raise RuntimeError(result["error"])
+            self._finish(job, DONE, result=result)
+        except PermanentJobError as e:
+            self._finish(job, FAILED, error=str(e))
+        except RetryLater as e:
+            if job["throttled"] + 1 >= MAX_THROTTLED_ATTEMPTS:
+                self._finish(job, FAILED, error=str(e), throttled=1)
+            else:
+                delay = max(e.delay, BACKOFF_BASE) * random.uniform(1.0, 1.2)
+                self._finish(job, PENDING, error=str(e), not_before=time.time() + delay, throttled=1)
+        except Exception as e:
+            failures = job["attempts"] - job["throttled"]
+            if failures >= MAX_ATTEMPTS:
+                self._finish(job, FAILED, error=str(e))
+            else:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE ** failures) * random.uniform(0.8, 1.2)
+                self._finish(job, PENDING, error=str(e), not_before=time.time() + delay)
+
+    def _finish(self, job, state, result=None, error=None, not_before=0, throttled=0):
+        with self._cond:
+            self._running.pop(job["id"], None)
+            db = self._conn()
+            db.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = ?, not_before = ?, updated = ?,"
+                " throttled = throttled + ? WHERE id = ? AND state = ?",
+                (state, json.dumps(result) if result is not None else None, error,
+                 not_before, time.time(), throttled, job["id"], RUNNING))
+            db.commit()
+            self._cond.notify_all()
+        self._publish(self.get(job["id"]))
+
+    def _set_state(self, job_id, state, states):
+        with self._cond:
+            db = self._conn()
+            db.execute(f"UPDATE jobs SET state = ?, updated = ? WHERE id = ?"
+                       f" AND state IN ({','.join('?' * len(states))})",
+                       (state, time.time(), job_id, *states))
+            db.commit()
+            self._cond.notify_all()
+        self._publish(self.get(job_id))
+
+    def _publish(self, job):
+        for callback in list(self.subscribers):
+            try:
+                callback(job)
+            except Exception as e:
+                print(f"Job subscriber error: {e}")
+
+
+scheduler = JobScheduler()
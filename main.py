@@ -1,25 +1,42 @@
 import os, threading
+from collections import OrderedDict
 from kivy.clock import mainthread, Clock
 from kivy.core.clipboard import Clipboard
+from kivy.core.window import Window
 from kivy.metrics import dp
 from kivymd.app import MDApp
 from kivymd.uix.tab import MDTabsBase, MDTabs
-from kivymd.uix.dialog import MDDialog
-from kivymd.uix.button import MDFlatButton, MDRaisedButton, MDIconButton
-from kivymd.uix.card import MDCard
+from kivymd.uix.button import MDRaisedButton
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.textfield import MDTextField
 from kivymd.uix.label import MDLabel
-from kivy.uix.image import AsyncImage
-from kivy.uix.scrollview import ScrollView
-from utils import detect_platform
-from media_parser import parse_yt_dlp_metadata, parse_whatsapp_status_media
-from downloader import download_file
-from history import load_history, save_history_entry
+from utils import classify_url, link_key
+import downloader
+import media_parser
+from downloader import download_file, QUALITY_PROFILES, DEFAULT_PROFILE
+from extractor_pool import pool as extractor
+from history import query_history, search_history
 from progressbar import AnimatedProgressBar
+from history_list import HistoryList, SearchField
+from progress_bus import ProgressBus, FRAME_HZ, format_status
+from job_queue import scheduler, PRIORITY_USER, PRIORITY_CLIPBOARD, DONE, FAILED, CANCELLED
+import tasks
+from tasks import submit_items, plan_downloads, VIDEO_PLATFORMS
+from prefetch import prefetcher
+from postprocess import postprocessor
+from thumbnails import thumbnails
+from playlist import HandOff
+from status_scanner import StatusWatcher
+from stats_viewer import StatsView
 
 PLATFORMS = ['instagram', 'youtube', 'x', 'tiktok']
 CLIP_POLL_SECS = 2
+# Content keys already taken from the clipboard this session
+CLIP_MEMORY = 200
+# Save new WhatsApp statuses in the background as soon as they appear
+AUTO_CAPTURE_STATUSES = True
+# Playlist entries listed for selection before enumeration waits for the user
+STREAM_PREVIEW = 100
 
 
 class PlatformTab(MDBoxLayout, MDTabsBase):
@@ -27,7 +44,10 @@ class PlatformTab(MDBoxLayout, MDTabsBase):
         super().__init__(orientation='vertical', spacing=12, padding=12, **kwargs)
         self.platform = platform
         self.dialog = None
+        self.profile = DEFAULT_PROFILE
+        self.progress_bus = ProgressBus()
         self.setup_ui()
+        Clock.schedule_interval(self.refresh_progress, 1 / FRAME_HZ)
 
     def setup_ui(self):
         self.linkfield = MDTextField(
@@ -42,9 +62,20 @@ class PlatformTab(MDBoxLayout, MDTabsBase):
         btn_download = MDRaisedButton(text="DOWNLOAD", md_bg_color=(0, 0.5, 0, 1), on_release=self.on_download)
         btn_row.add_widget(btn_paste)
         btn_row.add_widget(btn_download)
+        if self.platform in VIDEO_PLATFORMS:
+            self.btn_profile = MDRaisedButton(text=QUALITY_PROFILES[self.profile]['label'], on_release=self.on_profile)
+            btn_row.add_widget(self.btn_profile)
 
         self.progress = AnimatedProgressBar(size_hint_y=None, height=4)
         self.progress.reset()
+        self.progress_label = MDLabel(
+            text="",
+            halign="right",
+            theme_text_color="Hint",
+            font_style="Caption",
+            size_hint_y=None,
+            height=dp(16)
+        )
 
         self.history_label = MDLabel(
             text="History",
@@ -61,57 +92,85 @@ class PlatformTab(MDBoxLayout, MDTabsBase):
             height=dp(40)
         )
 
-        self.history_container = MDBoxLayout(orientation='vertical', size_hint_y=None, spacing=8, padding=(0, 8))
-        self.history_container.bind(minimum_height=self.history_container.setter("height"))
-        self.history_container.add_widget(self.no_media_label)
-
-        scroll = ScrollView()
-        scroll.add_widget(self.history_container)
+        self.history_list = HistoryList(
+            query=lambda limit, offset: query_history(self.platform, limit, offset),
+            search=lambda text, limit, offset: search_history(text, self.platform, limit, offset),
+            on_action=self.on_history_action,
+        )
+        self.search_field = SearchField(self.history_list, on_results=lambda _: self.show_history_state())
 
         self.add_widget(self.linkfield)
         self.add_widget(btn_row)
         self.add_widget(self.progress)
+        self.add_widget(self.progress_label)
         self.add_widget(self.history_label)
-        self.add_widget(scroll)
+        self.add_widget(self.search_field)
+        self.add_widget(self.no_media_label)
+        self.add_widget(self.history_list)
 
         self.load_history()
 
     def on_paste(self, *_):
         self.linkfield.text = Clipboard.paste().strip()
-
-    def on_download(self, *_):
+        link = classify_url(self.linkfield.text)
+        # A collection is enumerated lazily on DOWNLOAD; extracting it here
+        # would resolve every entry up front
+        if link.platform not in ('unknown', 'whatsapp') and not link.collection:
+            prefetcher.metadata(link.url)
+
+    def on_profile(self, *_):
+        names = list(QUALITY_PROFILES)
+        self.profile = names[(names.index(self.profile) + 1) % len(names)]
+        self.btn_profile.text = QUALITY_PROFILES[self.profile]['label']
+
+    def on_download(self, *_, priority=PRIORITY_USER):
         text = self.linkfield.text.strip()
         if not text and self.platform != 'whatsapp':
             self.show_error("Please paste a link first")
             return
-        threading.Thread(target=self.download_flow, args=(text), daemon=True).start()
-
-    def download_flow(self, text):
         self.progress.reset()
-        items = []
-        try:
-            if self.platform == 'whatsapp':
-                res = parse_whatsapp_status_media()
-                items = res['media']
-            else:
-                res = parse_yt_dlp_metadata(text)
-                if 'error' in res:
-                    return self.show_error(res['error'])
-                items = [{'url': u, 'caption': res['caption'], 'username': res['username'], 'thumb': res['thumbnail']} for u in res['media']]
-
-            if not items:
-                return self.show_error("No media found")
-
-            if len(items) == 1:
-                self._download_items(items)
+        link = classify_url(text)
+        if link.collection:
+            return self.stream_collection(link, priority)
+        scheduler.submit('resolve', {'url': text, 'profile': self.profile}, platform=self.platform, priority=priority,
+                         key=f"resolve:{link_key(text)}")
+
+    def on_job(self, job):
+        # Called on a scheduler thread for every job state change
+        if job is None or job['platform'] != self.platform:
+            return
+        if job['kind'] == 'resolve':
+            if job['state'] == DONE:
+                items = job['result']['items']
+                if len(items) == 1:
+                    self._download_items(items, job['priority'])
+                else:
+                    # Name the files now, so their first bytes can be
+                    # fetched while the user picks
+                    todo, _ = plan_downloads(items)
+                    prefetcher.heads(todo)
+                    planned = {it['url']: it for it in todo}
+                    self.show_selection_modal([planned.get(it['url'], it) for it in items], job['priority'])
+            elif job['state'] == FAILED:
+                self.show_error(job['error'])
+        elif job['kind'] == 'download':
+            if job['state'] == DONE:
+                self.progress_bus.finish(job['id'])
+                self.add_history_item(job['result']['entry'])
+            elif job['state'] in (FAILED, CANCELLED):
+                self.progress_bus.finish(job['id'])
+                if job['state'] == FAILED:
+                    self.show_error(f"{job['payload']['filename']}: {job['error']}")
             else:
-                self.show_selection_modal(items)
-
-        except Exception as e:
-            self.show_error(f"Error: {str(e)}")
+                return
+            if not scheduler.jobs(platform=self.platform):
+                self.on_download_complete()
 
     @mainthread
     def show_error(self, msg):
+        # Dialog widgets are imported on first use to keep them off the startup path
+        from kivymd.uix.dialog import MDDialog
+        from kivymd.uix.button import MDFlatButton
         dialog = MDDialog(
             title="Error",
             text=msg,
@@ -120,8 +179,11 @@ class PlatformTab(MDBoxLayout, MDTabsBase):
         dialog.open()
 
     @mainthread
-    def show_selection_modal(self, items):
+    def show_selection_modal(self, items, priority=PRIORITY_USER):
+        from kivymd.uix.dialog import MDDialog
+        from kivymd.uix.button import MDFlatButton, MDIconButton
         selected = {item['url']: True for item in items}
+        confirmed = []
         content = MDBoxLayout(orientation='vertical', spacing=8, padding=8)
 
         for it in items:
@@ -142,100 +204,179 @@ class PlatformTab(MDBoxLayout, MDTabsBase):
             type="custom",
             content_cls=content,
             buttons=[
-                MDFlatButton(text="Download", on_release=lambda *_: (self.dialog.dismiss(), self._confirmed_download(items, selected))),
+                MDFlatButton(text="Download", on_release=lambda *_: (confirmed.append(True), self.dialog.dismiss(), self._confirmed_download(items, selected, priority))),
                 MDFlatButton(text="Cancel", on_release=lambda *_: self.dialog.dismiss())
             ]
         )
+        # Cancel, or a tap outside the dialog: drop everything prefetched
+        self.dialog.bind(on_dismiss=lambda *_: None if confirmed else prefetcher.cancel(items))
         self.dialog.open()
 
+    def stream_collection(self, link, priority=PRIORITY_USER):
+        # Playlists and profiles: entries appear in the dialog as they are
+        # enumerated and, once confirmed, are queued as they arrive
+        session = {'items': [], 'selected': {}, 'confirmed': False, 'closed': threading.Event(),
+                   'lock': threading.Lock(), 'handoff': HandOff(), 'priority': priority}
+        self.show_stream_modal(session)
+        threading.Thread(target=self._stream_entries, args=(link, session), daemon=True).start()
+
+    def _stream_entries(self, link, session):
+        stream = tasks.stream_resolve(link.url, self.platform, self.profile)
+        try:
+            for item in stream:
+                if session['closed'].is_set():
+                    break
+                with session['lock']:
+                    if not session['confirmed']:
+                        session['items'].append(item)
+                        session['selected'][item['url']] = True
+                        self.add_stream_row(session, item)
+                if session['confirmed']:
+                    self._queue_streamed([item], session)
+                # Enough to choose from: enumeration waits for the user
+                while (len(session['items']) >= STREAM_PREVIEW and not session['confirmed']
+                       and not session['closed'].wait(0.5)):
+                    pass
+        except Exception as e:
+            self.show_error(str(e))
+        finally:
+            stream.close()
+            self.stream_finished(session)
+
+    def _queue_streamed(self, items, session):
+        # Already downloaded entries are skipped quietly: re-running a
+        # playlist is how new entries get picked up
+        for it in items:
+            session['handoff'].begin(it)
+        if not scheduler.jobs(platform=self.platform):
+            self.progress_bus.clear()
+        submit_items(scheduler, self.platform, items, session['priority'])
+        for it in items:
+            session['handoff'].end(it)
+
+    def _confirm_stream(self, session):
+        with session['lock']:
+            session['confirmed'] = True
+            chosen = [it for it in session['items'] if session['selected'][it['url']]]
+        self.dialog.dismiss()
+        if chosen:
+            self._queue_streamed(chosen, session)
+
+    @mainthread
+    def show_stream_modal(self, session):
+        from kivy.uix.scrollview import ScrollView
+        from kivymd.uix.dialog import MDDialog
+        from kivymd.uix.button import MDFlatButton
+        rows = MDBoxLayout(orientation='vertical', spacing=8, padding=8, size_hint_y=None)
+        rows.bind(minimum_height=rows.setter('height'))
+        scroll = ScrollView(size_hint_y=None, height=dp(320))
+        scroll.add_widget(rows)
+        session['rows'] = rows
+        session['dialog'] = self.dialog = MDDialog(
+            title="Loading playlist...",
+            type="custom",
+            content_cls=scroll,
+            buttons=[
+                MDFlatButton(text="Download", on_release=lambda *_: self._confirm_stream(session)),
+                MDFlatButton(text="Cancel", on_release=lambda *_: self.dialog.dismiss())
+            ]
+        )
+        # Cancel or a tap outside stops enumeration; after Download it goes on
+        session['dialog'].bind(on_dismiss=lambda *_: None if session['confirmed'] else session['closed'].set())
+        session['dialog'].open()
+
+    @mainthread
+    def add_stream_row(self, session, item):
+        from kivymd.uix.button import MDIconButton
+        row = MDBoxLayout(size_hint_y=None, height=40, spacing=10)
+        row.add_widget(MDIconButton(
+            icon="checkbox-marked",
+            theme_text_color="Custom",
+            text_color=(0, 1, 0, 1),
+            on_release=lambda btn, u=item['url']: self.toggle_one(btn, u, session['selected'])
+        ))
+        row.add_widget(MDLabel(text=item.get('caption') or os.path.basename(item['url']), size_hint_x=0.8))
+        session['rows'].add_widget(row)
+        session['dialog'].title = f"Select media to download ({len(session['items'])} so far)"
+
+    @mainthread
+    def stream_finished(self, session):
+        if not session['confirmed'] and not session['closed'].is_set():
+            session['dialog'].title = f"Select media to download ({len(session['items'])})"
+
     def toggle_one(self, button, url, sel):
         sel[url] = not sel[url]
         button.icon = "checkbox-marked" if sel[url] else "checkbox-blank-outline"
 
-    def _confirmed_download(self, items, selected):
+    def _confirmed_download(self, items, selected, priority=PRIORITY_USER):
         chosen = [it for it in items if selected[it['url']]]
+        prefetcher.keep(chosen)
+        prefetcher.cancel([it for it in items if not selected[it['url']]])
         if not chosen:
             return self.show_error("Select at least one media")
-        self._download_items(chosen)
+        self._download_items(chosen, priority)
 
-    def _download_items(self, items):
-        for it in items:
-            fname = os.path.basename(it['url']).split('?')[0]
-            path = os.path.join(download_file.DIRECTORY, fname)
-            if os.path.exists(path):
-                self.show_error(f"{fname} already exists")
-            else:
-                download_file(it['url'], fname, on_progress=self.on_progress)
-
-            save_history_entry(self.platform, {
-                'path': path,
-                'caption': it.get('caption', ''),
-                'user': it.get('username', ''),
-                'thumb': it.get('thumb', ''),
-                'platform': self.platform
-            })
-            self.add_history_item({
-                'path': path,
-                'caption': it.get('caption', ''),
-                'user': it.get('username', ''),
-                'thumb': it.get('thumb', '')
-            })
+    def _download_items(self, items, priority=PRIORITY_USER):
+        if not scheduler.jobs(platform=self.platform):
+            self.progress_bus.clear()
+        ids, skipped = submit_items(scheduler, self.platform, items, priority)
+        for fname in skipped:
+            self.show_error(f"{fname} already downloaded")
+        if not ids:
+            self.on_download_complete()
 
+    @mainthread
+    def on_download_complete(self):
         self.linkfield.text = ""
         self.progress.animate_complete()
 
-    @mainthread
-    def on_progress(self, pct):
-        self.progress.value = pct
+    def refresh_progress(self, dt):
+        snap = self.progress_bus.snapshot()
+        if snap is None:
+            return
+        self.progress.value = snap['percent']
+        self.progress_label.text = format_status(snap)
 
     def load_history(self):
-        allh = load_history()
-        loaded = False
-        for e in allh:
-            if e.get('platform') == self.platform:
-                self.add_history_item(e)
-                loaded = True
-        if not loaded:
+        self.history_list.reload()
+        self.show_history_state()
+
+    def show_history_state(self):
+        if self.history_list.data:
+            self.hide_no_history()
+        else:
             self.show_no_history()
 
     @mainthread
     def show_no_history(self):
-        self.no_media_label.text = "No downloaded media"
+        self.no_media_label.text = "No matching downloads" if self.history_list.filter else "No downloaded media"
         self.no_media_label.opacity = 1
+        self.no_media_label.height = dp(40)
+
+    def hide_no_history(self):
+        self.no_media_label.opacity = 0
+        self.no_media_label.height = 0
 
     @mainthread
     def add_history_item(self, e):
-        if self.no_media_label in self.history_container.children:
-            self.history_container.remove_widget(self.no_media_label)
+        self.history_list.prepend(e)
+        self.show_history_state()
 
-        card = MDCard(
-            orientation='horizontal',
-            size_hint_y=None,
-            height=120,
-            padding=12,
-            spacing=12,
-            md_bg_color=(0.1, 0.1, 0.1, 1),
-            radius=[12]
-        )
-        img = AsyncImage(source=e['thumb'], size_hint=(None, None), size=(100, 100))
-        text_box = MDBoxLayout(orientation='vertical', spacing=4)
-        text_box.add_widget(MDLabel(text=e.get('user', ''), bold=True, theme_text_color="Custom", text_color=(1, 1, 1, 1)))
-        text_box.add_widget(MDLabel(
-            text=(e.get('caption', '')[:60] + "...") if len(e.get('caption', '')) > 60 else e.get('caption', ''),
-            theme_text_color="Secondary"
-        ))
+    @mainthread
+    def update_history_item(self, e):
+        self.history_list.update(e)
 
-        btn = MDRaisedButton(
-            text="⬇",
-            md_bg_color=(0, 0.5, 0, 1),
-            on_release=lambda *_: download_file(e['path'], os.path.basename(e['path']), on_progress=self.on_progress)
-        )
-        card.add_widget(img)
-        card.add_widget(text_box)
-        card.add_widget(btn)
+    def on_history_action(self, e):
+        threading.Thread(
+            target=download_file,
+            args=(e['path'], os.path.basename(e['path'])),
+            kwargs={'on_progress': self.progress_bus.reporter(e['path'])},
+            daemon=True
+        ).start()
 
-        self.history_container.add_widget(card)
 
+class StatsTab(StatsView, MDTabsBase):
+    pass
 
 
 class StealthApp(MDApp):
@@ -250,12 +391,58 @@ class StealthApp(MDApp):
             tab = PlatformTab(p, title=p.capitalize())
             self.tabs.add_widget(tab)
             self.tab_map[p] = tab
+        self.stats_tab = StatsTab(title="Stats")
+        self.tabs.add_widget(self.stats_tab)
+        self.tabs.bind(on_tab_switch=self.on_tab_switch)
+
+        tasks.register(scheduler, progress_for=self.job_progress)
+        for tab in self.tab_map.values():
+            scheduler.subscribe(tab.on_job)
+        postprocessor.subscribe(self.on_processed)
 
         self.last_clip = ""
+        self.clip_handled = OrderedDict()
+        self.status_watcher = None
         return self.tabs
 
     def on_start(self):
+        # Picks up jobs left pending or running by a previous session
+        scheduler.start()
         Clock.schedule_interval(self.check_clip, CLIP_POLL_SECS)
+        Window.bind(on_flip=self.on_first_frame)
+
+    def on_first_frame(self, *_):
+        # Deferred startup work: create directories and load yt-dlp in the
+        # extractor workers only once the UI is on screen
+        Window.unbind(on_flip=self.on_first_frame)
+        downloader.init()
+        media_parser.init()
+        extractor.prewarm()
+        if AUTO_CAPTURE_STATUSES:
+            self.status_watcher = StatusWatcher(media_parser.statuses,
+                                                lambda entries: tasks.capture_statuses(scheduler, entries))
+            self.status_watcher.start()
+
+    def on_stop(self):
+        if self.status_watcher:
+            self.status_watcher.stop()
+        scheduler.stop()
+        postprocessor.shutdown()
+        thumbnails.flush()
+
+    def on_processed(self, entry):
+        # A post-processed entry may have a new path (remux) or share copy
+        tab = self.tab_map.get(entry['platform'])
+        if tab:
+            tab.update_history_item(entry)
+
+    def on_tab_switch(self, tabs, tab, *_):
+        if tab is self.stats_tab:
+            tab.refresh()
+
+    def job_progress(self, job):
+        tab = self.tab_map.get(job['platform'])
+        return tab.progress_bus.reporter(job['id']) if tab else None
 
     def check_clip(self, dt):
         try:
@@ -264,13 +451,24 @@ class StealthApp(MDApp):
                 return
             self.last_clip = clip
 
-            plat = detect_platform(clip)
-            if plat != "unknown" and plat in self.tab_map:
-                current_tab = self.tabs.get_current_tab()
-                if current_tab.text.lower() != plat:
-                    self.tabs.switch_tab(self.tab_map[plat])
-                self.tab_map[plat].linkfield.text = clip
-                self.tab_map[plat].on_download()
+            link = classify_url(clip)
+            plat = link.platform
+            # The same post copied again (maybe with other tracking params)
+            # must not start a second download
+            if plat not in self.tab_map or link.key in self.clip_handled:
+                return
+            self.clip_handled[link.key] = True
+            while len(self.clip_handled) > CLIP_MEMORY:
+                self.clip_handled.popitem(last=False)
+
+            current_tab = self.tabs.get_current_tab()
+            if current_tab.text.lower() != plat:
+                self.tabs.switch_tab(self.tab_map[plat])
+            self.tab_map[plat].linkfield.text = link.url
+            # Extraction starts now, even if the resolve job has to queue
+            if not link.collection:
+                prefetcher.metadata(link.url)
+            self.tab_map[plat].on_download(priority=PRIORITY_CLIPBOARD)
         except Exception as e:
             print(f"Clipboard check error: {e}")
 
@@ -1,70 +1,111 @@
-import yt_dlp
 import os
+import ratelimit
+import telemetry
+from credentials import COOKIE_DIR, COOKIE_FILE, instagram_sessions
+from ratelimit import limiter
 from utils import detect_platform
+from metadata_cache import cache
+from extractor_pool import pool as extractor
+from status_scanner import StatusScanner, WHATSAPP_STATUS_DIR
 
-COOKIE_FILE = "cookies/instagram.txt"
-os.makedirs("cookies", exist_ok=True)
+# Extraction attempts on other sessions after a throttled one
+THROTTLE_ATTEMPTS = 3
 
-WHATSAPP_STATUS_DIR = "/storage/emulated/0/WhatsApp/Media/.Statuses/"
+statuses = StatusScanner(WHATSAPP_STATUS_DIR)
+
+def parse_yt_dlp_metadata(url, username=None, password=None, allow_stale=False):
+    # With allow_stale, an expired cache entry is returned at once (marked
+    # "stale") while a background refresh replaces it; otherwise the caller
+    # waits for fresh data, sharing any refresh already in flight.
+    with telemetry.span("metadata", platform=detect_platform(url)) as span:
+        cached, fresh = cache.get(url)
+        if cached is not None:
+            if fresh:
+                span.set(cache="hit")
+                return cached
+            if allow_stale:
+                span.set(cache="stale")
+                cache.refresh(url, lambda: _extract_metadata(url, username, password), background=True)
+                return {**cached, "stale": True}
+        span.set(cache="miss")
+        with span.phase("extract"):
+            res = cache.refresh(url, lambda: _extract_metadata(url, username, password))
+        if "error" in res:
+            span.fail(res["error"])
+        return res
+
+
+def init():
+    # yt-dlp writes the cookie jar here; nothing touches the disk at import
+    os.makedirs(COOKIE_DIR, exist_ok=True)
 
-def parse_yt_dlp_metadata(url, username=None, password=None):
-    try:
-        ydl_opts = {
-            "quiet": True,
-            "skip_download": True,
-            "cookiefile": COOKIE_FILE if os.path.exists(COOKIE_FILE) else None,
-        }
-
-        # Handle optional login and cookie saving
-        if not os.path.exists(COOKIE_FILE) and username and password:
-            ydl_opts.update({
-                "username": username,
-                "password": password,
-                "cookiefile": COOKIE_FILE,
-                "write_cookies": True,
-            })
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-
-        media = []
-
-        if "entries" in info:
-            for entry in info["entries"]:
-                media_url = entry.get("url")
-                if media_url:
-                    media.append(media_url)
-        elif "url" in info:
-            media.append(info["url"])
-
-        return {
-            "caption": info.get("title", ""),
-            "username": info.get("uploader", ""),
-            "thumbnail": info.get("thumbnail", ""),
-            "media": media,
-        }
 
+def _extract_metadata(url, username=None, password=None):
+    # Instagram goes out on the pooled session that can go soonest; one that
+    # gets throttled is blocked and the next is tried. A throttled result
+    # says how long until any session can retry, for the job scheduler.
+    platform = detect_platform(url)
+    try:
+        init()
+        for _ in range(THROTTLE_ATTEMPTS):
+            session = instagram_sessions.pick() if platform == "instagram" else {"name": None}
+            name = session["name"]
+            limiter.acquire(url, name, max_wait=ratelimit.MAX_INLINE_WAIT)
+            res = extractor.extract(url, _session_opts(session, username, password), platform=platform)
+            if "error" not in res or not ratelimit.is_throttle_error(res["error"]):
+                limiter.ok(url, name)
+                return res
+            limiter.throttled(url, session=name)
+            span = telemetry.current()
+            if span:
+                span.count("throttled")
+        return {**res, "throttled": True, "retry_after": _retry_delay(url, platform)}
+    except ratelimit.Throttled as e:
+        return {"error": str(e), "throttled": True, "retry_after": e.delay}
     except Exception as e:
         return {"error": str(e)}
 
+
+def _retry_delay(url, platform):
+    if platform != "instagram":
+        return limiter.delay(url)
+    return min(limiter.delay(url, s["name"]) for s in instagram_sessions.sessions())
+
+
+def _session_opts(session, username=None, password=None):
+    cookiefile = session.get("cookiefile", COOKIE_FILE)
+    username = session.get("username", username)
+    password = session.get("password", password)
+    ydl_opts = {
+        "quiet": True,
+        "skip_download": True,
+        "cookiefile": cookiefile if cookiefile and os.path.exists(cookiefile) else None,
+    }
+
+    # Handle optional login and cookie saving
+    if cookiefile and not os.path.exists(cookiefile) and username and password:
+        ydl_opts.update({
+            "username": username,
+            "password": password,
+            "cookiefile": cookiefile,
+            "write_cookies": True,
+        })
+    return ydl_opts
+
 # Instagram uses the same function
 def parse_instagram_metadata(url, username=None, password=None):
     return parse_yt_dlp_metadata(url, username, password)
 
-# WhatsApp local status fetch
-def parse_whatsapp_status_media():
-    files = []
-
-    if os.path.isdir(WHATSAPP_STATUS_DIR):
-        for fname in sorted(os.listdir(WHATSAPP_STATUS_DIR)):
-            if fname.lower().endswith((".jpg", ".jpeg", ".png", ".mp4", ".gif")):
-                path = os.path.join(WHATSAPP_STATUS_DIR, fname)
-                files.append({
-                    "url": path,
-                    "caption": f"WhatsApp status: {fname}",
-                    "username": "WhatsApp Status",
-                    "thumbnail": path,
-                })
+# WhatsApp statuses: only files that are new or changed since the last scan
+def status_item(entry):
+    return {
+        "url": entry["path"],
+        "caption": f"WhatsApp status: {entry['name']}",
+        "username": "WhatsApp Status",
+        "thumbnail": entry["path"],
+        "keys": [f"status:{entry['name']}:{entry['size']}:{entry['mtime_ns']}"],
+    }
 
-    return {"media": files}
 
+def parse_whatsapp_status_media():
+    return {"media": [status_item(e) for e in statuses.scan()]}
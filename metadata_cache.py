@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from utils import link_key
+
+CACHE_DIR = "cache"
+DB_FILE = os.path.join(CACHE_DIR, "metadata.db")
+
+# Signed CDN links rarely live longer than this; links that carry their own
+# expiry (see _expiry_of) get a shorter TTL
+DEFAULT_TTL = 6 * 60 * 60
+MIN_TTL = 60
+EXPIRY_MARGIN = 5 * 60
+
+MAX_ENTRIES = 500
+MEMORY_ENTRIES = 64
+# Access times only order eviction, so hits are written back in batches:
+# before an eviction, or once this many are pending or this old
+TOUCH_BATCH = 32
+TOUCH_INTERVAL = 60
+
+
+def _expiry_of(media_url):
+    # googlevideo: expire=<epoch>, Instagram/Facebook CDN: oe=<hex epoch>,
+    # TikTok: x-expires=<epoch>
+    query = parse_qs(urlsplit(media_url).query)
+    try:
+        if "expire" in query:
+            return int(query["expire"][0])
+        if "x-expires" in query:
+            return int(query["x-expires"][0])
+        if "oe" in query:
+            return int(query["oe"][0], 16)
+    except ValueError:
+        pass
+    return None
+
+
+def ttl_for(result, now=None):
+    now = now or time.time()
+    expiries = [e for e in map(_expiry_of, result.get("media", [])) if e]
+    if not expiries:
+        return DEFAULT_TTL
+    return max(MIN_TTL, min(DEFAULT_TTL, min(expiries) - now - EXPIRY_MARGIN))
+
+
+class MetadataCache:
+    """Two-tier (memory LRU in front of SQLite LRU) cache of parsed metadata.
+
+    get() returns (value, fresh). Expired values are still returned with
+    fresh=False until evicted, so callers can show them while refresh()
+    fetches a new copy; concurrent refreshes of one key share a single fetch.
+    """
+
+    def __init__(self, path=DB_FILE, max_entries=MAX_ENTRIES, memory_entries=MEMORY_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._inflight = {}
+        self._touched = {}
+        self._flushed = time.time()
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata(accessed)")
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key, value, expires):
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, url):
+        key = link_key(url)
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is None:
+                row = self._conn().execute(
+                    "SELECT value, expires FROM metadata WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None, False
+                hit = (json.loads(row[0]), row[1])
+            self._remember(key, *hit)
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_BATCH or now - self._flushed >= TOUCH_INTERVAL:
+                self._flush_touched()
+                self._conn().commit()
+        value, expires = hit
+        return value, expires > now
+
+    def _flush_touched(self):
+        # Caller holds the lock and commits
+        if self._touched:
+            self._conn().executemany("UPDATE metadata SET accessed = ? WHERE key = ?",
+                                     [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+        self._flushed = time.time()
+
+    def put(self, url, value):
+        key = link_key(url)
+        now = time.time()
+        expires = now + ttl_for(value, now)
+        with self._lock:
+            self._remember(key, value, expires)
+            self._touched.pop(key, None)
+            self._flush_touched()
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+                       (key, json.dumps(value), expires, now))
+            db.execute(
+                "DELETE FROM metadata WHERE key IN ("
+                " SELECT key FROM metadata ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+            db.commit()
+
+    def refresh(self, url, fetch, background=False):
+        """Run ``fetch()`` for ``url`` unless a fetch is already in flight, and cache the result.
+
+        Errors (dicts with an 'error' key) are returned but not cached.
+        """
+        key = link_key(url)
+        with self._lock:
+            job = self._inflight.get(key)
+            owner = job is None
+            if owner:
+                job = self._inflight[key] = {"done": threading.Event(), "result": None}
+
+        def run():
+            try:
+                result = fetch()
+                if "error" not in result:
+                    self.put(url, result)
+            except Exception as e:
+                result = {"error": str(e)}
+            job["result"] = result
+            with self._lock:
+                self._inflight.pop(key, None)
+            job["done"].set()
+
+        if owner:
+            if background:
+                threading.Thread(target=run, daemon=True).start()
+                return None
+            run()
+        elif background:
+            return None
+        job["done"].wait()
+        return job["result"]
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._conn().execute("DELETE FROM metadata")
+            self._conn().commit()
+
+
+cache = MetadataCache()
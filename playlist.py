@@ -0,0 +1,213 @@
+import os
+import queue
+import sqlite3
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+import media_parser
+from extractor_pool import pool as extractor
+from utils import classify_url
+
+# Streaming extraction of playlists and profiles. Entries are enumerated
+# flat (no per-video extraction) in an extractor worker and flow through
+# bounded queues: enumerate -> resolve -> the caller's download stage. A
+# slow consumer therefore pauses enumeration instead of piling up entries,
+# and a 300-video playlist starts downloading after its first page.
+#
+# A cursor per playlist records how far entries have been handed off, so
+# an interrupted run resumes where it stopped rather than from the top.
+
+DB_FILE = os.path.join("cache", "playlists.db")
+# Enumerated entries waiting to be resolved
+ENTRY_QUEUE = 16
+# Entries resolved concurrently (and buffered ahead of the consumer)
+RESOLVE_WORKERS = 2
+RESOLVE_AHEAD = 4
+
+
+class PlaylistStore:
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS playlists ("
+                " key TEXT PRIMARY KEY, url TEXT NOT NULL, next_index INTEGER NOT NULL DEFAULT 0,"
+                " complete INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._db.commit()
+        return self._db
+
+    def start_index(self, key):
+        # Where enumeration resumes: a finished playlist is walked again
+        # from the top (new entries; downloaded ones are skipped later)
+        with self._lock:
+            row = self._conn().execute("SELECT next_index, complete FROM playlists WHERE key = ?",
+                                       (key,)).fetchone()
+        return row[0] if row and not row[1] else 0
+
+    def begin(self, key, url, start):
+        with self._lock:
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO playlists (key, url, next_index, complete) VALUES (?, ?, ?, 0)",
+                       (key, url, start))
+            db.commit()
+
+    def advance(self, key, next_index):
+        with self._lock:
+            db = self._conn()
+            db.execute("UPDATE playlists SET next_index = ? WHERE key = ?", (next_index, key))
+            db.commit()
+
+    def finish(self, key):
+        with self._lock:
+            db = self._conn()
+            db.execute("UPDATE playlists SET complete = 1 WHERE key = ?", (key,))
+            db.commit()
+
+    def forget(self, key):
+        with self._lock:
+            db = self._conn()
+            db.execute("DELETE FROM playlists WHERE key = ?", (key,))
+            db.commit()
+
+
+store = PlaylistStore()
+
+
+def _enumerate_opts():
+    media_parser.init()
+    return {
+        "quiet": True,
+        "extract_flat": "in_playlist",
+        "lazy_playlist": True,
+        "cookiefile": media_parser.COOKIE_FILE if os.path.exists(media_parser.COOKIE_FILE) else None,
+    }
+
+
+def iter_entries(url, platform="", start=0):
+    """Yield {'index', 'entry'} for each entry of playlist ``url`` from
+    ``start`` on, as the extractor enumerates them.
+
+    Closing the generator early stops the extractor job; its worker stays
+    warm. Returns the final extractor result ({'playlist': False} when
+    ``url`` is a single video).
+    """
+    q = queue.Queue(ENTRY_QUEUE)
+    closed = threading.Event()
+
+    def on_message(msg):
+        # Runs on the driver thread of the extractor's enumerate lane:
+        # blocking here is what holds enumeration back while the queue is
+        # full, and False tells the worker to stop
+        if msg["type"] != "entry":
+            return None
+        while not closed.is_set():
+            try:
+                q.put(msg, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    future = extractor.submit("enumerate", url, _enumerate_opts(), platform, on_message, start=start)
+    try:
+        while True:
+            try:
+                msg = q.get(timeout=0.2)
+            except queue.Empty:
+                # Every entry is queued before the job's result is set
+                if future.done() and q.empty():
+                    break
+                continue
+            yield {"index": msg["index"], "entry": msg["entry"]}
+    finally:
+        closed.set()
+    res = future.result()
+    if "error" in res:
+        raise RuntimeError(res["error"])
+    return res
+
+
+def stream_items(url, platform, resolve_entry, start=None):
+    """Download items for every entry of playlist ``url``, in order.
+
+    ``resolve_entry(entry)`` turns a flat entry into items; it runs on
+    RESOLVE_WORKERS threads while later entries are still enumerated. Each
+    item gets 'playlist' (the cursor key) and 'entry' (its index); report
+    hand-offs through a HandOff so an interrupted run can resume. With
+    ``start`` None, enumeration resumes at the stored cursor. Yields
+    nothing when ``url`` turns out not to be a playlist.
+    """
+    link = classify_url(url)
+    if start is None:
+        start = store.start_index(link.key)
+    store.begin(link.key, link.url, start)
+
+    source = iter_entries(link.url, platform, start)
+    ahead, result, exhausted = deque(), {}, False
+    with ThreadPoolExecutor(RESOLVE_WORKERS, thread_name_prefix="playlist-resolve") as pool:
+        try:
+            while True:
+                # Keep a few entries resolving ahead of the consumer; results
+                # are yielded in playlist order
+                while not exhausted and len(ahead) < RESOLVE_AHEAD:
+                    try:
+                        e = next(source)
+                    except StopIteration as stop:
+                        result, exhausted = stop.value or {}, True
+                        break
+                    ahead.append((e["index"], pool.submit(resolve_entry, e["entry"])))
+                if not ahead:
+                    break
+                index, future = ahead.popleft()
+                try:
+                    items = future.result()
+                except Exception as e:
+                    print(f"Playlist entry {index} skipped: {e}")
+                    continue
+                for it in items:
+                    yield {**it, "playlist": link.key, "entry": index}
+        finally:
+            source.close()
+            for _, future in ahead:
+                future.cancel()
+    if result.get("playlist"):
+        store.finish(link.key)
+
+
+class HandOff:
+    """Moves a playlist's cursor to the first entry not yet handed off.
+
+    Call begin(item) when an item is taken and end(item) once it is safe
+    (queued as a job, or downloaded); items may end in any order.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._highest = {}
+        self._lock = threading.Lock()
+
+    def begin(self, item):
+        if "playlist" not in item:
+            return
+        with self._lock:
+            self._pending.setdefault(item["playlist"], Counter())[item["entry"]] += 1
+            self._highest[item["playlist"]] = max(self._highest.get(item["playlist"], -1), item["entry"])
+
+    def end(self, item):
+        if "playlist" not in item:
+            return
+        key = item["playlist"]
+        with self._lock:
+            pending = self._pending[key]
+            pending[item["entry"]] -= 1
+            if pending[item["entry"]] <= 0:
+                del pending[item["entry"]]
+            cursor = min(pending) if pending else self._highest[key] + 1
+        store.advance(key, cursor)
@@ -0,0 +1,340 @@
+import os
+import sys
+import json
+import queue
+import shutil
+import importlib
+import threading
+import subprocess
+from concurrent.futures import Future
+from download_index import index
+from history import update_history_entry
+
+# Optional decoders, as in thumbnails.py: Pillow for images, ffmpeg for
+# audio/video. Steps whose tool is missing are skipped.
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+# Post-processing of finished downloads. tasks.save_download feeds every new
+# history entry to the pipeline; its file goes through ENABLED_STEPS in a
+# worker process, and each step's result is recorded on the entry under
+# 'postprocess'. A remux replaces the entry's 'path'; a smaller or
+# metadata-free copy for sharing becomes its 'share_path'.
+#
+# Steps are pluggable: step(name, applies) registers fn(state) -> result,
+# where state holds the current 'path' and 'share' and a result's 'path' /
+# 'share' update them for the steps after it. Register steps at import
+# time of their module: a worker process imports that module by name.
+
+# Run on every new download, in this order. "strip" (a full-size
+# metadata-free copy of every video) and "audio" are opt-in.
+ENABLED_STEPS = ["remux", "shrink"]
+WORKERS = os.cpu_count() or 2
+
+REMUX_EXTS = (".mkv", ".webm", ".mov", ".flv", ".ts", ".3gp")
+VIDEO_EXTS = (".mp4", ".m4v") + REMUX_EXTS
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Share copies live in this folder next to the original
+SHARE_DIR = "share"
+SHARE_MAX_PX = 1600
+SHARE_QUALITY = 85
+FFMPEG_TIMEOUT = 10 * 60
+
+STEPS = {}
+
+
+def step(name, applies):
+    """Register ``fn(state)`` as step ``name``, run when ``applies(state)``."""
+    def register(fn):
+        STEPS[name] = (applies, fn)
+        return fn
+    return register
+
+
+def _ext(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def _ffmpeg(*args):
+    ffmpeg = shutil.which("ffmpeg")
+    res = subprocess.run([ffmpeg, "-y", "-loglevel", "error", *args],
+                         capture_output=True, text=True, timeout=FFMPEG_TIMEOUT)
+    if res.returncode != 0:
+        lines = res.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"ffmpeg exited with {res.returncode}")
+
+
+def _free_name(path):
+    base, ext = os.path.splitext(path)
+    candidate, n = path, 1
+    while os.path.exists(candidate):
+        candidate = f"{base} ({n}){ext}"
+        n += 1
+    return candidate
+
+
+def _share_name(path, ext=None):
+    folder = os.path.join(os.path.dirname(path), SHARE_DIR)
+    os.makedirs(folder, exist_ok=True)
+    stem, own_ext = os.path.splitext(os.path.basename(path))
+    return os.path.join(folder, stem + (ext or own_ext))
+
+
+def _ffmpeg_into(out, *args):
+    # Written under a temporary name, so a failed run leaves nothing behind
+    tmp = out + ".tmp" + _ext(out)
+    try:
+        _ffmpeg(*args, tmp)
+        os.replace(tmp, out)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return out
+
+
+@step("remux", lambda s: _ext(s["path"]) in REMUX_EXTS and shutil.which("ffmpeg"))
+def remux(state):
+    # Same streams in an MP4 container, which every player handles
+    src = state["path"]
+    out = _ffmpeg_into(_free_name(os.path.splitext(src)[0] + ".mp4"),
+                       "-i", src, "-map", "0:v?", "-map", "0:a?", "-c", "copy", "-movflags", "+faststart")
+    os.remove(src)
+    return {"path": out, "from": os.path.basename(src)}
+
+
+@step("shrink", lambda s: _ext(s["path"]) in IMAGE_EXTS and Image is not None)
+def shrink(state):
+    # A JPEG for sharing; re-encoding drops EXIF, so orientation is applied first
+    src = state["path"]
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        im.thumbnail((SHARE_MAX_PX, SHARE_MAX_PX))
+        out = _share_name(src, ".jpg")
+        im.save(out, "JPEG", quality=SHARE_QUALITY, optimize=True)
+        width, height = im.size
+    return {"share": out, "width": width, "height": height,
+            "bytes": os.path.getsize(out), "original_bytes": os.path.getsize(src)}
+
+
+def _strippable(state):
+    if state["share"]:
+        return False
+    ext = _ext(state["path"])
+    return (ext in IMAGE_EXTS and Image is not None) or (ext in VIDEO_EXTS and bool(shutil.which("ffmpeg")))
+
+
+@step("strip", _strippable)
+def strip(state):
+    src = state["path"]
+    out = _share_name(src)
+    if _ext(src) in IMAGE_EXTS:
+        fmt = Image.registered_extensions().get(_ext(src), "JPEG")
+        with Image.open(src) as im:
+            im = ImageOps.exif_transpose(im)
+            im.save(out, fmt, **({"quality": 95} if fmt == "JPEG" else {}))
+    else:
+        _ffmpeg_into(out, "-i", src, "-map", "0", "-map_metadata", "-1", "-c", "copy")
+    return {"share": out}
+
+
+@step("audio", lambda s: _ext(s["path"]) in VIDEO_EXTS and shutil.which("ffmpeg"))
+def audio(state):
+    src = state["path"]
+    out = _free_name(os.path.splitext(src)[0] + ".m4a")
+    try:
+        _ffmpeg_into(out, "-i", src, "-vn", "-c:a", "copy")
+    except RuntimeError:
+        # Not AAC (e.g. Opus from a WebM): encode it
+        _ffmpeg_into(out, "-i", src, "-vn", "-c:a", "aac", "-b:a", "160k")
+    return {"audio": out}
+
+
+def process(path, steps):
+    """Run ``steps`` on ``path``; runs in a worker process."""
+    state = {"path": path, "share": None}
+    results = {}
+    for name in steps:
+        applies, fn = STEPS[name]
+        if not os.path.exists(state["path"]) or not applies(state):
+            continue
+        try:
+            res = fn(state) or {}
+        except Exception as e:
+            res = {"error": str(e)}
+        state.update((k, res[k]) for k in ("path", "share") if k in res)
+        results[name] = res
+    return {**state, "steps": results}
+
+
+def _serve():
+    # Child process side, as in extractor_pool: one JSON job per stdin line,
+    # its result as one line on stdout, which is reserved for that
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    sys.stdout = sys.stderr
+    # Run as a script this is __main__; custom steps register with it
+    sys.modules.setdefault("postprocess", sys.modules[__name__])
+    for line in sys.stdin:
+        if line.strip():
+            job = json.loads(line)
+            for module, folder in job["modules"]:
+                if folder not in sys.path:
+                    sys.path.append(folder)
+                importlib.import_module(module)
+            out.write(json.dumps(process(job["path"], job["steps"])) + "\n")
+
+
+class _Workers:
+    """Runs process() on ``size`` worker processes.
+
+    The workers are fresh interpreters (``python postprocess.py --serve``)
+    that import only this module and the modules of custom steps: forking
+    the app would copy its threads' locks, and multiprocessing's spawn
+    would import main.py, and open a Kivy window, in every worker. Android
+    has no usable sys.executable, so there process() runs on the driver
+    threads; ffmpeg still runs in its own process.
+    """
+
+    def __init__(self, size, use_processes=None):
+        if use_processes is None:
+            use_processes = bool(sys.executable) and not hasattr(sys, "getandroidapilevel")
+        self.use_processes = use_processes
+        self._jobs = queue.Queue()
+        self._drivers = []
+        for slot in range(size):
+            driver = threading.Thread(target=self._drive, name=f"postprocess-{slot}", daemon=True)
+            driver.start()
+            self._drivers.append(driver)
+
+    def submit(self, path, steps):
+        future = Future()
+        modules = sorted({(m, os.path.dirname(os.path.abspath(sys.modules[m].__file__)))
+                          for m in {STEPS[name][1].__module__ for name in steps} - {__name__, "__main__"}})
+        self._jobs.put((future, {"path": path, "steps": steps, "modules": modules}))
+        return future
+
+    def _spawn(self):
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+        )
+
+    def _drive(self):
+        proc = None
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, msg = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if not self.use_processes:
+                    future.set_result(process(msg["path"], msg["steps"]))
+                    continue
+                if proc is None or proc.poll() is not None:
+                    proc = self._spawn()
+                proc.stdin.write(json.dumps(msg) + "\n")
+                proc.stdin.flush()
+                line = proc.stdout.readline()
+                if not line:
+                    raise EOFError("post-processing worker exited")
+                future.set_result(json.loads(line))
+            except Exception as e:
+                if proc is not None:
+                    proc.kill()
+                    proc = None
+                future.set_exception(e)
+        if proc is not None:
+            proc.stdin.close()
+            proc.wait()
+            proc.stdout.close()
+
+    def shutdown(self, wait=False, cancel_futures=False):
+        if cancel_futures:
+            while True:
+                try:
+                    job = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    job[0].cancel()
+        for _ in self._drivers:
+            self._jobs.put(None)
+        if wait:
+            for driver in self._drivers:
+                driver.join()
+
+
+class PostProcessor:
+    def __init__(self, steps=None, workers=WORKERS):
+        self.steps = ENABLED_STEPS if steps is None else steps
+        self.workers = workers
+        self.subscribers = []
+        self._pool = None
+        self._pending = 0
+        self._cond = threading.Condition()
+
+    def subscribe(self, callback):
+        # callback(entry) with the updated history entry, on a pool thread
+        self.subscribers.append(callback)
+
+    def submit(self, entry):
+        steps = [s for s in self.steps if s in STEPS]
+        if not steps or not entry.get("path") or not os.path.isfile(entry["path"]):
+            return None
+        with self._cond:
+            if self._pool is None:
+                self._pool = _Workers(self.workers)
+            future = self._pool.submit(entry["path"], steps)
+            self._pending += 1
+        future.add_done_callback(lambda f: self._done(entry, f))
+        return future
+
+    def _done(self, entry, future):
+        try:
+            try:
+                res = future.result()
+            except Exception as e:
+                # The worker died (its driver starts a new one) or the job was
+                # cancelled at shutdown
+                res = {"path": entry["path"], "share": None, "steps": {"error": str(e) or type(e).__name__}}
+            fields = {"postprocess": res["steps"]}
+            if res["path"] != entry["path"]:
+                # The download index now points at the remuxed file
+                index.move(entry["path"], res["path"])
+                fields["path"] = res["path"]
+            if res["share"]:
+                fields["share_path"] = res["share"]
+            updated = update_history_entry(entry["id"], fields)
+            # None when the entry was deleted meanwhile
+            for callback in self.subscribers if updated else ():
+                callback(updated)
+        except Exception as e:
+            print(f"Post-processing error: {e}")
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until everything submitted has been processed."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def shutdown(self, wait=False):
+        with self._cond:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+postprocessor = PostProcessor()
+
+
+if __name__ == "__main__" and "--serve" in sys.argv:
+    _serve()
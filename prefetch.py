@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from download_index import BLOCK_SIZE
+from downloader import prefetch_head, discard_partial, PrefetchCancelled
+from media_parser import parse_yt_dlp_metadata
+from utils import link_key
+
+# Speculative work while the user is still deciding. Metadata extraction
+# starts as soon as a link is classified, and while the selection dialog
+# of a multi-item post is open the first range of each candidate file is
+# fetched into the .part file and manifest its download resumes from.
+# Confirmed items keep those bytes; the rest are cancelled and deleted.
+
+# First range fetched per candidate; whole blocks, so it can be resumed
+PREFETCH_BYTES = 2 * BLOCK_SIZE
+# Speculative bytes outstanding at once, i.e. what a dialog dismissed
+# without downloading can cost on a metered connection; 0 turns it off
+PREFETCH_BUDGET = 16 * 1024 * 1024
+PREFETCH_WORKERS = 3
+METADATA_WORKERS = 2
+
+
+class Prefetcher:
+    def __init__(self, budget=PREFETCH_BUDGET, head_bytes=PREFETCH_BYTES):
+        self.budget = budget
+        self.head_bytes = head_bytes
+        self._lock = threading.Lock()
+        self._heads = {}  # filename -> {'future', 'cancelled', 'reserved'}
+        self._reserved = 0
+        self._metadata = {}  # link key -> future
+        self._head_pool = None
+        self._meta_pool = None
+
+    def metadata(self, url):
+        """Start extracting ``url``'s metadata into the cache; the resolve
+        job then finds it there or joins the refresh in flight."""
+        key = link_key(url)
+        with self._lock:
+            if key in self._metadata:
+                return self._metadata[key]
+            if self._meta_pool is None:
+                self._meta_pool = ThreadPoolExecutor(METADATA_WORKERS, thread_name_prefix="prefetch-meta")
+            future = self._meta_pool.submit(parse_yt_dlp_metadata, url, allow_stale=True)
+            self._metadata[key] = future
+        future.add_done_callback(lambda _: self._forget_metadata(key))
+        return future
+
+    def _forget_metadata(self, key):
+        with self._lock:
+            self._metadata.pop(key, None)
+
+    def heads(self, items):
+        """Prefetch the first range of planned ``items`` (with 'filename'),
+        as far as the budget allows."""
+        for it in items:
+            # yt-dlp downloads and local files have nothing to prefetch
+            if it.get('profile') or not it['url'].startswith(('http://', 'https://')):
+                continue
+            with self._lock:
+                if it['filename'] in self._heads:
+                    continue
+                size = min(self.head_bytes, self.budget - self._reserved)
+                size -= size % BLOCK_SIZE
+                if size <= 0:
+                    return
+                if self._head_pool is None:
+                    self._head_pool = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix="prefetch")
+                entry = {'cancelled': threading.Event(), 'reserved': size}
+                self._reserved += size
+                entry['future'] = self._head_pool.submit(self._fetch, it['url'], it['filename'], size, entry)
+                self._heads[it['filename']] = entry
+
+    def _fetch(self, url, filename, size, entry):
+        try:
+            return prefetch_head(url, filename, size, entry['cancelled'].is_set)
+        except PrefetchCancelled:
+            return 0
+        except Exception as e:
+            print(f"Prefetch error: {e}")
+            return 0
+
+    def keep(self, items):
+        # The bytes now belong to real downloads, which wait for any
+        # prefetch still running on their file
+        with self._lock:
+            for it in items:
+                entry = self._heads.pop(it.get('filename'), None)
+                if entry:
+                    self._reserved -= entry['reserved']
+
+    def cancel(self, items):
+        with self._lock:
+            entries = [(it['filename'], self._heads.pop(it['filename']))
+                       for it in items if it.get('filename') in self._heads]
+        for filename, entry in entries:
+            entry['cancelled'].set()
+            entry['future'].add_done_callback(lambda _, f=filename, e=entry: self._discard(f, e))
+
+    def _discard(self, filename, entry):
+        try:
+            discard_partial(filename)
+        finally:
+            with self._lock:
+                self._reserved -= entry['reserved']
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,135 @@
+import threading
+import time
+
+# How often the UI drains the bus; download threads never wait on it
+FRAME_HZ = 15
+# Smoothing for bytes/s; higher reacts faster, lower is steadier
+SPEED_ALPHA = 0.3
+
+
+class _Transfer:
+    __slots__ = ("done", "total", "finished", "last_done", "speed")
+
+    def __init__(self, total):
+        self.done = 0
+        self.total = total
+        self.finished = False
+        self.last_done = 0
+        self.speed = 0.0
+
+
+class ProgressBus:
+    """Collects byte counts from any number of transfers.
+
+    Writers call update() from download threads: it only stores numbers under
+    a lock. A reader polls snapshot() at FRAME_HZ on its own thread (the Kivy
+    Clock in the app) and gets per-item and overall percent, speed and ETA.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+        self._dirty = False
+        self._last_snapshot = time.monotonic()
+
+    def update(self, key, done, total=0):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                item = self._items[key] = _Transfer(total)
+            item.done = done
+            if total:
+                item.total = total
+            self._dirty = True
+
+    def finish(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                item = self._items[key] = _Transfer(0)
+            if item.total:
+                item.done = item.total
+            item.finished = True
+            self._dirty = True
+
+    def reporter(self, key):
+        # Adapter for the downloader's on_progress(done, total) callbacks
+        return lambda done, total=0: self.update(key, done, total)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._dirty = True
+
+    def snapshot(self, force=False):
+        """Return the current state, or None when nothing changed since last call."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._dirty and not force:
+                return None
+            self._dirty = False
+            elapsed = max(now - self._last_snapshot, 1e-6)
+            self._last_snapshot = now
+
+            items = {}
+            done_sum = total_sum = speed_sum = 0
+            percents = []
+            known_totals = True
+            for key, item in self._items.items():
+                rate = (item.done - item.last_done) / elapsed
+                item.speed += SPEED_ALPHA * (rate - item.speed)
+                item.last_done = item.done
+                speed = 0.0 if item.finished else item.speed
+
+                if item.finished:
+                    percent = 100.0
+                elif item.total:
+                    percent = min(item.done * 100 / item.total, 100.0)
+                else:
+                    percent = 0.0
+                    known_totals = False
+
+                items[key] = {
+                    "done": item.done,
+                    "total": item.total,
+                    "percent": percent,
+                    "speed": speed,
+                    "eta": _eta(item.total - item.done, speed) if item.total else None,
+                    "finished": item.finished,
+                }
+                percents.append(percent)
+                done_sum += item.done
+                total_sum += item.total
+                speed_sum += speed
+
+        if known_totals and total_sum:
+            overall = min(done_sum * 100 / total_sum, 100.0)
+        else:
+            overall = sum(percents) / len(percents) if percents else 0.0
+
+        return {
+            "items": items,
+            "percent": overall,
+            "speed": speed_sum,
+            "eta": _eta(total_sum - done_sum, speed_sum) if known_totals and total_sum else None,
+            "finished": sum(1 for i in items.values() if i["finished"]),
+            "count": len(items),
+        }
+
+
+def _eta(remaining, speed):
+    if speed <= 0:
+        return None
+    return max(remaining, 0) / speed
+
+
+def format_status(snap):
+    parts = []
+    if snap["count"] > 1:
+        parts.append(f"{snap['finished']}/{snap['count']}")
+    if snap["speed"] > 0:
+        parts.append(f"{snap['speed'] / (1024 * 1024):.1f} MB/s")
+    if snap["eta"] is not None:
+        minutes, seconds = divmod(int(snap["eta"]), 60)
+        parts.append(f"ETA {minutes}:{seconds:02d}")
+    return " · ".join(parts)
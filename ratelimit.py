@@ -0,0 +1,212 @@
+import re
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# Per-host request pacing. Every request to a host first takes a token from
+# that host's bucket, so a burst of downloads is spread out instead of
+# tripping the platform's rate limit. Throttling responses (429, or a 503
+# with Retry-After) block the host for the server's Retry-After, or an
+# exponential backoff without one, and halve its rate; each success then
+# adds RATE_INCREASE back, up to the configured ceiling (AIMD).
+#
+# A bucket can be split by session, so accounts/cookie jars of one host are
+# paced and blocked separately (see credentials.SessionPool).
+
+ENABLED = True
+
+# Host suffix: (requests per second, burst). The rest of the hosts are
+# unpaced until they first throttle us.
+HOST_RATES = {
+    "instagram.com": (0.5, 3),
+    "cdninstagram.com": (4.0, 8),
+    "fbcdn.net": (4.0, 8),
+    "x.com": (0.5, 3),
+    "twitter.com": (0.5, 3),
+    "twimg.com": (4.0, 8),
+    "tiktok.com": (1.0, 4),
+}
+# Rate an unpaced host starts from once it throttles
+THROTTLED_RATE = 2.0
+THROTTLED_BURST = 2
+RATE_INCREASE = 0.1
+RATE_DECREASE = 0.5
+MIN_RATE = 1 / 30
+# Block after a throttle without Retry-After: BACKOFF_SECS doubling per
+# consecutive throttle, up to MAX_BLOCK_SECS (also the cap on Retry-After)
+BACKOFF_SECS = 5
+MAX_BLOCK_SECS = 5 * 60
+# Callers that may wait inline (a download thread) give up beyond this and
+# leave the retry to the job scheduler
+MAX_INLINE_WAIT = 15
+
+THROTTLE_STATUSES = (429,)
+# How yt-dlp reports throttling and Instagram's login wall
+_THROTTLE_ERROR = re.compile(r"\b429\b|too many requests|rate.?limit|login required|wait a few minutes", re.I)
+
+
+class Throttled(Exception):
+    """A host stays blocked for longer than the caller can wait."""
+
+    def __init__(self, host, delay):
+        super().__init__(f"Rate limited by {host}; retry in {delay:.0f}s")
+        self.delay = delay
+
+
+def retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttled(status, headers):
+    return status in THROTTLE_STATUSES or (status == 503 and "Retry-After" in headers)
+
+
+def is_throttle_error(message):
+    return bool(message) and bool(_THROTTLE_ERROR.search(str(message)))
+
+
+class HostLimit:
+    def __init__(self, rate=None, burst=1):
+        self.ceiling = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+        self.strikes = 0
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def _wait(self, now):
+        # Seconds until a token can be taken
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if not self.rate or self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def delay(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return self._wait(now)
+
+    def acquire(self, max_wait=None):
+        """Take a token, sleeping until one is available. Returns False
+        without taking one when that would take longer than ``max_wait``."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait(now)
+                if wait <= 0:
+                    if self.rate:
+                        self.tokens -= 1
+                    return True
+            if max_wait is not None and wait > max_wait:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    def ok(self):
+        with self._lock:
+            self.strikes = 0
+            if self.rate:
+                self.rate = self.rate + RATE_INCREASE
+                if self.ceiling:
+                    self.rate = min(self.ceiling, self.rate)
+
+    def throttled(self, after=None):
+        """Record a throttling response; returns how long the host is blocked."""
+        with self._lock:
+            now = time.monotonic()
+            self.throttles += 1
+            if self.blocked_until > now:
+                # A request already in flight when the host blocked us
+                if after is not None:
+                    self.blocked_until = max(self.blocked_until, now + min(MAX_BLOCK_SECS, after))
+                return self.blocked_until - now
+            self.strikes += 1
+            if self.rate:
+                self.rate = max(MIN_RATE, self.rate * RATE_DECREASE)
+            else:
+                self.rate, self.burst = THROTTLED_RATE, THROTTLED_BURST
+            self.tokens = 0.0
+            self.stamp = now
+            block = after if after is not None else BACKOFF_SECS * 2 ** (self.strikes - 1)
+            block = min(MAX_BLOCK_SECS, block)
+            self.blocked_until = max(self.blocked_until, now + block)
+            return self.blocked_until - now
+
+
+class Limiter:
+    def __init__(self, rates=None):
+        self.rates = dict(HOST_RATES if rates is None else rates)
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def _host_key(self, url):
+        netloc = urlparse(url).netloc if "://" in url else url
+        host = netloc.rsplit(":", 1)[0].lower()
+        for suffix in self.rates:
+            if host == suffix or host.endswith("." + suffix):
+                return suffix
+        return netloc
+
+    def limit(self, url, session=None):
+        """The bucket for ``url``'s host (or a bare host name), split by
+        ``session`` when given."""
+        key = (self._host_key(url), session)
+        with self._lock:
+            if key not in self._limits:
+                rate, burst = self.rates.get(key[0], (None, 1))
+                self._limits[key] = HostLimit(rate, burst)
+            return self._limits[key]
+
+    def configure(self, host, rate, burst=1):
+        with self._lock:
+            self.rates[host] = (rate, burst)
+            for key in [k for k in self._limits if k[0] == host]:
+                del self._limits[key]
+
+    def acquire(self, url, session=None, max_wait=None):
+        """Wait for a token from ``url``'s bucket; raises Throttled when
+        that would take longer than ``max_wait``."""
+        if not ENABLED:
+            return
+        limit = self.limit(url, session)
+        if not limit.acquire(max_wait):
+            raise Throttled(self._host_key(url), limit.delay())
+
+    def delay(self, url, session=None):
+        return self.limit(url, session).delay() if ENABLED else 0.0
+
+    def ok(self, url, session=None):
+        if ENABLED:
+            self.limit(url, session).ok()
+
+    def throttled(self, url, after=None, session=None):
+        return self.limit(url, session).throttled(after) if ENABLED else 0.0
+
+    def snapshot(self):
+        with self._lock:
+            items = list(self._limits.items())
+        return [{"host": host, "session": session, "rate": lim.rate, "throttles": lim.throttles,
+                 "delay": round(lim.delay(), 2)} for (host, session), lim in items]
+
+
+limiter = Limiter()
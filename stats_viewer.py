@@ -0,0 +1,79 @@
+import threading
+from kivy.clock import mainthread
+from kivy.metrics import dp
+from kivy.uix.scrollview import ScrollView
+from kivymd.uix.screen import MDScreen
+from kivymd.uix.boxlayout import MDBoxLayout
+from kivymd.uix.label import MDLabel
+from kivymd.uix.list import MDList, ThreeLineListItem
+from telemetry import summarize
+
+OP_LABELS = {"metadata": "Metadata", "download": "Download", "ytdlp": "Video (yt-dlp)"}
+# Phases shown on the second line (network/extractor) and third line (device)
+NETWORK_PHASES = ("extract", "probe", "ttfb")
+DEVICE_PHASES = ("write", "hash")
+
+
+def _secs(stats, name, label=None):
+    s = stats.get(name)
+    return f"{label or name} {s['p50']:.2f}/{s['p95']:.2f}s" if s else None
+
+
+def _rate(stats):
+    s = stats.get("throughput")
+    return f"{s['p50'] / 1e6:.1f}/{s['p95'] / 1e6:.1f} MB/s" if s else None
+
+
+def describe(group):
+    """Three list lines for one summarize() group."""
+    stats = group["stats"]
+    title = f"{OP_LABELS.get(group['op'], group['op'])} · {group['platform'].capitalize()}"
+    failed = f", {group['errors']} failed" if group["errors"] else ""
+    hits = f", {group['hits']} cached" if group["hits"] else ""
+    retries = f", {group['retries']} retries" if group["retries"] else ""
+    network = [_secs(stats, "seconds", "total")] + [_secs(stats, name) for name in NETWORK_PHASES]
+    device = [_rate(stats)] + [_secs(stats, name) for name in DEVICE_PHASES]
+    return (f"{title} ({group['count']}{hits}{failed}{retries})",
+            " · ".join(filter(None, network)) or "No successful runs",
+            " · ".join(filter(None, device)))
+
+
+class StatsView(MDBoxLayout):
+    """p50/p95 timings per operation and platform from the metrics log."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("orientation", "vertical")
+        super().__init__(padding=10, spacing=10, **kwargs)
+        self.add_widget(MDLabel(text="p50 / p95", theme_text_color="Hint", font_style="Caption",
+                                size_hint_y=None, height=dp(20)))
+        self.list = MDList()
+        self.empty_label = MDLabel(text="No downloads measured yet.", halign="center")
+        scroll = ScrollView()
+        scroll.add_widget(self.list)
+        self.add_widget(scroll)
+
+    def refresh(self, *_):
+        # The log can hold thousands of lines: parse it off the UI thread
+        threading.Thread(target=lambda: self.show(summarize()), daemon=True).start()
+
+    @mainthread
+    def show(self, summary):
+        self.list.clear_widgets()
+        if self.empty_label.parent:
+            self.remove_widget(self.empty_label)
+        if not summary:
+            self.add_widget(self.empty_label)
+            return
+        for group in summary:
+            text, secondary, tertiary = describe(group)
+            self.list.add_widget(ThreeLineListItem(text=text, secondary_text=secondary, tertiary_text=tertiary))
+
+
+class StatsScreen(MDScreen):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = StatsView()
+        self.add_widget(self.stats)
+
+    def on_enter(self, *_):
+        self.stats.refresh()
@@ -0,0 +1,245 @@
+import os
+import time
+import select
+import struct
+import sqlite3
+import threading
+import ctypes
+import ctypes.util
+
+# Incremental scanner for the WhatsApp .Statuses folder. A persistent index
+# of (name, size, mtime) means each scan reports only new or changed files,
+# and an unchanged directory mtime skips the listing altogether. The
+# watcher reacts to inotify events where available and polls otherwise.
+
+WHATSAPP_STATUS_DIR = "/storage/emulated/0/WhatsApp/Media/.Statuses/"
+DB_FILE = os.path.join("cache", "statuses.db")
+STATUS_EXTS = (".jpg", ".jpeg", ".png", ".mp4", ".gif")
+
+# Files modified this recently may still be being written; they are left
+# for the next scan. The same margin guards the directory mtime shortcut
+# against changes landing within the filesystem's timestamp granularity.
+SETTLE_SECS = 2
+POLL_SECS = 5
+
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+class StatusScanner:
+    """Index of status files in ``directory``, persisted in ``db_path``.
+
+    scan() and scan_names() return entries {name, path, size, mtime_ns}
+    that are new or changed since they were last reported, oldest first.
+    """
+
+    def __init__(self, directory=WHATSAPP_STATUS_DIR, db_path=DB_FILE):
+        self.directory = directory
+        self.db_path = db_path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS statuses ("
+                " dir TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " PRIMARY KEY (dir, name))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS dirs (dir TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def scan(self):
+        """Full pass over the directory. An unchanged directory mtime means no
+        file was added or removed, so only the known files are stat'ed: a
+        status rewritten in place changes its own mtime, not the directory's."""
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return []
+
+        with self._lock:
+            db = self._conn()
+            row = db.execute("SELECT mtime_ns FROM dirs WHERE dir = ?", (self.directory,)).fetchone()
+            known = {name: (size, mtime) for name, size, mtime in db.execute(
+                "SELECT name, size, mtime_ns FROM statuses WHERE dir = ?", (self.directory,))}
+            listing = self._stat_known(known) if row and row[0] == dir_mtime else self._stat_all()
+
+            now_ns = time.time_ns()
+            settle_ns = SETTLE_SECS * 10 ** 9
+            current, unsettled = {}, set()
+            for name, st in listing:
+                if now_ns - st.st_mtime_ns < settle_ns:
+                    unsettled.add(name)
+                    continue
+                current[name] = (st.st_size, st.st_mtime_ns)
+
+            # A settling file is still there: it keeps its row until the next scan
+            removed = [n for n in known if n not in current and n not in unsettled]
+            changed = self._apply(db, current, removed, known)
+            # Only trust the directory mtime once nothing in it is still settling
+            if not unsettled and now_ns - dir_mtime >= settle_ns:
+                db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (self.directory, dir_mtime))
+            db.commit()
+        return changed
+
+    def _stat_all(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.lower().endswith(STATUS_EXTS) and entry.is_file():
+                    yield entry.name, entry.stat()
+
+    def _stat_known(self, known):
+        for name in known:
+            try:
+                yield name, os.stat(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def scan_names(self, names):
+        """Check just ``names`` (e.g. from inotify events) against the index."""
+        current, removed = {}, []
+        for name in set(names):
+            if not name.lower().endswith(STATUS_EXTS):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+                current[name] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                removed.append(name)
+        if not current and not removed:
+            return []
+
+        with self._lock:
+            db = self._conn()
+            known = {}
+            for name in [*current, *removed]:
+                row = db.execute("SELECT size, mtime_ns FROM statuses WHERE dir = ? AND name = ?",
+                                 (self.directory, name)).fetchone()
+                if row:
+                    known[name] = tuple(row)
+            changed = self._apply(db, current, [n for n in removed if n in known], known)
+            db.commit()
+        return changed
+
+    def _apply(self, db, current, removed, known):
+        changed = [(name, stat) for name, stat in current.items() if known.get(name) != stat]
+        db.executemany("INSERT OR REPLACE INTO statuses VALUES (?, ?, ?, ?)",
+                       [(self.directory, name, size, mtime) for name, (size, mtime) in changed])
+        db.executemany("DELETE FROM statuses WHERE dir = ? AND name = ?",
+                       [(self.directory, name) for name in removed])
+        changed.sort(key=lambda item: item[1][1])
+        return [{"name": name, "path": os.path.join(self.directory, name), "size": size, "mtime_ns": mtime}
+                for name, (size, mtime) in changed]
+
+
+_libc = None
+
+
+def _inotify_watch(directory):
+    # Returns an inotify fd watching ``directory``, or None where inotify is
+    # unavailable (non-Linux, restricted storage); callers then poll
+    global _libc
+    try:
+        if _libc is None:
+            _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc = _libc
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _read_events(fd):
+    # Returns (names touched, whether the watch is gone or events were lost)
+    names, lost = [], False
+    while True:
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return names, lost
+        offset = 0
+        while offset < len(data):
+            _wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & (IN_Q_OVERFLOW | IN_IGNORED | IN_DELETE_SELF):
+                lost = True
+            elif name:
+                names.append(os.fsdecode(name))
+
+
+class StatusWatcher:
+    """Background thread calling ``on_new(entries)`` as statuses appear."""
+
+    def __init__(self, scanner, on_new, poll_secs=POLL_SECS):
+        self.scanner = scanner
+        self.on_new = on_new
+        self.poll_secs = poll_secs
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="status-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _emit(self, entries):
+        if entries:
+            try:
+                self.on_new(entries)
+            except Exception as e:
+                print(f"Status capture error: {e}")
+
+    def _run(self):
+        fd = None
+        try:
+            while not self._stop.is_set():
+                if fd is None:
+                    fd = _inotify_watch(self.scanner.directory)
+                    # Catch up on whatever arrived while we were not watching
+                    self._emit(self.scanner.scan())
+                    if fd is None:
+                        self._stop.wait(self.poll_secs)
+                        continue
+
+                ready, _, _ = select.select([fd], [], [], self.poll_secs)
+                if not ready:
+                    # Files skipped while settling have no further event
+                    self._emit(self.scanner.scan())
+                    continue
+                names, lost = _read_events(fd)
+                self._emit(self.scanner.scan_names(names))
+                if lost:
+                    os.close(fd)
+                    fd = None
+        finally:
+            if fd is not None:
+                os.close(fd)
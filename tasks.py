@@ -0,0 +1,160 @@
+import os
+from urllib.parse import urlparse
+import ratelimit
+import telemetry
+import playlist
+from media_parser import parse_yt_dlp_metadata, parse_whatsapp_status_media, status_item
+from downloader import fetch_item, find_existing, unique_filename, DEFAULT_PROFILE, MAX_WORKERS, PER_HOST_LIMIT
+from history import save_history_entry
+from postprocess import postprocessor
+from job_queue import PermanentJobError, RetryLater, PRIORITY_USER, PRIORITY_BACKGROUND
+from utils import classify_url
+
+# Job handlers for job_queue: "resolve" turns a link into media items,
+# "download" fetches one item and records it in history.
+
+# Platforms downloaded through yt-dlp with a quality profile rather than as
+# the direct media URLs found by extraction
+VIDEO_PLATFORMS = ('youtube',)
+
+
+def resolve_items(url, platform, profile=None):
+    """Return the media items behind ``url``; raises when there are none."""
+    if platform == 'whatsapp':
+        items = parse_whatsapp_status_media()['media']
+    elif platform in VIDEO_PLATFORMS:
+        link = classify_url(url)
+        res = _metadata(link.url)
+        items = [video_item(link, profile, res['caption'], res['username'], res['thumbnail'])]
+    else:
+        link = classify_url(url)
+        res = _metadata(link.url)
+        items = [{'url': u, 'caption': res['caption'], 'username': res['username'], 'thumb': res['thumbnail'],
+                  'source': link.url, 'index': i, 'stale': res.get('stale', False),
+                  'keys': [f"id:{link.key}#{i}"]} for i, u in enumerate(res['media'])]
+    if not items:
+        raise PermanentJobError("No media found")
+    return items
+
+
+def _metadata(url):
+    res = parse_yt_dlp_metadata(url, allow_stale=True)
+    if res.get('throttled'):
+        raise RetryLater(res['error'], res['retry_after'])
+    if 'error' in res:
+        raise RuntimeError(res['error'])
+    return res
+
+
+def video_item(link, profile=None, caption='', username='', thumb=''):
+    profile = profile or DEFAULT_PROFILE
+    return {'url': link.url, 'profile': profile, 'caption': caption, 'username': username,
+            'thumb': thumb, 'source': link.url, 'index': 0, 'keys': [f"id:{link.key}@{profile}"]}
+
+
+def entry_items(entry, platform, profile=None):
+    """Items for one flat playlist entry (see playlist.stream_items)."""
+    link = classify_url(entry['url'])
+    if platform in VIDEO_PLATFORMS and link.platform == platform:
+        # yt-dlp extracts it when downloading; the flat entry has the rest
+        return [video_item(link, profile, entry['title'], entry['uploader'], entry['thumbnail'])]
+    return resolve_items(entry['url'], platform, profile)
+
+
+def stream_resolve(url, platform, profile=None):
+    """Generator of the items of playlist/profile ``url``, resolved as
+    entries are enumerated; resumes an interrupted run."""
+    return playlist.stream_items(url, platform, lambda entry: entry_items(entry, platform, profile))
+
+
+def resolve(job):
+    payload = job['payload']
+    return {'items': resolve_items(payload.get('url', ''), job['platform'], payload.get('profile'))}
+
+
+def _fresh_url(item):
+    # Signed media URLs expire: look the post up again (cache permitting)
+    res = parse_yt_dlp_metadata(item['source'])
+    if 'error' in res or item['index'] >= len(res['media']):
+        return item['url']
+    return res['media'][item['index']]
+
+
+def download(job, on_progress=None):
+    item = job['payload']
+    if item.get('source') and not item.get('profile') and (item.get('stale') or job['attempts'] > 1):
+        item = {**item, 'url': _fresh_url(item)}
+
+    # The media URL no longer shows the platform, so tag the download's metrics
+    with telemetry.tags(platform=job['platform'], attempt=job['attempts']):
+        res = fetch_item(item, on_progress)
+    if isinstance(res, dict):
+        if ratelimit.is_throttle_error(res.get('error')):
+            # Wait out the CDN's block instead of spending a normal attempt
+            raise RetryLater(res['error'], ratelimit.limiter.delay(item['url']))
+        return res
+
+    return {'entry': save_download(job['platform'], item, res)}
+
+
+def save_download(platform, item, path):
+    entry = save_history_entry(platform, {
+        'path': path,
+        'caption': item.get('caption', ''),
+        'user': item.get('username', ''),
+        'thumb': item.get('thumb', ''),
+        'link': item.get('source', '')
+    })
+    # Remux/share copies happen in the background and update the entry
+    postprocessor.submit(entry)
+    return entry
+
+
+def plan_downloads(items, taken=None):
+    """Split items into (new items with a unique 'filename', names already downloaded).
+
+    Pass the same ``taken`` set across calls to keep names unique over a batch.
+    Items planned before (e.g. prefetched) keep their 'filename' if it is free.
+    """
+    todo, skipped = [], []
+    taken = set() if taken is None else taken
+    for it in items:
+        fname = it.get('filename') or os.path.basename(it['url']).split('?')[0]
+        if find_existing(it['url'], it.get('keys', ())):
+            skipped.append(fname)
+            continue
+        fname = unique_filename(fname, taken)
+        taken.add(fname)
+        todo.append({**it, 'filename': fname})
+    return todo, skipped
+
+
+def submit_items(scheduler, platform, items, priority=PRIORITY_USER):
+    """Queue a download job per item we don't already have.
+
+    Returns (job ids, names of items skipped as already downloaded).
+    """
+    todo, skipped = plan_downloads(items)
+    ids = [scheduler.submit('download', it, platform=platform, priority=priority,
+                            key=(it.get('keys') or [f"url:{it['url']}"])[0])
+           for it in todo]
+    return ids, skipped
+
+
+def register(scheduler, progress_for=None):
+    # ``progress_for(job)`` may return an on_progress(done, total) callback
+    scheduler.register('resolve', resolve)
+    # Downloads keep download_many's caps: per CDN host, and overall, apart
+    # from the platform slots resolves use
+    scheduler.register('download', lambda job: download(job, progress_for(job) if progress_for else None),
+                       slot=download_slot, per_slot=PER_HOST_LIMIT, limit=MAX_WORKERS)
+
+
+def download_slot(payload):
+    return urlparse(payload['url']).netloc or "local"
+
+
+def capture_statuses(scheduler, entries):
+    # StatusWatcher callback: new statuses expire within a day, so queue them
+    # right away, behind anything the user asked for
+    return submit_items(scheduler, 'whatsapp', [status_item(e) for e in entries], PRIORITY_BACKGROUND)
@@ -0,0 +1,237 @@
+import os
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Timing of metadata lookups and downloads. Every operation becomes one JSON
+# line in METRICS_FILE with its platform, total and per-phase seconds, bytes,
+# throughput, retries and error. The file is rotated by size, so the log
+# stays a few MB however long the app runs.
+#
+#   with telemetry.span("download", host=host) as span:
+#       with span.phase("probe"):
+#           ...
+#       span.set(bytes=size)
+#
+# Phases used by the downloader, to tell a slow CDN from a slow phone:
+#   probe     HEAD request; on a fresh connection this includes DNS, TCP and TLS
+#   ttfb      GET sent until response headers (first segment when segmented)
+#   transfer  wall time of the body transfer
+#   read / write / hash
+#             time in socket reads, disk writes and hashing plus progress
+#             callbacks, summed over all connections of a segmented download
+#   finalize  rename and download index update
+
+METRICS_FILE = os.path.join("cache", "metrics.jsonl")
+MAX_BYTES = 1024 * 1024
+BACKUPS = 2
+ENABLED = True
+
+_write_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span:
+    """One timed operation; recorded when its ``with`` block ends."""
+
+    def __init__(self, op, **fields):
+        self.op = op
+        self.fields = {**getattr(_local, "tags", {}), **fields}
+        self.phases = {}
+        self._lock = threading.Lock()
+        self._started = None
+        self._outer = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._outer = getattr(_local, "span", None)
+        _local.span = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.span = self._outer
+        if exc is not None:
+            self.fail(exc)
+        self.finish()
+        return False
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        # Phases may be reported from several threads and add up
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def set(self, **fields):
+        with self._lock:
+            self.fields.update(fields)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.fields[name] = self.fields.get(name, 0) + n
+
+    def fail(self, error):
+        self.set(error=str(error) or type(error).__name__)
+
+    def finish(self):
+        seconds = time.perf_counter() - self._started
+        with self._lock:
+            record = {"ts": round(time.time(), 3), "op": self.op, "platform": "unknown", **self.fields,
+                      "seconds": round(seconds, 4),
+                      "phases": {name: round(secs, 4) for name, secs in self.phases.items()}}
+        nbytes = record.get("bytes")
+        elapsed = self.phases.get("transfer", seconds)
+        if nbytes and elapsed > 0:
+            record["throughput"] = round(nbytes / elapsed)
+        if ENABLED:
+            try:
+                _write(record)
+            except OSError as e:
+                print(f"Metrics write error: {e}")
+        return record
+
+
+def span(op, **fields):
+    return Span(op, **fields)
+
+
+def current():
+    """The innermost span open on this thread, or None."""
+    return getattr(_local, "span", None)
+
+
+@contextmanager
+def tags(**fields):
+    # Fields added to every span opened on this thread inside the block,
+    # e.g. the platform of a job whose media URL no longer shows it
+    outer = getattr(_local, "tags", {})
+    _local.tags = {**outer, **fields}
+    try:
+        yield
+    finally:
+        _local.tags = outer
+
+
+def _write(record):
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with _write_lock:
+        os.makedirs(os.path.dirname(METRICS_FILE) or ".", exist_ok=True)
+        try:
+            size = os.path.getsize(METRICS_FILE)
+        except OSError:
+            size = 0
+        if size and size + len(line) > MAX_BYTES:
+            _rotate()
+        with open(METRICS_FILE, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _rotate():
+    # metrics.jsonl -> .1 -> .2 ...; the oldest is overwritten
+    if not BACKUPS:
+        os.remove(METRICS_FILE)
+        return
+    for i in range(BACKUPS, 0, -1):
+        src = METRICS_FILE if i == 1 else f"{METRICS_FILE}.{i - 1}"
+        if os.path.exists(src):
+            os.replace(src, f"{METRICS_FILE}.{i}")
+
+
+def read_records(op=None):
+    """All logged records, oldest first."""
+    paths = [f"{METRICS_FILE}.{i}" for i in range(BACKUPS, 0, -1)] + [METRICS_FILE]
+    records = []
+    with _write_lock:
+        for path in paths:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in lines:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                if op is None or rec.get("op") == op:
+                    records.append(rec)
+    return records
+
+
+def percentile(values, q):
+    # Linear interpolation between closest ranks
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def summarize(records=None, quantiles=(50, 95)):
+    """Per (op, platform): counts, errors, cache hits, and percentiles of
+    the total seconds, every phase and throughput over the successful
+    records that did real work (cache hits would drag p50 towards zero).
+    """
+    records = read_records() if records is None else records
+    groups = {}
+    for rec in records:
+        group = groups.setdefault((rec.get("op", ""), rec.get("platform", "unknown")), {
+            "op": rec.get("op", ""), "platform": rec.get("platform", "unknown"),
+            "count": 0, "errors": 0, "hits": 0, "retries": 0, "bytes": 0, "values": {},
+        })
+        group["count"] += 1
+        group["retries"] += rec.get("retries", 0)
+        if rec.get("error"):
+            group["errors"] += 1
+            continue
+        if rec.get("cache") in ("hit", "stale"):
+            group["hits"] += 1
+            continue
+        group["bytes"] += rec.get("bytes") or 0
+        values = group["values"]
+        values.setdefault("seconds", []).append(rec["seconds"])
+        for name, secs in rec.get("phases", {}).items():
+            values.setdefault(name, []).append(secs)
+        if rec.get("throughput"):
+            values.setdefault("throughput", []).append(rec["throughput"])
+
+    summary = []
+    for group in groups.values():
+        values = group.pop("values")
+        group["stats"] = {name: {f"p{q}": round(percentile(vals, q), 4) for q in quantiles}
+                          for name, vals in values.items()}
+        summary.append(group)
+    summary.sort(key=lambda g: (g["op"], g["platform"]))
+    return summary
+
+
+def export(dest, fmt=None):
+    """Write every record to ``dest`` as JSON lines, or CSV (one column per
+    phase) when ``fmt`` or the file extension says so. Returns the count.
+    """
+    records = read_records()
+    fmt = fmt or ("csv" if dest.lower().endswith(".csv") else "jsonl")
+    with open(dest, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            phases = sorted({name for rec in records for name in rec.get("phases", {})})
+            fields = sorted({key for rec in records for key in rec if key != "phases"})
+            writer = csv.DictWriter(f, fieldnames=fields + [f"phase_{name}" for name in phases])
+            writer.writeheader()
+            for rec in records:
+                row = {key: value for key, value in rec.items() if key != "phases"}
+                row.update({f"phase_{name}": secs for name, secs in rec.get("phases", {}).items()})
+                writer.writerow(row)
+        else:
+            for rec in records:
+                f.write(json.dumps(rec) + "\n")
+    return len(records)
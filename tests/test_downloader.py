@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import downloader
+import server
+from download_index import BLOCK_SIZE
+
+MIB = 1024 * 1024
+
+
+def setup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(downloader, "DOWNLOAD_DIR", None)
+    monkeypatch.setattr(downloader, "DIRECTORY", None)
+    srv, base = server.start()
+    return srv, base
+
+
+def stale_part(path, size):
+    # What an interrupted download of another, larger version left behind
+    with open(path + downloader.PART_SUFFIX, "wb") as f:
+        f.write(b"\xff" * size)
+    with open(path + downloader.PART_SUFFIX + ".json", "w") as f:
+        json.dump({"size": size, "etag": None, "segments": [], "blocks": {}}, f)
+
+
+def test_stale_larger_part_is_not_kept(tmp_path, monkeypatch):
+    srv, base = setup(tmp_path, monkeypatch)
+    try:
+        path = os.path.join(downloader.init(), "clip.mp4")
+        stale_part(path, 20 * MIB)
+        res = downloader.download_file(f"{base}/10M.mp4", "clip.mp4")
+        assert "error" not in res, res
+        assert os.path.getsize(path) == 10 * MIB
+        with open(path, "rb") as f:
+            assert f.read() == b"".join(server.body(10 * MIB, 0, 10 * MIB - 1))
+    finally:
+        srv.shutdown()
+
+
+def test_prefetch_head_drops_stale_part(tmp_path, monkeypatch):
+    srv, base = setup(tmp_path, monkeypatch)
+    try:
+        path = os.path.join(downloader.init(), "clip.mp4")
+        stale_part(path, 20 * MIB)
+        assert downloader.prefetch_head(f"{base}/10M.mp4", "clip.mp4", BLOCK_SIZE) == BLOCK_SIZE
+        assert os.path.getsize(path + downloader.PART_SUFFIX) == 10 * MIB
+        res = downloader.download_file(f"{base}/10M.mp4", "clip.mp4")
+        assert "error" not in res, res
+        assert os.path.getsize(path) == 10 * MIB
+    finally:
+        srv.shutdown()
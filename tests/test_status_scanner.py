@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import status_scanner
+from status_scanner import StatusScanner, StatusWatcher
+
+
+def make(directory, name, age=60):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(name.encode())
+    when = time.time() - age
+    os.utime(path, (when, when))
+    return path
+
+
+def names(entries):
+    return sorted(e["name"] for e in entries)
+
+
+def scanner_for(tmp_path):
+    directory = tmp_path / ".Statuses"
+    directory.mkdir()
+    return StatusScanner(str(directory), str(tmp_path / "statuses.db")), str(directory)
+
+
+def test_scan_reports_only_new_or_changed(tmp_path):
+    scanner, directory = scanner_for(tmp_path)
+    make(directory, "a.jpg")
+    make(directory, "b.mp4")
+    make(directory, "notes.txt")
+    assert names(scanner.scan()) == ["a.jpg", "b.mp4"]
+    assert scanner.scan() == []
+
+    make(directory, "c.jpg", age=30)
+    os.remove(os.path.join(directory, "a.jpg"))
+    assert names(scanner.scan()) == ["c.jpg"]
+
+    # A status saved again under its old name is reported again
+    make(directory, "a.jpg", age=20)
+    assert names(scanner.scan()) == ["a.jpg"]
+
+
+def test_settling_file_is_reported_once(tmp_path, monkeypatch):
+    scanner, directory = scanner_for(tmp_path)
+    make(directory, "new.mp4", age=0)
+    # inotify reports it as soon as it is closed
+    assert names(scanner.scan_names(["new.mp4"])) == ["new.mp4"]
+
+    # A full scan inside the settle window skips it but must not forget it
+    monkeypatch.setattr(status_scanner, "SETTLE_SECS", 60)
+    assert scanner.scan() == []
+    monkeypatch.setattr(status_scanner, "SETTLE_SECS", 0)
+    assert scanner.scan() == []
+
+
+def test_settling_file_waits_for_next_scan(tmp_path, monkeypatch):
+    scanner, directory = scanner_for(tmp_path)
+    monkeypatch.setattr(status_scanner, "SETTLE_SECS", 60)
+    make(directory, "a.jpg", age=0)
+    assert scanner.scan() == []
+    monkeypatch.setattr(status_scanner, "SETTLE_SECS", 0)
+    assert names(scanner.scan()) == ["a.jpg"]
+
+
+def test_watcher_emits_each_status_once(tmp_path):
+    scanner, directory = scanner_for(tmp_path)
+    seen, lock = [], threading.Lock()
+
+    def on_new(entries):
+        with lock:
+            seen.extend(e["name"] for e in entries)
+
+    watcher = StatusWatcher(scanner, on_new, poll_secs=0.1)
+    watcher.start()
+    try:
+        make(directory, "new.mp4", age=0)
+        deadline = time.time() + status_scanner.SETTLE_SECS + 3
+        while time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        watcher.stop()
+    assert seen == ["new.mp4"]
+
+
+def test_rewrite_in_place_is_reported(tmp_path):
+    scanner, directory = scanner_for(tmp_path)
+    make(directory, "a.jpg", age=120)
+    make(directory, "b.jpg", age=120)
+    past = time.time() - 60
+    os.utime(directory, (past, past))
+    assert names(scanner.scan()) == ["a.jpg", "b.jpg"]
+
+    # Same name, new content: the directory's mtime doesn't move
+    path = os.path.join(directory, "a.jpg")
+    with open(path, "wb") as f:
+        f.write(b"a longer, rewritten status")
+    when = time.time() - 30
+    os.utime(path, (when, when))
+    os.utime(directory, (past, past))
+    changed = scanner.scan()
+    assert names(changed) == ["a.jpg"]
+    assert changed[0]["size"] == len(b"a longer, rewritten status")
+    assert scanner.scan() == []
@@ -0,0 +1,262 @@
+import io
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import http_session
+
+# Optional decoders: Pillow downscales images, ffmpeg or Android's
+# ThumbnailUtils grab the first frame of videos. Without Pillow, remote
+# thumbnails are cached at their original size.
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    from jnius import autoclass
+except ImportError:
+    autoclass = None
+
+THUMB_DIR = os.path.join("cache", "thumbs")
+THUMB_PX = 160
+JPEG_QUALITY = 80
+# Disk budget for cached previews; least recently shown ones go first
+BUDGET_BYTES = 20 * 1024 * 1024
+FETCH_WORKERS = 2
+# lookup() runs on the UI thread as rows scroll in, so it only reads; access
+# times are written back on the fetch pool once this many are pending, and
+# before every eviction
+TOUCH_BATCH = 32
+
+VIDEO_EXTS = (".mp4", ".mkv", ".webm", ".mov", ".3gp")
+
+
+def _is_remote(source):
+    return source.startswith(("http://", "https://"))
+
+
+def _downscale(data):
+    if Image is None:
+        return data
+    im = Image.open(io.BytesIO(data))
+    # draft() lets the JPEG decoder skip most of a full-resolution photo
+    im.draft("RGB", (THUMB_PX, THUMB_PX))
+    im = im.convert("RGB")
+    im.thumbnail((THUMB_PX, THUMB_PX))
+    out = io.BytesIO()
+    im.save(out, "JPEG", quality=JPEG_QUALITY)
+    return out.getvalue()
+
+
+def _video_frame(path):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        res = subprocess.run(
+            [ffmpeg, "-loglevel", "error", "-i", path, "-frames:v", "1",
+             "-vf", f"scale={THUMB_PX}:-2", "-f", "image2", "-c:v", "mjpeg", "pipe:1"],
+            capture_output=True, timeout=20,
+        )
+        if res.returncode == 0 and res.stdout:
+            return res.stdout
+
+    if autoclass is not None:
+        ThumbnailUtils = autoclass("android.media.ThumbnailUtils")
+        CompressFormat = autoclass("android.graphics.Bitmap$CompressFormat")
+        ByteArrayOutputStream = autoclass("java.io.ByteArrayOutputStream")
+        bitmap = ThumbnailUtils.createVideoThumbnail(path, 1)  # MINI_KIND
+        if bitmap is not None:
+            stream = ByteArrayOutputStream()
+            bitmap.compress(CompressFormat.JPEG, JPEG_QUALITY, stream)
+            return bytes(stream.toByteArray())
+    return None
+
+
+def _render(source):
+    if _is_remote(source):
+        with http_session.get(source) as response:
+            response.raise_for_status()
+            return _downscale(response.content)
+    if source.lower().endswith(VIDEO_EXTS):
+        frame = _video_frame(source)
+        return _downscale(frame) if frame else None
+    with open(source, "rb") as f:
+        return _downscale(f.read())
+
+
+class ThumbnailCache:
+    """Downscaled previews on disk, named by the hash of their content.
+
+    An index maps each source (remote URL or local file) to its preview
+    file. Several sources can share one file. The total size is kept under
+    ``budget`` by evicting the least recently used entries.
+    """
+
+    def __init__(self, directory=THUMB_DIR, budget=BUDGET_BYTES):
+        self.directory = directory
+        self.budget = budget
+        self._db = None
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._touched = {}
+        self._stale = set()
+        self._pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="thumbs")
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.directory, "index.db"), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS thumbs ("
+                " source TEXT PRIMARY KEY, file TEXT NOT NULL,"
+                " size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS thumbs_accessed ON thumbs(accessed)")
+            self._db.commit()
+        return self._db
+
+    def lookup(self, source):
+        with self._lock:
+            row = self._conn().execute("SELECT file FROM thumbs WHERE source = ?", (source,)).fetchone()
+            if row is None:
+                return None
+            path = os.path.join(self.directory, row[0])
+            if not os.path.exists(path):
+                self._stale.add(source)
+                self._touched.pop(source, None)
+                path = None
+            else:
+                self._touched[source] = time.time()
+            flush = len(self._touched) + len(self._stale) == TOUCH_BATCH
+        if flush:
+            self._pool.submit(self.flush)
+        return path
+
+    def flush(self):
+        with self._lock:
+            self._flush(self._conn())
+            self._conn().commit()
+
+    def _flush(self, db):
+        if self._touched:
+            db.executemany("UPDATE thumbs SET accessed = ? WHERE source = ?",
+                           [(t, s) for s, t in self._touched.items()])
+            self._touched.clear()
+        if self._stale:
+            db.executemany("DELETE FROM thumbs WHERE source = ?", [(s,) for s in self._stale])
+            self._stale.clear()
+
+    def get(self, source):
+        """Return a local preview path for ``source``, creating it if needed (blocking)."""
+        if not source:
+            return None
+        path = self.lookup(source)
+        if path:
+            return path
+        data = _render(source)
+        if not data:
+            return None
+        return self._store(source, data)
+
+    def request(self, source, callback, fallback=None):
+        """Resolve ``source`` on the fetch pool and call ``callback(path)``.
+
+        When ``source`` can't be rendered (an expired signed thumbnail URL),
+        ``fallback`` is tried instead and its preview kept for ``source``
+        too; None when neither works.
+        """
+        path = self.lookup(source) if source else None
+        if path or not source:
+            callback(path)
+            return
+
+        with self._lock:
+            waiters = self._inflight.get(source)
+            if waiters is not None:
+                waiters.append(callback)
+                return
+            self._inflight[source] = [callback]
+
+        def run():
+            try:
+                result = self.get(source)
+            except Exception as e:
+                print(f"Thumbnail error for {source}: {e}")
+                result = None
+            if result is None and fallback and fallback != source:
+                try:
+                    result = self.get(fallback)
+                    if result:
+                        self._alias(source, result)
+                except Exception as e:
+                    print(f"Thumbnail error for {fallback}: {e}")
+            with self._lock:
+                waiters = self._inflight.pop(source, [])
+            for cb in waiters:
+                cb(result)
+
+        self._pool.submit(run)
+
+    def _store(self, source, data):
+        name = hashlib.sha1(data).hexdigest() + ".jpg"
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            db = self._conn()
+            if not os.path.exists(path):
+                tmp = path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            db.execute("INSERT OR REPLACE INTO thumbs VALUES (?, ?, ?, ?)",
+                       (source, name, len(data), time.time()))
+            self._touched.pop(source, None)
+            self._stale.discard(source)
+            self._flush(db)
+            self._evict(db)
+            db.commit()
+        return path
+
+    def _alias(self, source, path):
+        with self._lock:
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO thumbs VALUES (?, ?, ?, ?)",
+                       (source, os.path.basename(path), os.path.getsize(path), time.time()))
+            self._stale.discard(source)
+            db.commit()
+
+    def _evict(self, db):
+        # Sizes are summed per distinct file so shared previews count once
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM"
+                           " (SELECT size FROM thumbs GROUP BY file)").fetchone()[0]
+        if total <= self.budget:
+            return
+        for source, name, size in db.execute(
+                "SELECT source, file, size FROM thumbs ORDER BY accessed").fetchall():
+            db.execute("DELETE FROM thumbs WHERE source = ?", (source,))
+            if db.execute("SELECT 1 FROM thumbs WHERE file = ?", (name,)).fetchone() is None:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+                total -= size
+            if total <= self.budget:
+                break
+
+
+thumbnails = ThumbnailCache()
+
+
+def preview_source(entry):
+    # (source, fallback): the remote thumbnail when we have one, otherwise
+    # the downloaded file itself, which is also the fallback for a thumbnail
+    # that can no longer be fetched
+    path = entry.get("path", "")
+    path = path if path and os.path.exists(path) else ""
+    thumb = entry.get("thumb", "")
+    if thumb and (_is_remote(thumb) or os.path.exists(thumb)):
+        return thumb, path
+    return path, ""
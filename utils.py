@@ -1,22 +1,103 @@
 import re
-from kivy.core.clipboard import Clipboard
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# (platform, pattern with an (?P<id>...) group, canonical link template).
+# All of them are folded into one precompiled alternation, so a lookup is a
+# single regex search whatever the number of platforms.
+LINK_PATTERNS = [
+    ("instagram", r"instagram\.com/(?:[\w.]+/)?(?:p|reels?|tv)/(?P<id>[\w-]+)", "https://www.instagram.com/p/{id}/"),
+    # Stories need the user in the path, so the cleaned original link is kept
+    ("instagram", r"instagram\.com/stories/[\w.]+/(?P<id>\d+)", None),
+    # All of a user's current stories; the id keeps the "stories/" prefix so
+    # it can't collide with a post shortcode
+    ("instagram", r"instagram\.com/(?P<id>stories/[\w.]+)/?(?=[?#\s]|$)", None),
+    ("youtube", r"youtube\.com/(?:watch\?(?:[^#\s]*?&)?v=|shorts/|embed/|live/)(?P<id>[\w-]{11})",
+     "https://www.youtube.com/watch?v={id}"),
+    ("youtube", r"youtu\.be/(?P<id>[\w-]{11})", "https://www.youtube.com/watch?v={id}"),
+    ("tiktok", r"tiktok\.com/@[\w.\-]+/video/(?P<id>\d+)", None),
+    ("x", r"(?:twitter|x)\.com/(?:i/web|\w+)/status(?:es)?/(?P<id>\d+)", "https://x.com/i/status/{id}"),
+]
+# Playlists and profiles, enumerated entry by entry (see playlist.py). They
+# come after the single-media patterns, which win where both could match.
+COLLECTION_PATTERNS = [
+    ("youtube", r"youtube\.com/(?:playlist|watch)\?(?:[^#\s]*?&)?list=(?P<id>[\w-]{12,})(?![^#\s]*?[?&]v=)",
+     "https://www.youtube.com/playlist?list={id}"),
+    ("youtube", r"youtube\.com/(?P<id>@[\w.\-]+)(?=/?(?:videos|shorts|streams)?/?(?:[?#\s]|$))",
+     "https://www.youtube.com/{id}/videos"),
+    ("tiktok", r"tiktok\.com/(?P<id>@[\w.\-]+)(?=/?(?:[?#\s]|$))", "https://www.tiktok.com/{id}"),
+]
+# The lookbehind keeps e.g. "dropbox.com" from matching as "x.com". Matching
+# is case-sensitive (share links use lowercase hosts), which lets the regex
+# engine skip ahead to positions that can start a host name.
+_ALL_PATTERNS = LINK_PATTERNS + COLLECTION_PATTERNS
+_MATCHER = re.compile(r"(?<![\w-])(?:" + "|".join(pattern.replace("(?P<id>", f"(?P<g{i}>")
+                                                    for i, (_, pattern, _) in enumerate(_ALL_PATTERNS)) + ")")
+
+
+class Link(namedtuple("Link", "platform content_id url collection", defaults=(False,))):
+    __slots__ = ()
+
+    @property
+    def key(self):
+        # Identity of the content: used for caching, dedupe and in-flight checks
+        return f"{self.platform}:{self.content_id}" if self.content_id else self.url
+
+
+@lru_cache(maxsize=256)
+def classify_url(url: str) -> Link:
+    """Return Link(platform, content_id, normalized url) for ``url``.
+
+    Links to the same content give the same Link whatever host variant or
+    tracking parameters they carry; unknown links get platform "unknown".
+    ``collection`` is set for playlists and profiles.
+    """
+    url = url.strip()
+    if url == "whatsapp-status":
+        return Link("whatsapp", None, url)
+    m = _MATCHER.search(url)
+    if m is None:
+        return Link("unknown", None, url)
+    index = int(m.lastgroup[1:])
+    platform, _, template = _ALL_PATTERNS[index]
+    content_id = m.group(m.lastgroup)
+    normalized = template.format(id=content_id) if template else canonical_url(url)
+    return Link(platform, content_id, normalized, index >= len(LINK_PATTERNS))
 
-PATTERNS = {
-    "instagram": r"instagram\.com\/(p|reel|tv|stories)\/",
-    "youtube": r"(youtube\.com\/watch\?v=|youtu\.be\/)",
-    "tiktok": r"tiktok\.com\/@[\w\.\-]+\/video\/\d+",
-    "twitter": r"(twitter\.com|x\.com)\/\w+\/status\/\d+"
-}
 
 def detect_platform(url: str) -> str:
-    if url.strip() == "whatsapp-status":
-        return "whatsapp"
-    for plat, pat in PATTERNS.items():
-        if re.search(pat, url):
-            return plat
-    return "unknown"
+    return classify_url(url).platform
+
+
+def link_key(url: str) -> str:
+    return classify_url(url).key
+
+
+# Share/tracking parameters that never change which media a link points to
+TRACKING_PARAMS = {"igshid", "igsh", "si", "feature", "fbclid", "ref", "ref_src", "s", "t", "is_from_webapp", "sender_device"}
+HOST_PREFIXES = ("www.", "m.", "mobile.")
+
+
+def canonical_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = parts.path.rstrip("/") or "/"
+    query = [(k, v) for k, v in parse_qsl(parts.query)
+             if k not in TRACKING_PARAMS and not k.startswith("utm_")]
+
+    if host == "youtu.be":
+        host, query, path = "youtube.com", [("v", path.strip("/"))] + query, "/watch"
+    return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
 
 def get_clipboard_social_url():
+    # Imported here so headless use (cli.py) never loads Kivy
+    from kivy.core.clipboard import Clipboard
     content = Clipboard.paste().strip()
     if detect_platform(content) != "unknown":
         return content